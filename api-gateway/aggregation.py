@@ -0,0 +1,101 @@
+import json
+from concurrent.futures import wait
+from urllib.parse import parse_qsl, urlencode
+
+from prometheus_client import Counter, Histogram
+
+AGGREGATE_PARTS = Counter('api_gateway_aggregate_parts_total',
+                          'Upstream calls made for composite endpoints', ['aggregate', 'part', 'result'])
+AGGREGATE_DURATION = Histogram('api_gateway_aggregate_duration_seconds',
+                               'Time to answer a composite endpoint', ['aggregate'])
+
+
+def _with_query_param(path, name, value):
+    base, _, query = path.partition('?')
+    params = [(key, item) for key, item in parse_qsl(query, keep_blank_values=True) if key != name]
+    return f'{base}?{urlencode(params + [(name, value)])}'
+
+
+def _fetch_part(fetch, part, path):
+    """
+    Fetches a part and returns (data, None, partial) or (None, error, False).
+
+    A paginated part follows the upstream's X-Next-Cursor for at most
+    part.max_pages pages and concatenates their JSON arrays; partial is True
+    when the upstream still had pages left.
+    """
+    items = []
+    for _ in range(part.max_pages if part.paginate else 1):
+        status, headers, body = fetch(part.service, path)
+        if status >= 400:
+            return None, {'status': status, 'error': 'Upstream returned an error'}, False
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            return None, {'status': status, 'error': 'Upstream returned a non-JSON body'}, False
+        if not part.paginate:
+            return data, None, False
+        if not isinstance(data, list):
+            return None, {'status': status, 'error': 'Upstream returned a page that is not a JSON array'}, False
+        items.extend(data)
+        cursor = headers.get('X-Next-Cursor')
+        if not cursor:
+            return items, None, False
+        path = _with_query_param(path, 'cursor', cursor)
+    return items, None, True
+
+
+def run_aggregate(aggregate, params, fetch, executor):
+    """
+    Fetches every part of aggregate concurrently with fetch(service, path),
+    which returns (status, headers, body), and waits at most
+    aggregate.timeout seconds; derived parts are then computed from the
+    fetched ones.
+
+    Returns (status, payload). Parts that fail or miss the deadline are
+    reported under 'errors' while the others are still returned under 'data',
+    and parts cut short by max_pages are listed under 'partial'. The status
+    is 502 only when every part, or a required one, failed.
+    """
+    with AGGREGATE_DURATION.labels(aggregate=aggregate.path).time():
+        futures = {executor.submit(_fetch_part, fetch, part, part.render(params)): part for part in aggregate.fetched_parts}
+        _, pending = wait(futures, timeout=aggregate.timeout)
+
+    data, errors, partial = {}, {}, set()
+    for future, part in futures.items():
+        if future in pending:
+            future.cancel() # a call already under way finishes in the background and is discarded
+            errors[part.name] = {'error': f'No response within {aggregate.timeout}s'}
+            result = 'timeout'
+        else:
+            try:
+                value, error, truncated = future.result()
+            except Exception as e:
+                value, error, truncated = None, {'error': str(e)}, False
+            if error is None:
+                data[part.name] = value
+                if truncated:
+                    partial.add(part.name)
+                result = 'ok'
+            else:
+                errors[part.name] = error
+                result = 'error'
+        AGGREGATE_PARTS.labels(aggregate=aggregate.path, part=part.name, result=result).inc()
+
+    for part in aggregate.parts:
+        if part in aggregate.fetched_parts:
+            continue
+        if part.source not in data:
+            errors[part.name] = {'error': f"Part '{part.source}' is unavailable"}
+        elif not isinstance(data[part.source], list):
+            errors[part.name] = {'error': f"Part '{part.source}' is not a JSON array"}
+        else:
+            data[part.name] = part.derive(data[part.source])
+            if part.source in partial:
+                partial.add(part.name)
+
+    failed = not data or any(part.required and part.name in errors for part in aggregate.parts)
+    payload = {'data': data, 'errors': errors}
+    if partial:
+        payload['partial'] = sorted(partial)
+    return (502 if failed else 200), payload
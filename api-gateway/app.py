@@ -1,70 +1,564 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, g, has_request_context
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from prometheus_client import generate_latest, REGISTRY
 
-@app.route('/', defaults={'path': ''})
+from routing import resolve_route, resolve_aggregate, balancer, hop_by_hop_headers
+from load_balancer import NoHealthyEndpointError
+from upstream_pool import UpstreamPool, PoolExhaustedError
+from response_cache import (ResponseCache, CachedResponse, cache_key, parse_cache_control, response_ttl,
+                            CACHE_HITS, CACHE_MISSES, CACHE_REVALIDATIONS)
+from singleflight import SingleFlight, CoalesceTimeout
+from edge_auth import EdgeVerifier, INTERNAL_HEADERS, bearer_token
+from resilience import CircuitBreaker, AdaptiveLimiter, UpstreamGuard, UpstreamUnavailableError
+from aggregation import run_aggregate
+from batch import BatchError, parse_batch, run_batch
+from request_metrics import RequestTimer, observe_upstream
+from compression import (Compressor, available_encodings, compress_body, compress_stream, content_type_allowed,
+                         negotiate)
 
-# Simple in-memory service registry (for demonstration)
-service_registry = {
-    'user-service': 'http://localhost:5001',
-    'loan-service': 'http://localhost:5002',
-    'collection-service': 'http://localhost:5003',
-    'reporting-service': 'http://localhost:5004'
-}
+
+def get_config_from_consul(key):
+    # Simulate fetching configuration from Consul
+    # In a real scenario, you would use a Consul client library here
+    config_values = {
+        'pool_max_connections': int(os.environ.get('GATEWAY_POOL_MAX_CONNECTIONS', 10)), # keep-alive connections per upstream
+        'pool_idle_timeout': float(os.environ.get('GATEWAY_POOL_IDLE_TIMEOUT', 60)), # in seconds
+        'pool_max_concurrency': int(os.environ.get('GATEWAY_POOL_MAX_CONCURRENCY', 50)), # in-flight requests per upstream
+        'pool_wait_timeout': float(os.environ.get('GATEWAY_POOL_WAIT_TIMEOUT', 5)), # in seconds
+        'streaming': os.environ.get('GATEWAY_STREAMING', 'true').lower() == 'true',
+        'stream_chunk_size': int(os.environ.get('GATEWAY_STREAM_CHUNK_SIZE', 64 * 1024)), # in bytes
+        'cache_enabled': os.environ.get('GATEWAY_CACHE_ENABLED', 'false').lower() == 'true',
+        'cache_max_entries': int(os.environ.get('GATEWAY_CACHE_MAX_ENTRIES', 1000)),
+        'cache_max_bytes': int(os.environ.get('GATEWAY_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+        'cache_max_entry_bytes': int(os.environ.get('GATEWAY_CACHE_MAX_ENTRY_BYTES', 1024 * 1024)),
+        'coalesce_timeout': float(os.environ.get('GATEWAY_COALESCE_TIMEOUT', 10)), # in seconds
+        'aggregate_workers': int(os.environ.get('GATEWAY_AGGREGATE_WORKERS', 32)), # upstream calls in flight for composite endpoints
+        'batch_workers': int(os.environ.get('GATEWAY_BATCH_WORKERS', 64)), # sub-requests in flight across all /batch calls
+        'batch_concurrency': int(os.environ.get('GATEWAY_BATCH_CONCURRENCY', 16)), # sub-requests in flight per /batch call
+        'batch_max_items': int(os.environ.get('GATEWAY_BATCH_MAX_ITEMS', 500)),
+        'batch_timeout': float(os.environ.get('GATEWAY_BATCH_TIMEOUT', 10)), # in seconds, for the whole batch
+        'upstream_connect_timeout': float(os.environ.get('GATEWAY_UPSTREAM_CONNECT_TIMEOUT', 3)), # in seconds
+        'upstream_read_timeout': float(os.environ.get('GATEWAY_UPSTREAM_READ_TIMEOUT', 30)), # in seconds
+        'breaker_failure_threshold': int(os.environ.get('GATEWAY_BREAKER_FAILURE_THRESHOLD', 5)),
+        'breaker_reset_timeout': float(os.environ.get('GATEWAY_BREAKER_RESET_TIMEOUT', 10)), # in seconds
+        'breaker_half_open_calls': int(os.environ.get('GATEWAY_BREAKER_HALF_OPEN_CALLS', 1)),
+        'limit_initial': int(os.environ.get('GATEWAY_LIMIT_INITIAL', 20)),
+        'limit_min': int(os.environ.get('GATEWAY_LIMIT_MIN', 1)),
+        'limit_max': int(os.environ.get('GATEWAY_LIMIT_MAX', 200)),
+        'limit_backoff': float(os.environ.get('GATEWAY_LIMIT_BACKOFF', 0.9)),
+        'limit_latency_tolerance': float(os.environ.get('GATEWAY_LIMIT_LATENCY_TOLERANCE', 2.0)),
+        'edge_auth_enabled': os.environ.get('GATEWAY_EDGE_AUTH', 'false').lower() == 'true',
+        'jwt_secret_key': os.environ.get('JWT_SECRET_KEY', 'your-jwt-secret-key-fallback'),
+        'claims_secret_key': os.environ.get('GATEWAY_CLAIMS_SECRET_KEY'), # shared with the services that trust forwarded claims
+        'compression_enabled': os.environ.get('GATEWAY_COMPRESSION', 'true').lower() == 'true',
+        'compression_min_size': int(os.environ.get('GATEWAY_COMPRESSION_MIN_SIZE', 1024)), # in bytes
+        'compression_types': os.environ.get('GATEWAY_COMPRESSION_TYPES',
+                                            'application/json,application/x-ndjson,application/problem+json,'
+                                            'application/javascript,application/xml,text/*'),
+        'compression_gzip_level': int(os.environ.get('GATEWAY_COMPRESSION_GZIP_LEVEL', 5)),
+        'compression_brotli_quality': int(os.environ.get('GATEWAY_COMPRESSION_BROTLI_QUALITY', 4)),
+    }
+    return config_values.get(key)
+
+
+# Keep-alive connections to the upstreams, shared by all gateway worker threads
+upstream_pool = UpstreamPool(
+    max_connections=get_config_from_consul('pool_max_connections'),
+    idle_timeout=get_config_from_consul('pool_idle_timeout'),
+    max_concurrency=get_config_from_consul('pool_max_concurrency'),
+    wait_timeout=get_config_from_consul('pool_wait_timeout'),
+)
+
+# Timed-out upstream calls count as replica failures for outlier ejection
+UPSTREAM_TIMEOUT = (get_config_from_consul('upstream_connect_timeout'), get_config_from_consul('upstream_read_timeout'))
+
+# Circuit breaker and adaptive concurrency limit per upstream, created on first use
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def guard(service):
+    upstream_guard = _guards.get(service)
+    if upstream_guard is None:
+        with _guards_lock:
+            upstream_guard = _guards.get(service)
+            if upstream_guard is None:
+                breaker = CircuitBreaker(service,
+                                         failure_threshold=get_config_from_consul('breaker_failure_threshold'),
+                                         reset_timeout=get_config_from_consul('breaker_reset_timeout'),
+                                         half_open_calls=get_config_from_consul('breaker_half_open_calls'))
+                limiter = AdaptiveLimiter(service,
+                                          initial_limit=get_config_from_consul('limit_initial'),
+                                          min_limit=get_config_from_consul('limit_min'),
+                                          max_limit=get_config_from_consul('limit_max'),
+                                          backoff=get_config_from_consul('limit_backoff'),
+                                          tolerance=get_config_from_consul('limit_latency_tolerance'))
+                upstream_guard = _guards[service] = UpstreamGuard(service, breaker, limiter)
+    return upstream_guard
+
+
+# Optional edge JWT verification: verified claims are forwarded in a signed header
+edge_verifier = None
+if get_config_from_consul('edge_auth_enabled'):
+    if not get_config_from_consul('claims_secret_key'):
+        print("Error: GATEWAY_EDGE_AUTH is enabled but GATEWAY_CLAIMS_SECRET_KEY is not set.")
+        exit(1)
+    edge_verifier = EdgeVerifier(get_config_from_consul('jwt_secret_key'), get_config_from_consul('claims_secret_key'))
+
+STREAMING = get_config_from_consul('streaming')
+STREAM_CHUNK_SIZE = get_config_from_consul('stream_chunk_size')
+
+CACHE_ENABLED = get_config_from_consul('cache_enabled')
+response_cache = ResponseCache(
+    max_entries=get_config_from_consul('cache_max_entries'),
+    max_bytes=get_config_from_consul('cache_max_bytes'),
+    max_entry_bytes=get_config_from_consul('cache_max_entry_bytes'),
+)
+
+COALESCE_TIMEOUT = get_config_from_consul('coalesce_timeout')
+in_flight_gets = SingleFlight()
+
+# Parts of composite endpoints are fetched on this pool, so one request fans out without one thread per part
+aggregate_executor = ThreadPoolExecutor(max_workers=get_config_from_consul('aggregate_workers'),
+                                        thread_name_prefix='aggregate')
+# Conditional headers target the composite response, not its parts
+AGGREGATE_EXCLUDED_HEADERS = {'content-length', 'content-type', 'if-none-match', 'if-modified-since'}
+
+batch_executor = ThreadPoolExecutor(max_workers=get_config_from_consul('batch_workers'), thread_name_prefix='batch')
+BATCH_CONCURRENCY = get_config_from_consul('batch_concurrency')
+BATCH_MAX_ITEMS = get_config_from_consul('batch_max_items')
+BATCH_TIMEOUT = get_config_from_consul('batch_timeout')
+BATCH_RETRY_INTERVAL = 0.01 # in seconds, between attempts of a sub-request held back by a concurrency limit
+# Sub-requests always carry the credentials of the /batch call itself
+BATCH_EXCLUDED_HEADERS = AGGREGATE_EXCLUDED_HEADERS | INTERNAL_HEADERS | {'host', 'authorization', 'cookie'}
+
+COMPRESSION_ENABLED = get_config_from_consul('compression_enabled')
+COMPRESSION_MIN_SIZE = get_config_from_consul('compression_min_size')
+COMPRESSION_TYPES = {t.strip().lower() for t in get_config_from_consul('compression_types').split(',') if t.strip()}
+COMPRESSION_ENCODINGS = available_encodings()
+COMPRESSION_GZIP_LEVEL = get_config_from_consul('compression_gzip_level')
+COMPRESSION_BROTLI_QUALITY = get_config_from_consul('compression_brotli_quality')
+
+# Exclude 'Transfer-Encoding' and 'Content-Encoding' headers
+EXCLUDED_HEADERS = ['transfer-encoding', 'content-encoding']
 
 app = Flask(__name__)
-@app.route('/<path:path>')
-def catch_all(path):
-    # Basic path-based routing
-    target_url = None
-    if path.startswith('users'):
-        target_url = service_registry.get('user-service')
-    elif path.startswith('loans'):
-        service_location = service_registry.get('loan-service', 'Unknown Location')
-        target_url = f"{service_location}/{path}"
-    elif path.startswith('repayments'):
-        target_url = service_registry.get('collection-service')
-    elif path.startswith('reports'):
-        target_url = service_registry.get('reporting-service')
-    
-    if target_url:
+
+
+@app.before_request
+def start_request_timer():
+    if request.endpoint != 'metrics':
+        g.request_timer = RequestTimer(request.method)
+
+
+@app.after_request
+def finish_request_timer(response):
+    timer = g.get('request_timer')
+    if timer is not None:
+        # Runs after the last byte has been sent, and after close_upstream for proxied streams
+        response.call_on_close(timer.finish)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """
+    Compresses the response for clients that accept gzip or brotli. Buffered
+    bodies are compressed in one go; streamed bodies chunk by chunk as they
+    are relayed, so they are never held in memory.
+    """
+    if not COMPRESSION_ENABLED or request.method == 'HEAD':
+        return response
+    if response.status_code < 200 or response.status_code in (204, 206, 304) or 'Content-Encoding' in response.headers:
+        return response
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return response
+    if not content_type_allowed(response.headers.get('Content-Type'), COMPRESSION_TYPES):
+        return response
+    if response.content_length is not None and response.content_length < COMPRESSION_MIN_SIZE:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(request.headers.get('Accept-Encoding'), COMPRESSION_ENCODINGS)
+    if encoding is None:
+        return response
+
+    compressor = Compressor(encoding, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY)
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(), compressor)
+        del response.headers['Content-Length']
+    else:
+        response.set_data(compress_body(response.get_data(), compressor))
+    response.headers['Content-Encoding'] = encoding
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response.headers['ETag'] = f'W/{etag}' # the compressed bytes differ from the upstream representation
+    return response
+
+
+@app.teardown_request
+def finish_failed_request_timer(exception=None):
+    timer = g.get('request_timer')
+    if exception is not None and timer is not None:
+        timer.finish()
+
+
+class _BodyReader:
+    """
+    File-like view over the inbound WSGI stream with a known length, so the
+    upstream request keeps its Content-Length while the body is sent in
+    bounded reads instead of being loaded into memory.
+    """
+
+    def __init__(self, stream, length):
+        self.stream = stream
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(lambda: self.stream.read(STREAM_CHUNK_SIZE), b'')
+
+    def read(self, size=-1):
+        return self.stream.read(STREAM_CHUNK_SIZE if size is None or size < 0 else min(size, STREAM_CHUNK_SIZE))
+
+
+def _upstream_headers():
+    excluded = INTERNAL_HEADERS | hop_by_hop_headers(request.headers)
+    headers = {key: value for (key, value) in request.headers if key != 'Host' and key.lower() not in excluded}
+    if edge_verifier is not None:
+        token = bearer_token(request.headers.get('Authorization'))
+        if token:
+            headers.update(edge_verifier.verified_headers(token) or {})
+    return headers
+
+
+def _downstream_headers(response, drop_length=False):
+    excluded = set(EXCLUDED_HEADERS) | hop_by_hop_headers(response.raw.headers) | ({'content-length'} if drop_length else set())
+    return [(name, value) for (name, value) in response.raw.headers.items() if name.lower() not in excluded]
+
+
+def _streamed_body(headers):
+    if request.content_length is not None:
+        return _BodyReader(request.stream, request.content_length)
+    if request.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+        headers.pop('Content-Length', None)
+        return iter(lambda: request.stream.read(STREAM_CHUNK_SIZE), b'')
+    return None
+
+
+def open_upstream(service, path, method, **kwargs):
+    """
+    Sends a request to one replica of service over its pooled session.
+    Every response returned here must be handed to close_upstream once the
+    body has been consumed, to free the replica and the concurrency slot.
+    Raises UpstreamUnavailableError without calling the upstream when its
+    circuit breaker is open or its concurrency limit is reached.
+    """
+    upstream_guard = guard(service)
+    upstream_guard.enter()
+    try:
+        session = upstream_pool.acquire(service)
+    except Exception:
+        upstream_guard.cancel()
+        raise
+    replicas = balancer(service)
+    try:
+        endpoint = replicas.pick()
+    except Exception:
+        upstream_pool.release(service)
+        upstream_guard.cancel()
+        raise
+    timer = g.get('request_timer') if has_request_context() else None
+    started = time.monotonic()
+    try:
+        response = session.request(method, f"{endpoint.url}/{path}", allow_redirects=False,
+                                   timeout=UPSTREAM_TIMEOUT, **kwargs)
+    except Exception:
+        replicas.release(endpoint, ok=False)
+        upstream_pool.release(service)
+        upstream_guard.exit(time.monotonic() - started, ok=False)
+        raise
+    # Latency to response headers drives the concurrency limit, so slow body streaming is not held against it
+    received = time.monotonic()
+    response.gateway_upstream = (service, endpoint, received - started, received, timer)
+    return response
+
+
+def close_upstream(response):
+    service, endpoint, latency, received, timer = response.gateway_upstream
+    ok = response.status_code < 500
+    response.close()
+    body_seconds = time.monotonic() - received
+    observe_upstream(service, latency, body_seconds)
+    if timer is not None:
+        timer.add_upstream(latency + body_seconds)
+    balancer(service).release(endpoint, ok=ok)
+    upstream_pool.release(service)
+    guard(service).exit(latency, ok)
+
+
+def forward_buffered(service, path):
+    response = open_upstream(
+        service, path, request.method,
+        params=list(request.args.items(multi=True)),
+        headers=_upstream_headers(),
+        data=request.get_data(),
+        cookies=request.cookies)
+    close_upstream(response)
+    return Response(response.content, response.status_code, _downstream_headers(response))
+
+
+def forward_streaming(service, path):
+    """
+    Relays the request and response bodies chunk by chunk. The upstream
+    connection and its concurrency slot are held until the client has
+    received the last chunk (or gone away).
+    """
+    headers = _upstream_headers()
+    response = open_upstream(
+        service, path, request.method,
+        params=list(request.args.items(multi=True)),
+        headers=headers,
+        data=_streamed_body(headers),
+        cookies=request.cookies,
+        stream=True)
+    return _relay(response)
+
+
+def _relay(response, extra_headers=()):
+    """Streams an upstream response opened with stream=True to the client and closes it when done."""
+    # Decoding content-encoding changes the body length, so the upstream length no longer applies
+    decoded = 'content-encoding' in response.headers
+    proxied = Response(response.iter_content(chunk_size=STREAM_CHUNK_SIZE), response.status_code,
+                       _downstream_headers(response, drop_length=decoded) + list(extra_headers))
+    proxied.call_on_close(lambda: close_upstream(response))
+    return proxied
+
+
+def _cached_response(entry, cache_status):
+    # Compressed responses carry the weak form of the entry's ETag
+    if entry.etag is not None and request.headers.get('If-None-Match') in (entry.etag, f'W/{entry.etag}'):
+        return Response(status=304, headers=[('ETag', entry.etag), ('X-Cache', cache_status)])
+    return Response(entry.body, entry.status, entry.headers + [('X-Cache', cache_status)])
+
+
+def forward_cached(route, path):
+    """
+    Serves GETs from the response cache. Fresh entries are answered locally,
+    stale entries with an ETag are revalidated with If-None-Match, and
+    cacheable 200 responses (within the per-entry size limit) are stored.
+    Responses without Cache-Control are only stored on routes with a
+    cache_default_ttl. Anything else is streamed through untouched.
+    """
+    key = cache_key(request.method, request.path, request.args.items(multi=True), request.headers.get('Authorization'))
+    client_directives = parse_cache_control(request.headers.get('Cache-Control'))
+    entry = None if 'no-store' in client_directives else response_cache.get(key)
+    if entry is not None and entry.fresh and 'no-cache' not in client_directives:
+        CACHE_HITS.inc()
+        return _cached_response(entry, 'HIT')
+
+    headers = _upstream_headers()
+    if entry is not None:
+        headers['If-None-Match'] = entry.etag
+
+    generation = response_cache.generation
+    response = open_upstream(
+        route.service, path, 'GET',
+        params=list(request.args.items(multi=True)),
+        headers=headers,
+        cookies=request.cookies,
+        stream=True)
+
+    ttl = response_ttl(response.headers.get('Cache-Control'), route.cache_default_ttl)
+    if entry is not None and response.status_code == 304:
+        close_upstream(response)
+        CACHE_REVALIDATIONS.labels(result='not_modified').inc()
+        if 'Cache-Control' not in response.headers:
+            # A 304 without Cache-Control keeps the freshness the stored response declared
+            ttl = response_ttl(entry.header('Cache-Control'), route.cache_default_ttl)
+        entry.refresh(ttl or 0)
+        return _cached_response(entry, 'REVALIDATED')
+    if entry is not None:
+        CACHE_REVALIDATIONS.labels(result='modified').inc()
+    CACHE_MISSES.inc()
+
+    length = response.headers.get('Content-Length')
+    cacheable = (response.status_code == 200 and ttl is not None and 'Set-Cookie' not in response.headers
+                 and 'no-store' not in client_directives
+                 and length is not None and length.isdigit() and int(length) <= response_cache.max_entry_bytes)
+    if not cacheable:
+        if entry is not None:
+            response_cache.invalidate(key)
+        return _relay(response, [('X-Cache', 'MISS')])
+
+    try:
+        body = response.content
+    finally:
+        close_upstream(response)
+    cached_headers = _downstream_headers(response, drop_length=True)
+    response_cache.put(key, CachedResponse(response.status_code, cached_headers, body, ttl), generation)
+    return Response(body, response.status_code, cached_headers + [('X-Cache', 'MISS')])
+
+
+def forward_get(route, path):
+    if CACHE_ENABLED:
+        return forward_cached(route, path)
+    if STREAMING:
+        return forward_streaming(route.service, path)
+    return forward_buffered(route.service, path)
+
+
+def invalidate_cached(route, method, status):
+    """Drops the cached GETs under route's prefix once a write through it has succeeded."""
+    if CACHE_ENABLED and method not in ('GET', 'HEAD', 'OPTIONS') and status < 400:
+        response_cache.invalidate_prefix('/' + route.prefix.strip('/'))
+
+
+def forward_coalesced(route, path):
+    """
+    Forwards a GET on a coalescing route. Identical concurrent GETs (same
+    path, query and credentials) share the leader's fully buffered response;
+    a waiter that times out forwards its own request instead.
+    """
+    key = cache_key(request.method, request.path, request.args.items(multi=True), request.headers.get('Authorization'))
+
+    def fetch():
+        response = forward_get(route, path)
         try:
-            response = requests.request(
-                method=request.method,
-                url=f"{target_url}/{path}",
-                headers={key: value for (key, value) in request.headers if key != 'Host'},
-                data=request.get_data(),
-                cookies=request.cookies,
-                allow_redirects=False)
+            body = response.get_data()
+        finally:
+            response.close() # frees the upstream slot of a streamed response
+        return response.status_code, list(response.headers.items()), body
+
+    try:
+        status, headers, body = in_flight_gets.do(key, fetch, timeout=COALESCE_TIMEOUT, label=route.prefix)
+    except CoalesceTimeout:
+        return forward_get(route, path)
+    return Response(body, status, headers)
 
-            # Exclude 'Transfer-Encoding' and 'Content-Encoding' headers
-            excluded_headers = ['transfer-encoding', 'content-encoding']
-            headers = [(name, value) for (name, value) in response.raw.headers.items() if name.lower() not in excluded_headers]
 
-            return Response(response.content, response.status_code, headers)
+def forward_aggregate(aggregate, params):
+    """
+    Answers a composite GET by fetching its parts concurrently from their
+    services and merging their JSON bodies into one response.
+    """
+    # Built on the request thread: the workers have no request context
+    headers = {key: value for (key, value) in _upstream_headers().items() if key.lower() not in AGGREGATE_EXCLUDED_HEADERS}
+
+    def fetch(service, path):
+        response = open_upstream(service, path, 'GET', headers=headers)
+        try:
+            body = response.content
+        finally:
+            close_upstream(response)
+        return response.status_code, response.headers, body
 
+    status, payload = run_aggregate(aggregate, params, fetch, aggregate_executor)
+    return jsonify(payload), status
+
+
+def _batch_item_result(response):
+    body = response.content
+    if 'json' in response.headers.get('Content-Type', '') and body:
+        try:
+            body = response.json()
+        except ValueError:
+            body = body.decode('utf-8', 'replace')
+    else:
+        body = body.decode('utf-8', 'replace')
+    return {'status': response.status_code, 'headers': dict(_downstream_headers(response, drop_length=True)), 'body': body}
+
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """
+    Executes a JSON array of sub-requests ({"method", "path", "headers", "body"})
+    concurrently against their upstreams and returns their results in order.
+    """
+    g.request_timer.set_route('batch')
+    try:
+        items = parse_batch(request.get_json(silent=True), BATCH_MAX_ITEMS)
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Built on the request thread: the workers have no request context
+    headers = {key: value for (key, value) in _upstream_headers().items() if key.lower() not in AGGREGATE_EXCLUDED_HEADERS}
+    cookies = dict(request.cookies)
+    deadline = time.monotonic() + BATCH_TIMEOUT
+
+    def execute(item):
+        path = item.path.partition('?')[0]
+        route = resolve_route(path, item.method)
+        if route is None:
+            return {'status': 404, 'error': f'No service configured for path: /{path}'}
+        item_headers = {key: value for (key, value) in item.headers.items() if key.lower() not in BATCH_EXCLUDED_HEADERS}
+        while True:
+            try:
+                response = open_upstream(route.service, item.path, item.method, headers={**headers, **item_headers},
+                                         json=item.body, cookies=cookies)
+                break
+            except UpstreamUnavailableError as e:
+                # A batch is queued work: wait for the limit to free up rather than failing the item
+                if e.reason != 'concurrency_limit' or time.monotonic() + BATCH_RETRY_INTERVAL >= deadline:
+                    return {'status': 503, 'error': f'Service busy: {e}'}
+                time.sleep(BATCH_RETRY_INTERVAL)
+            except (PoolExhaustedError, NoHealthyEndpointError) as e:
+                return {'status': 503, 'error': f'Service busy: {e}'}
+        invalidate_cached(route, item.method, response.status_code)
+        try:
+            return _batch_item_result(response)
+        finally:
+            close_upstream(response)
+
+    return jsonify(run_batch(items, execute, batch_executor, BATCH_CONCURRENCY, BATCH_TIMEOUT)), 200
+
+
+# Prometheus metrics endpoint
+@app.route('/metrics')
+def metrics():
+    return generate_latest(REGISTRY).decode('utf-8'), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+PROXY_METHODS = ['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS']
+
+
+@app.route('/', defaults={'path': ''}, methods=PROXY_METHODS)
+@app.route('/<path:path>', methods=PROXY_METHODS)
+def catch_all(path):
+    if request.method == 'GET':
+        aggregate = resolve_aggregate(path)
+        if aggregate:
+            g.request_timer.set_route(aggregate[0].path)
+            return forward_aggregate(*aggregate)
+
+    route = resolve_route(path, request.method)
+
+    if route:
+        g.request_timer.set_route(route.prefix)
+        service = route.service
+        try:
+            if request.method == 'GET' and route.coalesce:
+                return forward_coalesced(route, path)
+            if request.method == 'GET':
+                return forward_get(route, path)
+            proxied = forward_streaming(service, path) if STREAMING else forward_buffered(service, path)
+            invalidate_cached(route, request.method, proxied.status_code)
+            return proxied
+
+        except (PoolExhaustedError, NoHealthyEndpointError, UpstreamUnavailableError) as e:
+            return jsonify({'error': f'Service busy: {e}'}), 503
         except requests.exceptions.RequestException as e:
             return jsonify({'error': f'Error forwarding request to service: {e}'}), 500
     else:
         return jsonify({'message': f'No service configured for path: /{path}'}), 404
 
 
-    # Basic path-based routing - Old logic
-    # if path.startswith('users'):
-    #     service = 'User Service'
-    #     # TODO: Forward request to User Service
-    # elif path.startswith('loans'):
-    #     service = 'Loan Service'
-    #     # TODO: Forward request to Loan Service
-    #     service_location = service_registry.get('loan-service', 'Unknown Location')
-    # elif path.startswith('repayments'):
-    #     service = 'Repayment Service'
-        # TODO: Forward request to Repayment Service
-        service_location = service_registry.get('repayment-service', 'Unknown Location')
-    else:
-        service = 'Unknown Service'
-        service_location = 'N/A'
-    return jsonify({'message': f'Routing request for /{path} to {service} at {service_location}'}), 200
-# End of old logic
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+    app.run(debug=True, port=5000, threaded=True)
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import time
+
+import aiohttp
+from aiohttp import web
+from prometheus_client import generate_latest, REGISTRY
+
+from routing import resolve_route, balancer, hop_by_hop_headers
+from load_balancer import NoHealthyEndpointError
+from edge_auth import INTERNAL_HEADERS
+from request_metrics import RequestTimer, observe_upstream
+
+
+def get_config_from_consul(key):
+    # Simulate fetching configuration from Consul
+    # In a real scenario, you would use a Consul client library here
+    config_values = {
+        'pool_idle_timeout': float(os.environ.get('GATEWAY_POOL_IDLE_TIMEOUT', 60)), # in seconds
+        'pool_max_concurrency': int(os.environ.get('GATEWAY_POOL_MAX_CONCURRENCY', 1000)), # in-flight requests per upstream
+        'pool_wait_timeout': float(os.environ.get('GATEWAY_POOL_WAIT_TIMEOUT', 5)), # in seconds
+        'stream_chunk_size': int(os.environ.get('GATEWAY_STREAM_CHUNK_SIZE', 64 * 1024)), # in bytes
+        'upstream_connect_timeout': float(os.environ.get('GATEWAY_UPSTREAM_CONNECT_TIMEOUT', 3)), # in seconds
+        'upstream_read_timeout': float(os.environ.get('GATEWAY_UPSTREAM_READ_TIMEOUT', 30)), # in seconds
+        'port': int(os.environ.get('GATEWAY_PORT', 5000)),
+    }
+    return config_values.get(key)
+
+
+STREAM_CHUNK_SIZE = get_config_from_consul('stream_chunk_size')
+
+# Exclude 'Transfer-Encoding' and 'Content-Encoding' headers
+EXCLUDED_HEADERS = ['transfer-encoding', 'content-encoding']
+
+
+class UpstreamSlots:
+    """
+    Per-upstream in-flight limit, mirroring UpstreamPool in the Flask gateway:
+    a request that cannot get a slot within wait_timeout is answered with 503.
+    """
+
+    def __init__(self, max_concurrency, wait_timeout):
+        self.max_concurrency = max_concurrency
+        self.wait_timeout = wait_timeout
+        self._semaphores = {}
+
+    async def acquire(self, upstream):
+        semaphore = self._semaphores.setdefault(upstream, asyncio.Semaphore(self.max_concurrency))
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def release(self, upstream):
+        self._semaphores[upstream].release()
+
+
+async def _open_upstream_session(app):
+    connector = aiohttp.TCPConnector(
+        limit=0, # the per-upstream slots bound concurrency instead
+        keepalive_timeout=get_config_from_consul('pool_idle_timeout'))
+    # Like the Flask gateway's (connect, read) timeouts: no cap on the whole exchange, so long bodies can stream
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=get_config_from_consul('upstream_connect_timeout'),
+                                    sock_read=get_config_from_consul('upstream_read_timeout'))
+    app['upstream_session'] = aiohttp.ClientSession(connector=connector, timeout=timeout, auto_decompress=True)
+    app['upstream_slots'] = UpstreamSlots(get_config_from_consul('pool_max_concurrency'),
+                                          get_config_from_consul('pool_wait_timeout'))
+
+
+async def _close_upstream_session(app):
+    await app['upstream_session'].close()
+
+
+# Prometheus metrics endpoint
+async def metrics(request):
+    return web.Response(body=generate_latest(REGISTRY), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+
+async def catch_all(request):
+    timer = RequestTimer(request.method)
+    try:
+        return await _proxy(request, timer)
+    finally:
+        timer.finish()
+
+
+async def _proxy(request, timer):
+    path = request.match_info['path']
+    route = resolve_route(path, request.method)
+
+    if not route:
+        return web.json_response({'message': f'No service configured for path: /{path}'}, status=404)
+
+    timer.set_route(route.prefix)
+    service = route.service
+    slots = request.app['upstream_slots']
+    if not await slots.acquire(service):
+        return web.json_response({'error': f'Service busy: no free connection slot for {service}'}, status=503)
+    try:
+        excluded = {'host'} | INTERNAL_HEADERS | hop_by_hop_headers(request.headers)
+        headers = {key: value for (key, value) in request.headers.items() if key.lower() not in excluded}
+        body = request.content if request.body_exists else None
+        replicas = balancer(service)
+        try:
+            endpoint = replicas.pick()
+        except NoHealthyEndpointError as e:
+            return web.json_response({'error': f'Service busy: {e}'}, status=503)
+        response = None
+        ok = False
+        try:
+            started = time.monotonic()
+            async with request.app['upstream_session'].request(
+                    request.method, f"{endpoint.url}/{path}",
+                    params=request.rel_url.query,
+                    headers=headers,
+                    data=body,
+                    allow_redirects=False) as upstream:
+                received = time.monotonic()
+                ok = upstream.status < 500
+                excluded = (set(EXCLUDED_HEADERS) | hop_by_hop_headers(upstream.headers)
+                            | ({'content-length'} if 'Content-Encoding' in upstream.headers else set()))
+                response = web.StreamResponse(
+                    status=upstream.status,
+                    headers=[(name, value) for (name, value) in upstream.headers.items() if name.lower() not in excluded])
+                await response.prepare(request)
+                async for chunk in upstream.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    await response.write(chunk)
+                await response.write_eof()
+                body_seconds = time.monotonic() - received
+                observe_upstream(service, received - started, body_seconds)
+                timer.add_upstream(received - started + body_seconds)
+                return response
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if response is not None:
+                # Headers are already on the wire; all we can do is cut the connection
+                raise
+            # A timeout carries no message of its own
+            return web.json_response({'error': f'Error forwarding request to service: {str(e) or "timed out"}'}, status=500)
+        finally:
+            replicas.release(endpoint, ok=ok)
+    finally:
+        slots.release(service)
+
+
+def create_app():
+    app = web.Application(client_max_size=0)
+    app.on_startup.append(_open_upstream_session)
+    app.on_cleanup.append(_close_upstream_session)
+    app.router.add_get('/metrics', metrics)
+    app.router.add_route('*', '/{path:.*}', catch_all)
+    return app
+
+
+if __name__ == '__main__':
+    web.run_app(create_app(), port=get_config_from_consul('port'))
@@ -0,0 +1,82 @@
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from prometheus_client import Counter, Histogram
+
+BATCH_ITEMS = Counter('api_gateway_batch_items_total', 'Sub-requests executed through /batch', ['result'])
+BATCH_SIZE = Histogram('api_gateway_batch_size', 'Sub-requests per /batch call',
+                       buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+BATCH_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD'}
+
+
+class BatchError(Exception):
+    """Raised when a /batch payload is malformed; the message is returned to the client."""
+
+
+class BatchItem:
+    def __init__(self, method, path, headers=None, body=None):
+        self.method = method
+        self.path = path.lstrip('/') # may carry a query string
+        self.headers = headers or {}
+        self.body = body
+
+
+def parse_batch(payload, max_items):
+    """Validates a decoded /batch payload (a JSON array of sub-requests) and returns BatchItems."""
+    if not isinstance(payload, list):
+        raise BatchError('Batch body must be a JSON array of sub-requests')
+    if len(payload) > max_items:
+        raise BatchError(f'Batch has {len(payload)} sub-requests, the limit is {max_items}')
+    items = []
+    for index, entry in enumerate(payload):
+        if not isinstance(entry, dict) or not isinstance(entry.get('path'), str):
+            raise BatchError(f"Sub-request {index} needs a 'path'")
+        method = str(entry.get('method', 'GET')).upper()
+        if method not in BATCH_METHODS:
+            raise BatchError(f"Sub-request {index} has unsupported method '{method}'")
+        headers = entry.get('headers') or {}
+        if not isinstance(headers, dict):
+            raise BatchError(f"Sub-request {index} 'headers' must be an object")
+        items.append(BatchItem(method, entry['path'], {str(k): str(v) for k, v in headers.items()}, entry.get('body')))
+    return items
+
+
+def run_batch(items, execute, executor, concurrency, timeout):
+    """
+    Runs execute(item) for every item on executor, keeping at most concurrency
+    of them in flight, and returns their results in item order.
+
+    Items still running or not yet started when timeout seconds have passed
+    are answered with a 504 result; one that raises gets a 502 result.
+    """
+    BATCH_SIZE.observe(len(items))
+    deadline = time.monotonic() + timeout
+    results = [None] * len(items)
+    pending = {}
+    next_index = 0
+
+    while next_index < len(items) or pending:
+        while next_index < len(items) and len(pending) < concurrency:
+            pending[executor.submit(execute, items[next_index])] = next_index
+            next_index += 1
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            index = pending.pop(future)
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = {'status': 502, 'error': str(e)}
+
+    for future in pending:
+        future.cancel() # a call already under way finishes in the background and is discarded
+    for index, result in enumerate(results):
+        if result is None:
+            results[index] = {'status': 504, 'error': f'No response within the {timeout}s batch deadline'}
+            BATCH_ITEMS.labels(result='timeout').inc()
+        else:
+            BATCH_ITEMS.labels(result='ok' if result['status'] < 400 else 'error').inc()
+    return results
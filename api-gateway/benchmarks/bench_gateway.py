@@ -0,0 +1,140 @@
+"""
+Compares the Flask gateway (app.py) with the asyncio gateway (async_app.py).
+
+A stub loan-service that answers after a fixed delay is started together with
+each gateway in its own process; a load generator then keeps `--concurrency`
+requests in flight until `--requests` have completed and reports throughput
+and latency percentiles for each engine.
+
+    python benchmarks/bench_gateway.py --requests 2000 --concurrency 200 --delay 0.05
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+GATEWAY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPSTREAM_PORT = 5902
+SYNC_PORT = 5900
+ASYNC_PORT = 5901
+
+
+def run_upstream(port, delay):
+    async def loans(request):
+        await asyncio.sleep(delay)
+        return web.json_response([{'id': i, 'status': 'active'} for i in range(20)])
+
+    app = web.Application()
+    app.router.add_get('/{path:.*}', loans)
+    web.run_app(app, port=port, print=None)
+
+
+def _point_routes_at_stub():
+    routes_file = os.path.join(tempfile.mkdtemp(), 'routes.yaml')
+    with open(routes_file, 'w') as f:
+        f.write(f"services:\n  loan-service: http://localhost:{UPSTREAM_PORT}\n"
+                "routes:\n  - prefix: loans\n    service: loan-service\n")
+    os.environ['GATEWAY_ROUTES_FILE'] = routes_file
+    sys.path.insert(0, GATEWAY_DIR)
+
+
+def run_sync_gateway(port):
+    _point_routes_at_stub()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    from werkzeug.serving import make_server
+    import app
+    make_server('localhost', port, app.app, threaded=True).serve_forever()
+
+
+def run_async_gateway(port):
+    _point_routes_at_stub()
+    import async_app
+    web.run_app(async_app.create_app(), port=port, print=None)
+
+
+async def _wait_until_up(url, timeout=10):
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f'{url} did not come up within {timeout}s')
+
+
+async def drive(url, total, concurrency):
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                started = time.perf_counter()
+                try:
+                    async with session.get(url) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'throughput': total / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p99': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--delay', type=float, default=0.05, help='upstream response delay in seconds')
+    args = parser.parse_args()
+
+    # Give both engines the same headroom so the comparison is about the engine, not the limit
+    os.environ.setdefault('GATEWAY_POOL_MAX_CONCURRENCY', str(args.concurrency))
+
+    processes = [
+        multiprocessing.Process(target=run_upstream, args=(UPSTREAM_PORT, args.delay), daemon=True),
+        multiprocessing.Process(target=run_sync_gateway, args=(SYNC_PORT,), daemon=True),
+        multiprocessing.Process(target=run_async_gateway, args=(ASYNC_PORT,), daemon=True),
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        for name, port in (('sync (Flask)', SYNC_PORT), ('async (aiohttp)', ASYNC_PORT)):
+            url = f'http://localhost:{port}/loans'
+            asyncio.run(_wait_until_up(url))
+            result = asyncio.run(drive(url, args.requests, args.concurrency))
+            print(f"{name:16} {result['throughput']:8.1f} req/s  p50 {result['p50']:7.1f} ms  "
+                  f"p99 {result['p99']:7.1f} ms  errors {result['errors']}")
+    finally:
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == '__main__':
+    main()
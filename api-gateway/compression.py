@@ -0,0 +1,126 @@
+import time
+import zlib
+
+from prometheus_client import Counter
+
+try:
+    import brotli
+except ImportError: # brotli is optional; without it only gzip is offered
+    brotli = None
+
+COMPRESSED_RESPONSES = Counter('api_gateway_compressed_responses_total', 'Responses compressed by the gateway', ['encoding'])
+COMPRESSION_BYTES_IN = Counter('api_gateway_compression_bytes_in_total', 'Response bytes before compression', ['encoding'])
+COMPRESSION_BYTES_OUT = Counter('api_gateway_compression_bytes_out_total', 'Response bytes after compression', ['encoding'])
+COMPRESSION_BYTES_SAVED = Counter('api_gateway_compression_bytes_saved_total',
+                                  'Bytes kept off the wire by response compression', ['encoding'])
+COMPRESSION_CPU = Counter('api_gateway_compression_cpu_seconds_total', 'CPU time spent compressing responses', ['encoding'])
+
+
+def available_encodings():
+    """Encodings the gateway can produce, in order of preference."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate(accept_encoding, encodings):
+    """
+    Picks the encoding to use for a request's Accept-Encoding header, or None.
+    The highest q-value wins; ties go to the earlier entry of encodings.
+    """
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def content_type_allowed(content_type, allowlist):
+    """Matches a Content-Type against entries such as 'application/json' or 'text/*'."""
+    mimetype = (content_type or '').split(';')[0].strip().lower()
+    if not mimetype:
+        return False
+    major = mimetype.split('/')[0]
+    return mimetype in allowlist or f'{major}/*' in allowlist
+
+
+class Compressor:
+    def __init__(self, encoding, gzip_level=5, brotli_quality=4):
+        self.encoding = encoding
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+        self.reported = False
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS) # gzip framing
+
+    def compress(self, data, flush=False):
+        """Compresses a chunk; with flush, everything given so far is emitted so the client is not kept waiting."""
+        started = time.thread_time()
+        if self.encoding == 'br':
+            out = self._compressor.process(data)
+            if flush:
+                out += self._compressor.flush()
+        else:
+            out = self._compressor.compress(data)
+            if flush:
+                out += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._account(len(data), out, started)
+        return out
+
+    def finish(self):
+        started = time.thread_time()
+        out = self._compressor.finish() if self.encoding == 'br' else self._compressor.flush()
+        self._account(0, out, started)
+        self.report()
+        return out
+
+    def _account(self, size_in, out, started):
+        self.cpu_seconds += time.thread_time() - started
+        self.bytes_in += size_in
+        self.bytes_out += len(out)
+
+    def report(self):
+        if self.reported:
+            return
+        self.reported = True
+        COMPRESSED_RESPONSES.labels(encoding=self.encoding).inc()
+        COMPRESSION_BYTES_IN.labels(encoding=self.encoding).inc(self.bytes_in)
+        COMPRESSION_BYTES_OUT.labels(encoding=self.encoding).inc(self.bytes_out)
+        COMPRESSION_BYTES_SAVED.labels(encoding=self.encoding).inc(max(0, self.bytes_in - self.bytes_out))
+        COMPRESSION_CPU.labels(encoding=self.encoding).inc(self.cpu_seconds)
+
+
+def compress_body(body, compressor):
+    return compressor.compress(body) + compressor.finish()
+
+
+def compress_stream(chunks, compressor):
+    """
+    Compresses an iterable of body chunks without buffering it. Each chunk is
+    flushed as it is compressed, so a slow upstream stream still reaches the
+    client incrementally.
+    """
+    try:
+        for chunk in chunks:
+            if chunk:
+                out = compressor.compress(chunk, flush=True)
+                if out:
+                    yield out
+        yield compressor.finish()
+    finally:
+        compressor.report() # also counts a stream the client abandoned part way
@@ -0,0 +1,113 @@
+import random
+import threading
+import time
+
+from prometheus_client import Counter, Gauge
+
+ENDPOINT_OUTSTANDING = Gauge('api_gateway_endpoint_outstanding_requests',
+                             'In-flight requests per upstream replica', ['upstream', 'endpoint'])
+ENDPOINT_EJECTIONS = Counter('api_gateway_endpoint_ejections_total',
+                             'Upstream replicas ejected after consecutive failures', ['upstream', 'endpoint'])
+
+
+class NoHealthyEndpointError(Exception):
+    """Raised when an upstream has no replicas configured."""
+
+
+class Endpoint:
+    def __init__(self, url, now):
+        self.url = url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejection_count = 0
+        self.ejected_until = 0.0
+        self.warming_since = now
+
+    def ejected(self, now):
+        return now < self.ejected_until
+
+
+class LoadBalancer:
+    """
+    Client-side balancing over the replicas of one upstream service.
+
+    Picks with power-of-two-choices on outstanding requests. A replica that
+    fails failure_threshold times in a row is ejected for ejection_time
+    seconds (growing with each repeated ejection), but never so many that
+    more than max_ejection_percent of the replicas are out. New and returning
+    replicas ramp up their share of traffic over slow_start seconds.
+    """
+
+    def __init__(self, upstream, urls, slow_start=30, failure_threshold=5, ejection_time=30,
+                 max_ejection_percent=50):
+        self.upstream = upstream
+        self.slow_start = slow_start
+        self.failure_threshold = failure_threshold
+        self.ejection_time = ejection_time
+        self.max_ejection_percent = max_ejection_percent
+        self.endpoints = []
+        self._lock = threading.Lock()
+        self.update(urls, initial=True)
+
+    def update(self, urls, initial=False):
+        """Replaces the replica set, keeping the state of replicas that stay."""
+        now = time.monotonic()
+        with self._lock:
+            current = {endpoint.url: endpoint for endpoint in self.endpoints}
+            endpoints = []
+            for url in urls:
+                endpoint = current.get(url)
+                if endpoint is None:
+                    endpoint = Endpoint(url, now)
+                    if initial:
+                        endpoint.warming_since = now - self.slow_start # nothing to protect from at startup
+                endpoints.append(endpoint)
+            self.endpoints = endpoints
+
+    def _weight(self, endpoint, now):
+        if not self.slow_start:
+            return 1.0
+        return min(1.0, max(0.1, (now - endpoint.warming_since) / self.slow_start))
+
+    def pick(self):
+        now = time.monotonic()
+        with self._lock:
+            if not self.endpoints:
+                raise NoHealthyEndpointError(f'No endpoints configured for {self.upstream}')
+            candidates = [endpoint for endpoint in self.endpoints if not endpoint.ejected(now)] or self.endpoints
+            if len(candidates) == 1:
+                chosen = candidates[0]
+            else:
+                first, second = random.sample(candidates, 2)
+                chosen = min((first, second), key=lambda e: (e.outstanding + 1) / self._weight(e, now))
+            chosen.outstanding += 1
+        ENDPOINT_OUTSTANDING.labels(upstream=self.upstream, endpoint=chosen.url).inc()
+        return chosen
+
+    def release(self, endpoint, ok):
+        """Records the outcome of a request sent to endpoint by pick()."""
+        now = time.monotonic()
+        ejected = False
+        with self._lock:
+            endpoint.outstanding -= 1
+            if ok:
+                endpoint.consecutive_failures = 0
+                if not endpoint.ejected(now) and endpoint.ejection_count and now - endpoint.ejected_until > self.ejection_time:
+                    endpoint.ejection_count = 0
+            else:
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= self.failure_threshold and not endpoint.ejected(now):
+                    ejected = self._eject(endpoint, now)
+        ENDPOINT_OUTSTANDING.labels(upstream=self.upstream, endpoint=endpoint.url).dec()
+        if ejected:
+            ENDPOINT_EJECTIONS.labels(upstream=self.upstream, endpoint=endpoint.url).inc()
+
+    def _eject(self, endpoint, now):
+        ejected_count = sum(1 for e in self.endpoints if e.ejected(now))
+        if (ejected_count + 1) * 100 > self.max_ejection_percent * len(self.endpoints):
+            return False
+        endpoint.ejection_count += 1
+        endpoint.ejected_until = now + self.ejection_time * endpoint.ejection_count
+        endpoint.warming_since = endpoint.ejected_until # ramp back up once it returns
+        endpoint.consecutive_failures = 0
+        return True
@@ -0,0 +1,57 @@
+import time
+
+from prometheus_client import Gauge, Histogram
+
+REQUEST_DURATION = Histogram('api_gateway_request_duration_seconds',
+                             'Time from receiving a request to sending the last byte of its response', ['route', 'method'])
+REQUESTS_IN_FLIGHT = Gauge('api_gateway_requests_in_flight', 'Requests currently being handled, per route', ['route'])
+UPSTREAM_HEADERS = Histogram('api_gateway_upstream_headers_seconds',
+                             'Time from sending an upstream request to receiving its response headers', ['upstream'])
+UPSTREAM_BODY = Histogram('api_gateway_upstream_body_seconds',
+                          'Time from upstream response headers until the body was consumed', ['upstream'])
+GATEWAY_OVERHEAD = Histogram('api_gateway_overhead_seconds',
+                             'Request time not spent on the upstream call, for requests answered by exactly one upstream call',
+                             ['route'], buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0))
+
+UNMATCHED = 'unmatched'
+
+
+def observe_upstream(upstream, headers_seconds, body_seconds):
+    UPSTREAM_HEADERS.labels(upstream=upstream).observe(headers_seconds)
+    UPSTREAM_BODY.labels(upstream=upstream).observe(body_seconds)
+
+
+class RequestTimer:
+    """
+    Timing of one gateway request. finish() is called once the response has
+    been sent in full, which for a streamed response is after its last chunk.
+    """
+
+    def __init__(self, method):
+        self.method = method
+        self.started = time.monotonic()
+        self.route = None
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.finished = False
+
+    def set_route(self, route):
+        """Labels the request with its route once resolved; it counts as in flight from here on."""
+        self.route = route
+        REQUESTS_IN_FLIGHT.labels(route=route).inc()
+
+    def add_upstream(self, seconds):
+        self.upstream_calls += 1
+        self.upstream_seconds += seconds
+
+    def finish(self):
+        if self.finished:
+            return
+        self.finished = True
+        total = time.monotonic() - self.started
+        route = self.route or UNMATCHED
+        REQUEST_DURATION.labels(route=route, method=self.method).observe(total)
+        if self.route is not None:
+            REQUESTS_IN_FLIGHT.labels(route=self.route).dec()
+        if self.upstream_calls == 1:
+            GATEWAY_OVERHEAD.labels(route=route).observe(max(0.0, total - self.upstream_seconds))
@@ -0,0 +1,161 @@
+import threading
+import time
+
+from prometheus_client import Counter, Gauge
+
+BREAKER_STATE = Gauge('api_gateway_circuit_breaker_state',
+                      'Circuit breaker state per upstream (0 closed, 1 half-open, 2 open)', ['upstream'])
+CONCURRENCY_LIMIT = Gauge('api_gateway_concurrency_limit', 'Current adaptive concurrency limit per upstream', ['upstream'])
+CONCURRENCY_IN_FLIGHT = Gauge('api_gateway_concurrency_in_flight', 'Requests counted against the concurrency limit', ['upstream'])
+REJECTED_REQUESTS = Counter('api_gateway_rejected_requests_total',
+                            'Requests failed fast without calling the upstream', ['upstream', 'reason'])
+
+CLOSED = 'closed'
+HALF_OPEN = 'half-open'
+OPEN = 'open'
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class UpstreamUnavailableError(Exception):
+    """Raised when a request is rejected by a circuit breaker or concurrency limit."""
+
+    def __init__(self, message, reason):
+        super().__init__(message)
+        self.reason = reason # 'circuit_open' or 'concurrency_limit'
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for
+    reset_timeout seconds. It then lets up to half_open_calls probe requests
+    through: one success closes it again, one failure re-opens it.
+    """
+
+    def __init__(self, upstream, failure_threshold=5, reset_timeout=10, half_open_calls=1):
+        self.upstream = upstream
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self._lock = threading.Lock()
+        BREAKER_STATE.labels(upstream=upstream).set(0)
+
+    def _set_state(self, state):
+        self.state = state
+        BREAKER_STATE.labels(upstream=self.upstream).set(_STATE_VALUES[state])
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self._set_state(HALF_OPEN)
+                self.probes = 0
+            if self.state == HALF_OPEN:
+                if self.probes >= self.half_open_calls:
+                    return False
+                self.probes += 1
+            return True
+
+    def cancel(self):
+        """Gives back a half-open probe slot taken by allow() for a call that was never made."""
+        with self._lock:
+            if self.state == HALF_OPEN and self.probes:
+                self.probes -= 1
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.failures = 0
+                if self.state == HALF_OPEN:
+                    self._set_state(CLOSED)
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._set_state(OPEN)
+                self.opened_at = time.monotonic()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit driven by observed latency.
+
+    Each completed request is compared against a slowly moving latency
+    baseline. A failure, or a request slower than baseline * tolerance,
+    shrinks the limit by backoff; a healthy request made while the limit was
+    actually in use grows it by one per limit's worth of requests.
+    """
+
+    def __init__(self, upstream, initial_limit=20, min_limit=1, max_limit=200, backoff=0.9, tolerance=2.0):
+        self.upstream = upstream
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.baseline = None
+        self._lock = threading.Lock()
+        CONCURRENCY_LIMIT.labels(upstream=upstream).set(self.limit)
+
+    def try_acquire(self):
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+        CONCURRENCY_IN_FLIGHT.labels(upstream=self.upstream).inc()
+        return True
+
+    def cancel(self):
+        """Gives back a slot for a call that was admitted but never sent."""
+        with self._lock:
+            self.in_flight -= 1
+        CONCURRENCY_IN_FLIGHT.labels(upstream=self.upstream).dec()
+
+    def release(self, latency, ok):
+        with self._lock:
+            saturated = self.in_flight >= int(self.limit) / 2
+            self.in_flight -= 1
+            if self.baseline is None:
+                self.baseline = latency
+            slow = latency > self.baseline * self.tolerance
+            if not ok or slow:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            elif saturated:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if ok:
+                # A slow-moving average so that a sustained slowdown eventually becomes the new normal
+                self.baseline += 0.01 * (latency - self.baseline)
+            limit = self.limit
+        CONCURRENCY_IN_FLIGHT.labels(upstream=self.upstream).dec()
+        CONCURRENCY_LIMIT.labels(upstream=self.upstream).set(limit)
+
+
+class UpstreamGuard:
+    """The circuit breaker and concurrency limiter in front of one upstream."""
+
+    def __init__(self, upstream, breaker, limiter):
+        self.upstream = upstream
+        self.breaker = breaker
+        self.limiter = limiter
+
+    def enter(self):
+        """Admits a call or raises UpstreamUnavailableError; every admitted call must be matched by exit()."""
+        if not self.breaker.allow():
+            REJECTED_REQUESTS.labels(upstream=self.upstream, reason='circuit_open').inc()
+            raise UpstreamUnavailableError(f'Circuit breaker for {self.upstream} is open', 'circuit_open')
+        if not self.limiter.try_acquire():
+            self.breaker.cancel()
+            REJECTED_REQUESTS.labels(upstream=self.upstream, reason='concurrency_limit').inc()
+            raise UpstreamUnavailableError(f'Concurrency limit reached for {self.upstream}', 'concurrency_limit')
+
+    def exit(self, latency, ok):
+        self.limiter.release(latency, ok)
+        self.breaker.record(ok)
+
+    def cancel(self):
+        self.limiter.cancel()
+        self.breaker.cancel()
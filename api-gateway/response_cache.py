@@ -0,0 +1,146 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter, Gauge
+
+CACHE_HITS = Counter('api_gateway_cache_hits_total', 'GET responses served from the gateway cache')
+CACHE_MISSES = Counter('api_gateway_cache_misses_total', 'GET responses fetched in full from an upstream')
+CACHE_REVALIDATIONS = Counter('api_gateway_cache_revalidations_total',
+                              'Stale cache entries revalidated with If-None-Match', ['result'])
+CACHE_EVICTIONS = Counter('api_gateway_cache_evictions_total', 'Cache entries evicted to stay within limits')
+CACHE_ENTRIES = Gauge('api_gateway_cache_entries', 'Responses currently held in the gateway cache')
+CACHE_BYTES = Gauge('api_gateway_cache_bytes', 'Approximate memory held by cached responses')
+
+
+def cache_key(method, path, query_items, authorization):
+    """
+    Cache key for a request. The Authorization header is folded in as a digest,
+    so responses are only ever shared between requests with the same credentials.
+    """
+    auth_scope = hashlib.sha256(authorization.encode('utf-8')).hexdigest() if authorization else ''
+    return (method, path, tuple(sorted(query_items)), auth_scope)
+
+
+def parse_cache_control(value):
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, argument = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def response_ttl(cache_control, default_ttl):
+    """
+    Seconds a response may be served without revalidation, or None if it must not be stored.
+    """
+    directives = parse_cache_control(cache_control)
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0
+    for name in ('s-maxage', 'max-age'):
+        if directives.get(name) is not None:
+            try:
+                return max(0, int(directives[name]))
+            except ValueError:
+                return 0
+    return default_ttl
+
+
+class CachedResponse:
+    def __init__(self, status, headers, body, ttl):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.etag = self.header('ETag')
+        self.size = len(body) + sum(len(name) + len(value) for (name, value) in headers)
+        self.refresh(ttl)
+
+    def header(self, name):
+        return next((value for (header, value) in self.headers if header.lower() == name.lower()), None)
+
+    def refresh(self, ttl):
+        self.expires_at = time.monotonic() + ttl
+
+    @property
+    def fresh(self):
+        return time.monotonic() < self.expires_at
+
+
+class ResponseCache:
+    """
+    Bounded LRU of upstream responses with a per-entry TTL.
+
+    Expired entries that carry an ETag are kept so they can be revalidated with
+    a conditional request; expired entries without one are dropped on lookup.
+
+    invalidate_prefix() bumps a generation; a response fetched before that
+    (read generation before the fetch, pass it to put()) is not stored, so a
+    GET that raced a write cannot put the old body back.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=64 * 1024 * 1024, max_entry_bytes=1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if not entry.fresh and entry.etag is None:
+                self._remove(key)
+                self._update_gauges()
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry, generation=None):
+        if entry.size > self.max_entry_bytes:
+            return False
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                CACHE_EVICTIONS.inc()
+            self._update_gauges()
+        return True
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self._update_gauges()
+
+    def invalidate_prefix(self, path_prefix):
+        """Drops the entries for path_prefix and every path below it, for all queries and credentials."""
+        prefix = path_prefix.rstrip('/')
+        with self._lock:
+            self.generation += 1
+            for key in [key for key in self._entries if key[1] == prefix or key[1].startswith(prefix + '/')]:
+                self._remove(key)
+            self._update_gauges()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _update_gauges(self):
+        CACHE_ENTRIES.set(len(self._entries))
+        CACHE_BYTES.set(self._bytes)
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,247 @@
+import logging
+import os
+import threading
+import time
+
+from urllib.parse import quote
+
+import yaml
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+ROUTE_MATCHES = Counter('api_gateway_route_matches_total',
+                        'Requests matched to each gateway route', ['route', 'service'])
+ROUTE_MISSES = Counter('api_gateway_route_misses_total',
+                       'Requests that matched no gateway route')
+
+
+class RouteTableError(Exception):
+    """Raised when a route table definition is invalid."""
+
+
+class Route:
+    def __init__(self, prefix, service, methods=None, coalesce=False, cache_default_ttl=None):
+        self.prefix = prefix
+        self.service = service
+        self.methods = frozenset(m.upper() for m in methods) if methods else None
+        self.coalesce = coalesce # collapse identical concurrent GETs into one upstream call
+        self.cache_default_ttl = cache_default_ttl # seconds to cache responses without Cache-Control; None: do not store
+
+    def allows(self, method):
+        return self.methods is None or method.upper() in self.methods
+
+
+class AggregatePart:
+    def __init__(self, name, service, path, required=False, paginate=False, max_pages=10):
+        self.name = name
+        self.service = service
+        self.path = path.lstrip('/') # may carry a query string and {param} placeholders
+        self.required = required # the whole response fails when this part does
+        self.paginate = paginate # follow X-Next-Cursor and concatenate the pages' JSON arrays
+        self.max_pages = max_pages # when paginating; the part is reported as partial if more remain
+
+    def render(self, params):
+        return self.path.format(**{name: quote(value, safe='') for name, value in params.items()})
+
+
+class DerivedPart:
+    """A part computed from another part's JSON array instead of fetched: the items whose fields equal where."""
+
+    def __init__(self, name, source, where=None, required=False):
+        self.name = name
+        self.source = source
+        self.where = dict(where or {})
+        self.required = required
+
+    def derive(self, items):
+        return [item for item in items if isinstance(item, dict)
+                and all(item.get(field) == value for field, value in self.where.items())]
+
+
+class Aggregate:
+    """A composite GET endpoint whose parts are fetched concurrently and merged into one JSON object."""
+
+    def __init__(self, path, parts, timeout=5.0):
+        self.path = path
+        self.parts = list(parts)
+        self.fetched_parts = [part for part in self.parts if not isinstance(part, DerivedPart)]
+        self.timeout = timeout
+        self._segments = [segment for segment in path.strip('/').split('/') if segment]
+
+    def match(self, segments):
+        """Returns the path parameters if segments match this endpoint's template, else None."""
+        if len(segments) != len(self._segments):
+            return None
+        params = {}
+        for template, segment in zip(self._segments, segments):
+            if template.startswith('{') and template.endswith('}'):
+                params[template[1:-1]] = segment
+            elif template != segment:
+                return None
+        return params
+
+
+class _Node:
+    __slots__ = ('children', 'routes')
+
+    def __init__(self):
+        self.children = {}
+        self.routes = []
+
+
+class RouteTable:
+    """
+    Path-prefix routes compiled into a trie over path segments.
+
+    A lookup walks the request path once and returns the route with the
+    longest matching prefix whose method filter accepts the request method.
+    """
+
+    def __init__(self, services, routes, aggregates=()):
+        # Each service maps to one base URL or a list of replica base URLs
+        self.services = {name: [urls] if isinstance(urls, str) else list(urls) for name, urls in services.items()}
+        self.routes = list(routes)
+        self.aggregates = list(aggregates)
+        self._root = _Node()
+        for name, urls in self.services.items():
+            if not urls:
+                raise RouteTableError(f"Service '{name}' has no endpoints")
+        for route in self.routes:
+            if route.service not in self.services:
+                raise RouteTableError(f"Route '{route.prefix}' points at unknown service '{route.service}'")
+            node = self._root
+            for segment in _segments(route.prefix):
+                node = node.children.setdefault(segment, _Node())
+            node.routes.append(route)
+        for aggregate in self.aggregates:
+            if not aggregate.fetched_parts:
+                raise RouteTableError(f"Aggregate '{aggregate.path}' has no parts to fetch")
+            fetched = {part.name for part in aggregate.fetched_parts}
+            for part in aggregate.parts:
+                if isinstance(part, DerivedPart):
+                    if part.source not in fetched:
+                        raise RouteTableError(f"Aggregate '{aggregate.path}' part '{part.name}' derives from unknown part '{part.source}'")
+                elif part.service not in self.services:
+                    raise RouteTableError(f"Aggregate '{aggregate.path}' part '{part.name}' points at unknown service '{part.service}'")
+
+    @classmethod
+    def from_config(cls, config):
+        if not isinstance(config, dict) or not isinstance(config.get('services'), dict) or 'routes' not in config:
+            raise RouteTableError("Route table needs top-level 'services' and 'routes' keys")
+        try:
+            routes = [Route(entry['prefix'], entry['service'], entry.get('methods'), bool(entry.get('coalesce', False)),
+                            None if entry.get('cache_default_ttl') is None else int(entry['cache_default_ttl']))
+                      for entry in config['routes']]
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            raise RouteTableError(f'Invalid route entry: {e}')
+        try:
+            aggregates = [Aggregate(entry['path'], [_aggregate_part(name, part) for name, part in entry['parts'].items()],
+                                    float(entry.get('timeout', 5)))
+                          for entry in config.get('aggregates') or []]
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            raise RouteTableError(f'Invalid aggregate entry: {e}')
+        return cls(config['services'], routes, aggregates)
+
+    @classmethod
+    def from_file(cls, path):
+        try:
+            with open(path, 'r') as f:
+                return cls.from_config(yaml.safe_load(f))
+        except yaml.YAMLError as e:
+            raise RouteTableError(f'Error parsing route table {path}: {e}')
+
+    def match(self, path, method='GET'):
+        best = None
+        node = self._root
+        for route in node.routes:
+            if route.allows(method):
+                best = route
+        for segment in _segments(path):
+            node = node.children.get(segment)
+            if node is None:
+                break
+            for route in node.routes:
+                if route.allows(method):
+                    best = route
+        return best
+
+    def match_aggregate(self, path):
+        """Returns (aggregate, path parameters) for a composite endpoint path, or None."""
+        segments = _segments(path)
+        for aggregate in self.aggregates:
+            params = aggregate.match(segments)
+            if params is not None:
+                return aggregate, params
+        return None
+
+
+def _aggregate_part(name, part):
+    if 'from' in part:
+        return DerivedPart(name, part['from'], dict(part.get('where') or {}), bool(part.get('required', False)))
+    return AggregatePart(name, part['service'], part['path'], bool(part.get('required', False)),
+                         bool(part.get('paginate', False)), int(part.get('max_pages', 10)))
+
+
+def _segments(path):
+    return [segment for segment in path.strip('/').split('/') if segment]
+
+
+class ReloadingRouteTable:
+    """
+    Serves lookups from a RouteTable loaded from a YAML file and swaps in a
+    freshly compiled table when the file changes. The file's mtime is checked
+    at most once every check_interval seconds; a table that fails to load is
+    logged and the previous one stays in service. on_reload, if given, is
+    called with every table that goes into service, including the first.
+    """
+
+    def __init__(self, path, check_interval=2.0, on_reload=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.on_reload = on_reload
+        self._lock = threading.Lock()
+        self._mtime = os.path.getmtime(path)
+        self._table = RouteTable.from_file(path)
+        self._next_check = time.monotonic() + check_interval
+        if on_reload:
+            on_reload(self._table)
+
+    @property
+    def table(self):
+        if time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        return self._table
+
+    def _maybe_reload(self):
+        if not self._lock.acquire(blocking=False):
+            return # another thread is already checking
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError as e:
+                logger.error(f"Route table {self.path} is unreadable, keeping current routes: {e}")
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                table = RouteTable.from_file(self.path)
+            except (OSError, RouteTableError) as e:
+                logger.error(f"Route table reload failed, keeping current routes: {e}")
+                return
+            self._mtime = mtime
+            if self.on_reload:
+                self.on_reload(table)
+            self._table = table # single reference swap, readers see the old or the new table
+            logger.info(f"Reloaded route table from {self.path} ({len(table.routes)} routes)")
+        finally:
+            self._lock.release()
+
+    def match(self, path, method='GET'):
+        route = self.table.match(path, method)
+        if route is None:
+            ROUTE_MISSES.inc()
+        else:
+            ROUTE_MATCHES.labels(route=route.prefix, service=route.service).inc()
+        return route
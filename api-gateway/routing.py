@@ -0,0 +1,57 @@
+# Routing shared by the Flask gateway (app.py) and the asyncio gateway (async_app.py)
+import os
+import threading
+
+from route_table import ReloadingRouteTable
+from load_balancer import LoadBalancer
+
+ROUTES_FILE = os.environ.get('GATEWAY_ROUTES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'routes.yaml'))
+ROUTES_CHECK_INTERVAL = float(os.environ.get('GATEWAY_ROUTES_CHECK_INTERVAL', 2)) # in seconds
+
+LB_SLOW_START = float(os.environ.get('GATEWAY_LB_SLOW_START', 30)) # in seconds
+LB_FAILURE_THRESHOLD = int(os.environ.get('GATEWAY_LB_FAILURE_THRESHOLD', 5)) # consecutive failures before ejection
+LB_EJECTION_TIME = float(os.environ.get('GATEWAY_LB_EJECTION_TIME', 30)) # in seconds, multiplied by repeat ejections
+LB_MAX_EJECTION_PERCENT = int(os.environ.get('GATEWAY_LB_MAX_EJECTION_PERCENT', 50))
+
+# Hop-by-hop headers (RFC 7230, section 6.1) describe a single connection and are never relayed
+HOP_BY_HOP_HEADERS = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'te', 'trailer',
+                      'transfer-encoding', 'upgrade'}
+
+# One balancer per service, kept across route table reloads so replica state survives
+balancers = {}
+_balancers_lock = threading.Lock()
+
+
+def _sync_balancers(table):
+    with _balancers_lock:
+        for service, urls in table.services.items():
+            if service in balancers:
+                balancers[service].update(urls)
+            else:
+                balancers[service] = LoadBalancer(service, urls,
+                                                  slow_start=LB_SLOW_START,
+                                                  failure_threshold=LB_FAILURE_THRESHOLD,
+                                                  ejection_time=LB_EJECTION_TIME,
+                                                  max_ejection_percent=LB_MAX_EJECTION_PERCENT)
+
+
+route_table = ReloadingRouteTable(ROUTES_FILE, check_interval=ROUTES_CHECK_INTERVAL, on_reload=_sync_balancers)
+
+
+def resolve_route(path, method='GET'):
+    """Returns the route that accepts a gateway request, or None."""
+    return route_table.match(path, method)
+
+
+def resolve_aggregate(path):
+    """Returns (aggregate, path parameters) for a composite endpoint, or None."""
+    return route_table.table.match_aggregate(path)
+
+
+def balancer(service):
+    return balancers[service]
+
+
+def hop_by_hop_headers(headers):
+    """The standard hop-by-hop header names plus those the message's Connection header lists, lowercased."""
+    return HOP_BY_HOP_HEADERS | {name.strip().lower() for name in headers.get('Connection', '').split(',') if name.strip()}
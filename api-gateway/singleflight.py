@@ -0,0 +1,60 @@
+import threading
+
+from prometheus_client import Counter
+
+COALESCED_REQUESTS = Counter('api_gateway_coalesced_requests_total',
+                             'Requests answered with the result of an identical in-flight request', ['route'])
+COALESCE_TIMEOUTS = Counter('api_gateway_coalesce_timeouts_total',
+                            'Requests that gave up waiting on an identical in-flight request', ['route'])
+
+
+class CoalesceTimeout(Exception):
+    """Raised to a waiter whose leader did not finish within the timeout."""
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution.
+
+    The first caller for a key (the leader) runs fn; callers arriving while
+    it is running wait for its result instead of running fn themselves.
+    Results are not kept once the leader finishes.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None, label=''):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.done.wait(timeout):
+                COALESCE_TIMEOUTS.labels(route=label).inc()
+                raise CoalesceTimeout(f'Identical request still in flight after {timeout}s')
+            COALESCED_REQUESTS.labels(route=label).inc()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
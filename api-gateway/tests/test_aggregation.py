@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from api_gateway.aggregation import run_aggregate
+from api_gateway.route_table import Aggregate, AggregatePart, DerivedPart, RouteTable, RouteTableError
+
+SERVICES = {'user-service': 'http://users:5001', 'loan-service': 'http://loans:5002'}
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+def _overview(timeout=1.0, user_required=False):
+    return Aggregate('borrowers/{borrower_id}/overview', [
+        AggregatePart('user', 'user-service', 'users/{borrower_id}', required=user_required),
+        AggregatePart('loans', 'loan-service', 'loans?borrower_id={borrower_id}'),
+    ], timeout=timeout)
+
+
+def test_template_matching():
+    aggregate = _overview()
+    assert aggregate.match(['borrowers', '42', 'overview']) == {'borrower_id': '42'}
+    assert aggregate.match(['borrowers', '42']) is None
+    assert aggregate.match(['lenders', '42', 'overview']) is None
+
+
+def test_parts_are_fetched_concurrently_and_merged(executor):
+    started = threading.Barrier(2, timeout=1)
+    paths = []
+
+    def fetch(service, path):
+        paths.append(path)
+        started.wait() # both parts must be in flight at once
+        return 200, {}, json.dumps({'service': service}).encode()
+
+    status, payload = run_aggregate(_overview(), {'borrower_id': '42'}, fetch, executor)
+
+    assert status == 200
+    assert payload == {'data': {'user': {'service': 'user-service'}, 'loans': {'service': 'loan-service'}}, 'errors': {}}
+    assert sorted(paths) == ['loans?borrower_id=42', 'users/42']
+
+
+def test_path_parameters_are_escaped(executor):
+    paths = []
+
+    def fetch(service, path):
+        paths.append(path)
+        return 200, {}, b'{}'
+
+    run_aggregate(_overview(), {'borrower_id': '1&x=2'}, fetch, executor)
+    assert 'loans?borrower_id=1%26x%3D2' in paths
+
+
+def test_partial_failures_are_reported(executor):
+    def fetch(service, path):
+        if service == 'loan-service':
+            raise ConnectionError('refused')
+        return 200, {}, b'{"id": 42}'
+
+    status, payload = run_aggregate(_overview(), {'borrower_id': '42'}, fetch, executor)
+
+    assert status == 200
+    assert payload['data'] == {'user': {'id': 42}}
+    assert payload['errors'] == {'loans': {'error': 'refused'}}
+
+
+def test_slow_part_misses_the_deadline(executor):
+    release = threading.Event()
+
+    def fetch(service, path):
+        if service == 'loan-service':
+            release.wait(2)
+        return 200, {}, b'[]'
+
+    started = time.monotonic()
+    status, payload = run_aggregate(_overview(timeout=0.1), {'borrower_id': '42'}, fetch, executor)
+    release.set()
+
+    assert time.monotonic() - started < 1
+    assert status == 200
+    assert 'loans' in payload['errors']
+
+
+def test_failed_required_part_fails_the_response(executor):
+    def fetch(service, path):
+        return (404, {}, b'') if service == 'user-service' else (200, {}, b'[]')
+
+    status, payload = run_aggregate(_overview(user_required=True), {'borrower_id': '42'}, fetch, executor)
+
+    assert status == 502
+    assert payload['errors']['user'] == {'status': 404, 'error': 'Upstream returned an error'}
+
+
+def test_aggregates_load_from_config():
+    table = RouteTable.from_config({
+        'services': SERVICES,
+        'routes': [{'prefix': 'users', 'service': 'user-service'}],
+        'aggregates': [{'path': 'borrowers/{borrower_id}/overview', 'timeout': 2, 'parts': {
+            'user': {'service': 'user-service', 'path': 'users/{borrower_id}', 'required': True},
+        }}],
+    })
+    aggregate, params = table.match_aggregate('/borrowers/7/overview')
+    assert params == {'borrower_id': '7'}
+    assert aggregate.timeout == 2 and aggregate.parts[0].required
+    assert table.match_aggregate('/users/7') is None
+
+
+def test_shipped_overview_only_calls_existing_endpoints():
+    """Test that the borrower overview in routes.yaml maps onto one paginated call to the loan service's GET /loans."""
+    table = RouteTable.from_file(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'routes.yaml'))
+    aggregate, params = table.match_aggregate('/borrowers/7/overview')
+    fetched = {part.name: (part.service, part.render(params), part.paginate) for part in aggregate.fetched_parts}
+    assert fetched == {'loans': ('loan-service', 'loans?borrower_id=7&limit=1000', True)}
+    derived, = [part for part in aggregate.parts if isinstance(part, DerivedPart)]
+    assert (derived.name, derived.source, derived.where) == ('active_loans', 'loans', {'status': 'active'})
+
+
+def _paged_loans(pages):
+    """A fetch that serves pages of loans linked by X-Next-Cursor, like the loan service's GET /loans."""
+    paths = []
+
+    def fetch(service, path):
+        paths.append(path)
+        page = int(path.partition('cursor=')[2] or 0)
+        headers = {'X-Next-Cursor': str(page + 1)} if page + 1 < len(pages) else {}
+        return 200, headers, json.dumps(pages[page]).encode()
+
+    return fetch, paths
+
+
+def _loans_overview(max_pages=10):
+    return Aggregate('borrowers/{borrower_id}/overview', [
+        AggregatePart('loans', 'loan-service', 'loans?borrower_id={borrower_id}&limit=2', paginate=True, max_pages=max_pages),
+        DerivedPart('active_loans', 'loans', {'status': 'active'}),
+    ])
+
+
+def test_paginated_part_follows_the_cursor(executor):
+    """Test that every page is fetched, and that the derived part filters the concatenated items."""
+    pages = [[{'id': 1, 'status': 'active'}, {'id': 2, 'status': 'paid off'}], [{'id': 3, 'status': 'active'}]]
+    fetch, paths = _paged_loans(pages)
+
+    status, payload = run_aggregate(_loans_overview(), {'borrower_id': '7'}, fetch, executor)
+
+    assert status == 200
+    assert [loan['id'] for loan in payload['data']['loans']] == [1, 2, 3]
+    assert [loan['id'] for loan in payload['data']['active_loans']] == [1, 3]
+    assert paths == ['loans?borrower_id=7&limit=2', 'loans?borrower_id=7&limit=2&cursor=1']
+    assert 'partial' not in payload
+
+
+def test_pagination_stops_at_max_pages_and_reports_partial(executor):
+    pages = [[{'id': i, 'status': 'active'}] for i in range(5)]
+    fetch, paths = _paged_loans(pages)
+
+    status, payload = run_aggregate(_loans_overview(max_pages=2), {'borrower_id': '7'}, fetch, executor)
+
+    assert status == 200
+    assert len(paths) == 2 and len(payload['data']['loans']) == 2
+    assert payload['partial'] == ['active_loans', 'loans']
+
+
+def test_derived_part_of_a_failed_part_is_an_error(executor):
+    def fetch(service, path):
+        return 503, {}, b''
+
+    status, payload = run_aggregate(_loans_overview(), {'borrower_id': '7'}, fetch, executor)
+
+    assert status == 502
+    assert payload['errors']['active_loans'] == {'error': "Part 'loans' is unavailable"}
+
+
+def test_derived_part_needs_a_fetched_source():
+    with pytest.raises(RouteTableError):
+        RouteTable.from_config({
+            'services': SERVICES,
+            'routes': [],
+            'aggregates': [{'path': 'x/{id}', 'parts': {'a': {'service': 'loan-service', 'path': 'a/{id}'},
+                                                         'b': {'from': 'c', 'where': {'status': 'active'}}}}],
+        })
+
+
+def test_aggregate_with_unknown_service_is_rejected():
+    with pytest.raises(RouteTableError):
+        RouteTable.from_config({
+            'services': SERVICES,
+            'routes': [],
+            'aggregates': [{'path': 'x/{id}', 'parts': {'a': {'service': 'nope', 'path': 'a/{id}'}}}],
+        })
@@ -0,0 +1,145 @@
+import asyncio
+import importlib
+import sys
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+# async_app.py imports its sibling modules by their top-level names; point those names at the modules
+# the other tests import, so each module (and its metrics) is loaded only once
+for _name in ('route_table', 'load_balancer', 'routing', 'upstream_pool', 'response_cache', 'singleflight', 'edge_auth',
+              'resilience', 'aggregation', 'batch', 'request_metrics', 'compression'):
+    sys.modules.setdefault(_name, importlib.import_module(f'api_gateway.{_name}'))
+
+from api_gateway import async_app
+from api_gateway.load_balancer import LoadBalancer
+
+
+@pytest.fixture
+def config(monkeypatch):
+    overrides = {}
+    original = async_app.get_config_from_consul
+    monkeypatch.setattr(async_app, 'get_config_from_consul', lambda key: overrides.get(key, original(key)))
+    return overrides
+
+@pytest.fixture
+def replicas(monkeypatch):
+    balancers = {}
+    monkeypatch.setattr(async_app, 'balancer', lambda service: balancers[service])
+    return balancers
+
+
+def _run(replicas, upstream_handler, scenario):
+    """Runs scenario(client) against the asyncio gateway, with loan-service answered by upstream_handler."""
+    async def main():
+        upstream = web.Application()
+        upstream.router.add_route('*', '/{path:.*}', upstream_handler)
+        async with TestServer(upstream) as server:
+            replicas.setdefault('loan-service', LoadBalancer('loan-service', [str(server.make_url('')).rstrip('/')]))
+            async with TestClient(TestServer(async_app.create_app())) as client:
+                return await scenario(client)
+    return asyncio.run(main())
+
+async def _echo(request):
+    body = await request.read()
+    return web.json_response({'method': request.method, 'path': request.path, 'query': dict(request.query),
+                              'length': len(body), 'headers': dict(request.headers)},
+                             headers={'X-Request-Id': 'abc', 'Keep-Alive': 'timeout=5', 'X-Upstream-Hop': '1',
+                                      'Connection': 'keep-alive, X-Upstream-Hop'})
+
+def test_routes_requests_to_the_upstream(replicas):
+    async def scenario(client):
+        response = await client.get('/loans/7', params={'status': 'active'})
+        missing = await client.get('/nowhere')
+        return response.status, await response.json(), response.headers, missing.status
+
+    status, echoed, headers, missing = _run(replicas, _echo, scenario)
+    assert status == 200
+    assert (echoed['method'], echoed['path'], echoed['query']) == ('GET', '/loans/7', {'status': 'active'})
+    assert headers['X-Request-Id'] == 'abc'
+    assert missing == 404
+
+def test_request_body_is_streamed_to_the_upstream(replicas):
+    """Test that both a body with a length and a chunked one reach the upstream whole."""
+    payload = b'x' * (3 * async_app.STREAM_CHUNK_SIZE + 7)
+
+    async def chunks():
+        for start in range(0, len(payload), 1000):
+            yield payload[start:start + 1000]
+
+    async def scenario(client):
+        sized = await client.post('/loans', data=payload)
+        chunked = await client.post('/loans', data=chunks())
+        return await sized.json(), await chunked.json()
+
+    sized, chunked = _run(replicas, _echo, scenario)
+    assert sized['length'] == chunked['length'] == len(payload)
+    assert sized['headers']['Content-Length'] == str(len(payload))
+    assert chunked['headers'].get('Transfer-Encoding') == 'chunked'
+
+def test_hop_by_hop_headers_are_not_relayed(replicas):
+    """Test that connection-level headers, and those named in Connection, stop at the gateway both ways."""
+    async def scenario(client):
+        response = await client.get('/loans', headers={'Connection': 'X-Client-Hop', 'X-Client-Hop': '1',
+                                                       'TE': 'trailers', 'Proxy-Authorization': 'Basic Zm9vOmJhcg==',
+                                                       'Upgrade': 'h2c', 'X-Trace-Id': 'trace'})
+        return await response.json(), response.headers
+
+    echoed, headers = _run(replicas, _echo, scenario)
+    sent = {name.lower() for name in echoed['headers']}
+    assert 'x-trace-id' in sent
+    assert not sent & {'x-client-hop', 'te', 'proxy-authorization', 'upgrade', 'x-verified-claims'}
+    assert headers['X-Request-Id'] == 'abc'
+    assert 'X-Upstream-Hop' not in headers and 'Keep-Alive' not in headers
+
+def test_request_without_a_free_slot_gets_503(replicas, config):
+    config.update(pool_max_concurrency=1, pool_wait_timeout=0.05)
+
+    async def slow(request):
+        await asyncio.sleep(0.3)
+        return web.json_response([])
+
+    async def scenario(client):
+        responses = await asyncio.gather(client.get('/loans'), client.get('/loans'))
+        return sorted(response.status for response in responses)
+
+    assert _run(replicas, slow, scenario) == [200, 503]
+
+def test_service_without_healthy_replicas_gets_503(replicas):
+    replicas['loan-service'] = LoadBalancer('loan-service', [])
+
+    async def scenario(client):
+        response = await client.get('/loans')
+        return response.status, await response.json()
+
+    status, body = _run(replicas, _echo, scenario)
+    assert status == 503
+    assert body['error'].startswith('Service busy')
+
+def test_unreachable_upstream_gets_500(replicas):
+    replicas['loan-service'] = LoadBalancer('loan-service', ['http://127.0.0.1:9']) # nothing listens on discard
+
+    async def scenario(client):
+        response = await client.get('/loans')
+        return response.status, await response.json()
+
+    status, body = _run(replicas, _echo, scenario)
+    assert status == 500
+    assert body['error'].startswith('Error forwarding request to service')
+
+def test_upstream_timeout_gets_500(replicas, config):
+    """Test that a timed-out upstream call is answered like any other forwarding error."""
+    config.update(upstream_read_timeout=0.05)
+
+    async def stalled(request):
+        await asyncio.sleep(0.5)
+        return web.json_response([])
+
+    async def scenario(client):
+        response = await client.get('/loans')
+        return response.status, await response.json()
+
+    status, body = _run(replicas, stalled, scenario)
+    assert status == 500
+    assert body['error'].startswith('Error forwarding request to service')
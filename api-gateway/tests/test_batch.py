@@ -0,0 +1,89 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from api_gateway.batch import BatchError, parse_batch, run_batch
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        yield pool
+
+
+def test_parse_batch():
+    items = parse_batch([{'path': '/loans/1'}, {'method': 'post', 'path': 'loans', 'body': {'amount': 10}}], 10)
+    assert [(item.method, item.path, item.body) for item in items] == [('GET', 'loans/1', None), ('POST', 'loans', {'amount': 10})]
+
+
+@pytest.mark.parametrize('payload', [
+    {'path': '/loans/1'},
+    [{'method': 'GET'}],
+    [{'method': 'TRACE', 'path': '/loans'}],
+    [{'path': '/loans', 'headers': ['X-Trace']}],
+])
+def test_parse_batch_rejects_malformed_payloads(payload):
+    with pytest.raises(BatchError):
+        parse_batch(payload, 10)
+
+
+def test_parse_batch_enforces_the_item_limit():
+    with pytest.raises(BatchError):
+        parse_batch([{'path': '/loans'}] * 3, 2)
+
+
+def test_results_keep_request_order(executor):
+    items = parse_batch([{'path': f'/loans/{i}'} for i in range(20)], 20)
+
+    def execute(item):
+        time.sleep(0.001 * (20 - int(item.path.split('/')[1])))
+        return {'status': 200, 'body': item.path}
+
+    results = run_batch(items, execute, executor, concurrency=8, timeout=5)
+    assert [result['body'] for result in results] == [f'loans/{i}' for i in range(20)]
+
+
+def test_concurrency_is_capped_per_batch(executor):
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+
+    def execute(item):
+        with lock:
+            in_flight.append(1)
+            peak.append(len(in_flight))
+        time.sleep(0.01)
+        with lock:
+            in_flight.pop()
+        return {'status': 200}
+
+    run_batch(parse_batch([{'path': '/loans'}] * 12, 20), execute, executor, concurrency=3, timeout=5)
+    assert max(peak) <= 3
+
+
+def test_deadline_answers_unfinished_items(executor):
+    release = threading.Event()
+
+    def execute(item):
+        if item.path == 'slow':
+            release.wait(2)
+        return {'status': 200}
+
+    started = time.monotonic()
+    results = run_batch(parse_batch([{'path': 'fast'}, {'path': 'slow'}, {'path': 'fast'}], 10),
+                        execute, executor, concurrency=1, timeout=0.1)
+    release.set()
+
+    assert time.monotonic() - started < 1
+    assert [result['status'] for result in results] == [200, 504, 504]
+
+
+def test_failed_item_does_not_fail_the_batch(executor):
+    def execute(item):
+        if item.path == 'broken':
+            raise ConnectionError('refused')
+        return {'status': 200}
+
+    results = run_batch(parse_batch([{'path': 'broken'}, {'path': 'ok'}], 10), execute, executor, concurrency=2, timeout=5)
+    assert results == [{'status': 502, 'error': 'refused'}, {'status': 200}]
@@ -0,0 +1,56 @@
+import gzip
+import zlib
+
+import pytest
+from api_gateway.compression import Compressor, compress_body, compress_stream, content_type_allowed, negotiate
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip, br', 'br'),
+    ('gzip;q=1.0, br;q=0.5', 'gzip'),
+    ('br;q=0, gzip', 'gzip'),
+    ('*', 'br'),
+    ('identity', None),
+    ('', None),
+    (None, None),
+])
+def test_negotiate(accept_encoding, expected):
+    assert negotiate(accept_encoding, ('br', 'gzip')) == expected
+
+
+def test_negotiate_only_offers_available_encodings():
+    assert negotiate('br', ('gzip',)) is None
+
+
+def test_content_type_allowlist():
+    allowlist = {'application/json', 'text/*'}
+    assert content_type_allowed('application/json; charset=utf-8', allowlist)
+    assert content_type_allowed('text/csv', allowlist)
+    assert not content_type_allowed('image/png', allowlist)
+    assert not content_type_allowed(None, allowlist)
+
+
+def test_compress_body_round_trip():
+    body = b'{"loans": []}' * 500
+    compressor = Compressor('gzip')
+    assert gzip.decompress(compress_body(body, compressor)) == body
+    assert compressor.bytes_in == len(body) and compressor.bytes_out < len(body)
+
+
+def test_streamed_chunks_are_decodable_as_they_arrive():
+    chunks = [b'{"id": %d}\n' % i * 50 for i in range(3)]
+    decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    received = []
+    for out in compress_stream(iter(chunks), Compressor('gzip')):
+        received.append(decoder.decompress(out))
+    # Every input chunk is fully decodable before the stream ends
+    assert received[:3] == chunks
+    assert b''.join(received) == b''.join(chunks)
+
+
+def test_abandoned_stream_is_still_reported():
+    compressor = Compressor('gzip')
+    stream = compress_stream(iter([b'a' * 100, b'b' * 100]), compressor)
+    next(stream)
+    stream.close()
+    assert compressor.reported
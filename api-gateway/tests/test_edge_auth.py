@@ -0,0 +1,58 @@
+import base64
+import json
+import time
+
+import jwt
+from api_gateway.edge_auth import EdgeVerifier, CLAIMS_HEADER, SIGNATURE_HEADER, bearer_token, sign_claims
+
+JWT_SECRET = 'jwt-secret-for-tests-only-000000'
+INTERNAL_SECRET = 'internal-secret-for-tests-only-0'
+
+
+def _token(**claims):
+    claims.setdefault('exp', int(time.time()) + 60)
+    return jwt.encode(claims, JWT_SECRET, algorithm='HS256')
+
+
+def test_valid_token_forwards_signed_claims():
+    verifier = EdgeVerifier(JWT_SECRET, INTERNAL_SECRET)
+    headers = verifier.verified_headers(_token(user_id=7, permissions='user:read'))
+
+    encoded = headers[CLAIMS_HEADER]
+    assert sign_claims(json.loads(base64.urlsafe_b64decode(encoded)), INTERNAL_SECRET)[1] == headers[SIGNATURE_HEADER]
+    assert json.loads(base64.urlsafe_b64decode(encoded))['user_id'] == 7
+
+
+def test_invalid_token_is_not_forwarded():
+    verifier = EdgeVerifier(JWT_SECRET, INTERNAL_SECRET)
+    forged = jwt.encode({'user_id': 7, 'exp': int(time.time()) + 60}, 'another-secret-of-enough-length!', algorithm='HS256')
+    assert verifier.verified_headers(forged) is None
+    assert verifier.verified_headers(_token(exp=int(time.time()) - 1)) is None
+
+
+def test_verified_tokens_are_cached_until_expiry():
+    verifier = EdgeVerifier(JWT_SECRET, INTERNAL_SECRET)
+    token = _token(user_id=7)
+    first = verifier.verified_headers(token)
+
+    # A cached entry is served without decoding again
+    verifier.jwt_secret = 'rotated'
+    assert verifier.verified_headers(token) is first
+
+    digest = next(iter(verifier._entries))
+    verifier._entries[digest] = (time.time() - 1, first)
+    assert verifier.verified_headers(token) is None
+
+
+def test_cache_is_bounded():
+    verifier = EdgeVerifier(JWT_SECRET, INTERNAL_SECRET, max_entries=2)
+    for user_id in range(3):
+        verifier.verified_headers(_token(user_id=user_id))
+    assert len(verifier._entries) == 2
+
+
+def test_bearer_token():
+    assert bearer_token('Bearer abc') == 'abc'
+    assert bearer_token('bearer abc') == 'abc'
+    assert bearer_token('Basic abc') is None
+    assert bearer_token(None) is None
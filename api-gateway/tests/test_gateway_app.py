@@ -0,0 +1,251 @@
+import gzip
+import importlib
+import io
+import json
+import sys
+import threading
+import time
+
+import pytest
+import requests_mock
+
+# app.py imports its sibling modules by their top-level names; point those names at the modules
+# the other tests import, so each module (and its metrics) is loaded only once
+for _name in ('route_table', 'load_balancer', 'routing', 'upstream_pool', 'response_cache', 'singleflight', 'edge_auth',
+              'resilience', 'aggregation', 'batch', 'request_metrics', 'compression'):
+    sys.modules.setdefault(_name, importlib.import_module(f'api_gateway.{_name}'))
+
+from api_gateway import app as gateway
+from api_gateway.response_cache import ResponseCache
+
+LOANS = 'http://localhost:5002/loans'
+
+
+@pytest.fixture
+def client():
+    return gateway.app.test_client()
+
+@pytest.fixture
+def upstream():
+    with requests_mock.Mocker() as mocker:
+        yield mocker
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(gateway, 'CACHE_ENABLED', True)
+    monkeypatch.setattr(gateway, 'response_cache', ResponseCache())
+    return gateway.response_cache
+
+
+def _json(body, **headers):
+    return {'content': body, 'headers': {'Content-Type': 'application/json', 'Content-Length': str(len(body)), **headers}}
+
+def test_not_modified_without_cache_control_keeps_the_stored_ttl(client, upstream, cache):
+    """Test that a 304 without Cache-Control does not make a no-cache response fresh for the default TTL."""
+    upstream.get(LOANS, [_json(b'[1]', ETag='"v1"', **{'Cache-Control': 'no-cache'}),
+                         {'status_code': 304, 'headers': {'ETag': '"v1"'}}])
+
+    assert client.get('/loans').headers['X-Cache'] == 'MISS'
+    revalidated = client.get('/loans')
+    assert revalidated.headers['X-Cache'] == 'REVALIDATED'
+    assert revalidated.data == b'[1]'
+    assert upstream.last_request.headers['If-None-Match'] == '"v1"'
+
+    # Still stale: the next request is revalidated again rather than served as a hit
+    assert client.get('/loans').headers['X-Cache'] == 'REVALIDATED'
+    assert upstream.call_count == 3
+
+def test_not_modified_with_cache_control_sets_the_new_ttl(client, upstream, cache):
+    upstream.get(LOANS, [_json(b'[1]', ETag='"v1"', **{'Cache-Control': 'no-cache'}),
+                         {'status_code': 304, 'headers': {'ETag': '"v1"', 'Cache-Control': 'max-age=60'}}])
+
+    client.get('/loans')
+    assert client.get('/loans').headers['X-Cache'] == 'REVALIDATED'
+    assert client.get('/loans').headers['X-Cache'] == 'HIT'
+    assert upstream.call_count == 2
+
+def test_request_body_is_streamed_to_the_upstream(client, upstream):
+    """Test that a request body with a length is relayed in bounded reads, keeping its Content-Length."""
+    payload = b'x' * (3 * gateway.STREAM_CHUNK_SIZE + 7)
+    received = {}
+
+    def echo(request, context):
+        received['reader'] = request.body
+        received['body'] = b''.join(iter(request.body))
+        received['length'] = request.headers.get('Content-Length')
+        context.status_code = 201
+        return b'{}'
+
+    upstream.post(LOANS, content=echo)
+    response = client.post('/loans', data=payload, content_type='application/octet-stream')
+
+    assert response.status_code == 201
+    assert isinstance(received['reader'], gateway._BodyReader)
+    assert received['body'] == payload
+    assert received['length'] == str(len(payload))
+
+def test_chunked_request_body_is_relayed_without_a_length(client, upstream):
+    """Test that a chunked body is read until the end of the input and sent on chunked."""
+    received = {}
+
+    def echo(request, context):
+        received['body'] = b''.join(request.body)
+        received['headers'] = request.headers
+        return b'{}'
+
+    upstream.post(LOANS, content=echo)
+    response = client.post('/loans', input_stream=io.BytesIO(b'chunk-1chunk-2'),
+                           headers={'Transfer-Encoding': 'chunked', 'Content-Type': 'application/octet-stream'},
+                           # as set by servers that decode chunked input, such as gunicorn
+                           environ_overrides={'wsgi.input_terminated': True})
+
+    assert response.status_code == 200
+    assert received['body'] == b'chunk-1chunk-2'
+    assert 'Content-Length' not in received['headers']
+
+def test_hop_by_hop_headers_are_not_relayed(client, upstream):
+    """Test that connection-level headers, and those named in Connection, stop at the gateway both ways."""
+    upstream.get(LOANS, content=b'[]', headers={
+        'Content-Type': 'application/json', 'Connection': 'close, X-Upstream-Hop', 'Keep-Alive': 'timeout=5',
+        'X-Upstream-Hop': '1', 'Upgrade': 'h2c', 'X-Request-Id': 'abc'})
+
+    response = client.get('/loans', headers={'Connection': 'X-Client-Hop', 'X-Client-Hop': '1', 'Keep-Alive': 'timeout=5',
+                                             'TE': 'trailers', 'Proxy-Authorization': 'Basic Zm9vOmJhcg==',
+                                             'X-Trace-Id': 'trace'})
+
+    sent = upstream.last_request.headers
+    assert sent['X-Trace-Id'] == 'trace'
+    for name in ('X-Client-Hop', 'Keep-Alive', 'TE', 'Proxy-Authorization'):
+        assert name not in sent
+    assert response.headers['X-Request-Id'] == 'abc'
+    for name in ('Connection', 'Keep-Alive', 'X-Upstream-Hop', 'Upgrade'):
+        assert name not in response.headers
+
+def test_batch_returns_results_in_order(client, upstream):
+    upstream.get(LOANS + '/1', **_json(b'{"id": 1}'))
+    upstream.put(LOANS + '/2', status_code=400, **_json(b'{"message": "Invalid input"}'))
+
+    response = client.post('/batch', json=[{'path': '/loans/1'},
+                                           {'method': 'PUT', 'path': '/loans/2', 'body': {'status': 'paid off'}},
+                                           {'path': '/nowhere'}])
+
+    assert response.status_code == 200
+    first, second, third = response.get_json()
+    assert (first['status'], first['body']) == (200, {'id': 1})
+    assert (second['status'], second['body']) == (400, {'message': 'Invalid input'})
+    assert third['status'] == 404
+    put, = [sent for sent in upstream.request_history if sent.method == 'PUT'] # sub-requests run concurrently
+    assert put.json() == {'status': 'paid off'}
+
+def test_batch_rejects_a_body_that_is_not_an_array(client):
+    assert client.post('/batch', json={'path': '/loans/1'}).status_code == 400
+
+def test_identical_concurrent_gets_on_a_coalescing_route_share_one_call(client, upstream):
+    """Test that waiting requests on a coalesce: true route get the leader's response."""
+    started = threading.Event()
+
+    def slow(request, context):
+        started.set()
+        time.sleep(0.2)
+        return b'[{"id": 1}]'
+
+    upstream.get('http://localhost:5004/reports/active-loans', content=slow, headers={'Content-Type': 'application/json'})
+    results = []
+
+    def fetch():
+        results.append(gateway.app.test_client().get('/reports/active-loans'))
+
+    leader = threading.Thread(target=fetch)
+    leader.start()
+    started.wait(1)
+    followers = [threading.Thread(target=fetch) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert [response.status_code for response in results] == [200] * 4
+    assert all(response.get_json() == [{'id': 1}] for response in results)
+    assert upstream.call_count == 1
+
+def test_streamed_response_is_compressed_chunk_by_chunk(client, upstream):
+    body = json.dumps([{'id': i, 'status': 'active'} for i in range(500)]).encode()
+    upstream.get(LOANS, content=body, headers={'Content-Type': 'application/json', 'Content-Length': str(len(body))})
+
+    response = client.get('/loans', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.is_streamed
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()) == body
+
+def test_small_and_unaccepted_responses_are_not_compressed(client, upstream):
+    upstream.get(LOANS, content=b'[]', headers={'Content-Type': 'application/json', 'Content-Length': '2'})
+    assert 'Content-Encoding' not in client.get('/loans', headers={'Accept-Encoding': 'gzip'}).headers
+
+    body = b'[' + b'1,' * 1000 + b'1]'
+    upstream.get(LOANS, content=body, headers={'Content-Type': 'application/json', 'Content-Length': str(len(body))})
+    response = client.get('/loans', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data() == body
+
+def test_not_modified_is_never_compressed(client, upstream):
+    """Test that an upstream 304 is relayed as is, without a body or Content-Encoding."""
+    upstream.get(LOANS, status_code=304, headers={'ETag': '"v1"', 'Content-Type': 'application/json'})
+
+    response = client.get('/loans', headers={'Accept-Encoding': 'gzip', 'If-None-Match': '"v1"'})
+
+    assert response.status_code == 304
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'] == '"v1"'
+    assert response.get_data() == b''
+
+def test_compressed_cache_hit_revalidates_with_the_weak_etag(client, upstream, cache):
+    """Test that the weak ETag of a compressed response earns a 304 from the cache, itself uncompressed."""
+    body = json.dumps([{'id': i} for i in range(500)]).encode()
+    upstream.get(LOANS, **_json(body, ETag='"v1"', **{'Cache-Control': 'max-age=60'}))
+
+    first = client.get('/loans', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert first.headers['ETag'] == 'W/"v1"'
+    assert gzip.decompress(first.get_data()) == body
+
+    second = client.get('/loans', headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']})
+    assert second.status_code == 304
+    assert second.headers['X-Cache'] == 'HIT'
+    assert 'Content-Encoding' not in second.headers
+    assert upstream.call_count == 1
+
+def test_successful_write_invalidates_cached_gets_under_the_route(client, upstream, cache):
+    """Test that a client reads back its own update instead of the cached body."""
+    upstream.get(LOANS + '/1', [_json(b'{"status": "active"}', **{'Cache-Control': 'max-age=60'}),
+                                _json(b'{"status": "paid off"}', **{'Cache-Control': 'max-age=60'})])
+    upstream.get(LOANS, **_json(b'[]', **{'Cache-Control': 'max-age=60'}))
+    upstream.put(LOANS + '/1', **_json(b'{}'))
+    client.get('/loans')
+    assert client.get('/loans/1').headers['X-Cache'] == 'MISS'
+    assert client.get('/loans/1').headers['X-Cache'] == 'HIT'
+
+    assert client.put('/loans/1', json={'status': 'paid off'}).status_code == 200
+
+    after = client.get('/loans/1')
+    assert (after.headers['X-Cache'], after.get_json()) == ('MISS', {'status': 'paid off'})
+    assert client.get('/loans').headers['X-Cache'] == 'MISS' # the collection changed as well
+
+def test_failed_write_keeps_the_cache(client, upstream, cache):
+    upstream.get(LOANS + '/1', **_json(b'{"status": "active"}', **{'Cache-Control': 'max-age=60'}))
+    upstream.put(LOANS + '/1', status_code=400, **_json(b'{"message": "Invalid input"}'))
+    client.get('/loans/1')
+
+    assert client.put('/loans/1', json={'status': 'bogus'}).status_code == 400
+    assert client.get('/loans/1').headers['X-Cache'] == 'HIT'
+
+def test_responses_without_cache_control_are_stored_only_on_opted_in_routes(client, upstream, cache):
+    """Test that loans (no cache_default_ttl) are refetched, while reports are cached for the route's TTL."""
+    upstream.get(LOANS, **_json(b'[]'))
+    upstream.get('http://localhost:5004/reports/active-loans', **_json(b'[]'))
+
+    assert [client.get('/loans').headers['X-Cache'] for _ in range(2)] == ['MISS', 'MISS']
+    assert [client.get('/reports/active-loans').headers['X-Cache'] for _ in range(2)] == ['MISS', 'HIT']
+    assert upstream.call_count == 3
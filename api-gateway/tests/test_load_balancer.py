@@ -0,0 +1,52 @@
+import collections
+
+from api_gateway.load_balancer import LoadBalancer
+
+URLS = ['http://loan-service-1:5002', 'http://loan-service-2:5002']
+
+
+def test_prefers_replica_with_fewer_outstanding_requests():
+    balancer = LoadBalancer('loan-service', URLS, slow_start=0)
+    busy = balancer.pick()
+    for _ in range(10):
+        endpoint = balancer.pick()
+        assert endpoint is not busy
+        balancer.release(endpoint, ok=True)
+
+
+def test_failing_replica_is_ejected():
+    balancer = LoadBalancer('loan-service', URLS, slow_start=0, failure_threshold=3, ejection_time=60)
+    bad = balancer.endpoints[1]
+    for _ in range(3):
+        bad.outstanding += 1
+        balancer.release(bad, ok=False)
+
+    picks = collections.Counter()
+    for _ in range(20):
+        endpoint = balancer.pick()
+        picks[endpoint.url] += 1
+        balancer.release(endpoint, ok=True)
+    assert picks == {URLS[0]: 20}
+
+
+def test_never_ejects_more_than_max_ejection_percent():
+    balancer = LoadBalancer('loan-service', URLS, slow_start=0, failure_threshold=1, max_ejection_percent=50)
+    for endpoint in balancer.endpoints:
+        endpoint.outstanding += 1
+        balancer.release(endpoint, ok=False)
+    ejected = [e for e in balancer.endpoints if e.ejection_count]
+    assert len(ejected) == 1
+
+
+def test_update_keeps_state_and_new_replica_warms_up():
+    balancer = LoadBalancer('loan-service', URLS[:1], slow_start=30)
+    first = balancer.endpoints[0]
+    balancer.update(URLS)
+    assert balancer.endpoints[0] is first
+
+    # The new replica starts at a fraction of the traffic of the warm one
+    picks = collections.Counter()
+    for _ in range(200):
+        endpoint = balancer.pick()
+        picks[endpoint.url] += 1
+    assert picks[URLS[0]] > picks[URLS[1]]
@@ -0,0 +1,42 @@
+from prometheus_client import REGISTRY
+from api_gateway.request_metrics import RequestTimer
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_in_flight_gauge_follows_the_request():
+    timer = RequestTimer('GET')
+    timer.set_route('test-in-flight')
+    assert _sample('api_gateway_requests_in_flight', route='test-in-flight') == 1
+    timer.finish()
+    timer.finish() # idempotent: a request is only counted once
+    assert _sample('api_gateway_requests_in_flight', route='test-in-flight') == 0
+    assert _sample('api_gateway_request_duration_seconds_count', route='test-in-flight', method='GET') == 1
+
+
+def test_overhead_excludes_upstream_time():
+    timer = RequestTimer('GET')
+    timer.set_route('test-overhead')
+    timer.started -= 1.0
+    timer.add_upstream(0.75)
+    timer.finish()
+
+    overhead = _sample('api_gateway_overhead_seconds_sum', route='test-overhead')
+    assert 0.25 <= overhead < 0.5
+
+
+def test_overhead_is_skipped_for_fan_out_requests():
+    timer = RequestTimer('GET')
+    timer.set_route('test-fan-out')
+    timer.add_upstream(0.1)
+    timer.add_upstream(0.1)
+    timer.finish()
+    assert _sample('api_gateway_overhead_seconds_count', route='test-fan-out') == 0
+
+
+def test_unrouted_requests_are_labelled_unmatched():
+    before = _sample('api_gateway_request_duration_seconds_count', route='unmatched', method='DELETE')
+    RequestTimer('DELETE').finish()
+    assert _sample('api_gateway_request_duration_seconds_count', route='unmatched', method='DELETE') == before + 1
@@ -0,0 +1,71 @@
+import time
+
+import pytest
+from api_gateway.resilience import (CircuitBreaker, AdaptiveLimiter, UpstreamGuard, UpstreamUnavailableError,
+                                    CLOSED, HALF_OPEN, OPEN)
+
+
+def test_breaker_opens_after_consecutive_failures_and_recovers():
+    breaker = CircuitBreaker('loan-service', failure_threshold=3, reset_timeout=0.05)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record(ok=False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow() # only one probe at a time
+    breaker.record(ok=True)
+    assert breaker.state == CLOSED
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker('loan-service', failure_threshold=1, reset_timeout=0.01)
+    breaker.record(ok=False)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record(ok=False)
+    assert breaker.state == OPEN
+
+
+def test_limiter_rejects_beyond_limit():
+    limiter = AdaptiveLimiter('loan-service', initial_limit=2)
+    assert limiter.try_acquire()
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    limiter.release(0.01, ok=True)
+    assert limiter.try_acquire()
+
+
+def test_limiter_backs_off_on_slow_or_failed_calls_and_grows_when_saturated():
+    limiter = AdaptiveLimiter('loan-service', initial_limit=10, backoff=0.5)
+    limiter.try_acquire()
+    limiter.release(0.01, ok=True) # sets the baseline
+    limiter.try_acquire()
+    limiter.release(1.0, ok=True)
+    assert limiter.limit == 5
+    limiter.try_acquire()
+    limiter.release(0.01, ok=False)
+    assert limiter.limit == 2.5
+
+    for _ in range(2):
+        limiter.try_acquire()
+    limiter.release(0.01, ok=True)
+    assert limiter.limit > 2.5
+
+
+def test_guard_rejection_does_not_consume_probe():
+    breaker = CircuitBreaker('loan-service', failure_threshold=1, reset_timeout=0.01)
+    limiter = AdaptiveLimiter('loan-service', initial_limit=1)
+    guard = UpstreamGuard('loan-service', breaker, limiter)
+    limiter.try_acquire() # saturate the limiter
+    breaker.record(ok=False)
+    time.sleep(0.02)
+
+    with pytest.raises(UpstreamUnavailableError):
+        guard.enter()
+    limiter.cancel()
+    guard.enter()
+    assert breaker.state == HALF_OPEN
@@ -0,0 +1,77 @@
+import time
+
+from api_gateway.response_cache import ResponseCache, CachedResponse, cache_key, response_ttl
+
+
+def _entry(body=b'[]', ttl=60, etag=None):
+    headers = [('Content-Type', 'application/json')] + ([('ETag', etag)] if etag else [])
+    return CachedResponse(200, headers, body, ttl)
+
+
+def test_cache_key_separates_auth_scopes():
+    anonymous = cache_key('GET', '/loans', [('status', 'active')], None)
+    alice = cache_key('GET', '/loans', [('status', 'active')], 'Bearer alice')
+    bob = cache_key('GET', '/loans', [('status', 'active')], 'Bearer bob')
+    assert len({anonymous, alice, bob}) == 3
+    assert cache_key('GET', '/loans', [('a', '1'), ('b', '2')], None) == cache_key('GET', '/loans', [('b', '2'), ('a', '1')], None)
+
+
+def test_response_ttl_honours_cache_control():
+    assert response_ttl(None, 5) == 5
+    assert response_ttl('max-age=30', 5) == 30
+    assert response_ttl('public, s-maxage=10, max-age=30', 5) == 10
+    assert response_ttl('no-cache', 5) == 0
+    assert response_ttl('no-store', 5) is None
+
+
+def test_lru_eviction_by_entry_count():
+    cache = ResponseCache(max_entries=2)
+    cache.put('a', _entry())
+    cache.put('b', _entry())
+    cache.get('a') # 'b' is now least recently used
+    cache.put('c', _entry())
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+
+def test_eviction_by_bytes_and_oversized_entries_rejected():
+    cache = ResponseCache(max_bytes=250, max_entry_bytes=200)
+    assert not cache.put('huge', _entry(body=b'x' * 300))
+    cache.put('a', _entry(body=b'x' * 100))
+    cache.put('b', _entry(body=b'x' * 100))
+    assert cache.get('a') is None
+    assert cache.get('b') is not None
+
+
+def test_stale_entries_kept_only_when_revalidatable():
+    cache = ResponseCache()
+    cache.put('plain', _entry(ttl=0))
+    cache.put('tagged', _entry(ttl=0, etag='"v1"'))
+    time.sleep(0.01)
+    assert cache.get('plain') is None
+    stale = cache.get('tagged')
+    assert stale is not None and not stale.fresh
+    stale.refresh(60)
+    assert cache.get('tagged').fresh
+
+
+def test_invalidate_prefix_drops_the_path_and_everything_below_it():
+    cache = ResponseCache()
+    for path in ('/loans', '/loans/1', '/loans/1/repayments', '/loansx', '/users/1'):
+        cache.put(cache_key('GET', path, [], 'Bearer alice'), _entry())
+    cache.put(cache_key('GET', '/loans', [('status', 'active')], None), _entry())
+
+    cache.invalidate_prefix('/loans')
+
+    assert sorted(key[1] for key in cache._entries) == ['/loansx', '/users/1']
+
+
+def test_responses_fetched_before_an_invalidation_are_not_stored():
+    """Test that a GET that raced a write cannot put the body it read before the write back."""
+    cache = ResponseCache()
+    key = cache_key('GET', '/loans/1', [], None)
+    generation = cache.generation
+    cache.invalidate_prefix('/loans')
+    assert not cache.put(key, _entry(), generation)
+    assert cache.get(key) is None
+    assert cache.put(key, _entry(), cache.generation)
@@ -0,0 +1,57 @@
+import os
+import time
+
+import pytest
+from api_gateway.route_table import RouteTable, ReloadingRouteTable, RouteTableError
+
+CONFIG = {
+    'services': {
+        'user-service': 'http://user-service:5001',
+        'loan-service': 'http://loan-service:5002',
+        'collection-service': 'http://collection-service:5003',
+    },
+    'routes': [
+        {'prefix': 'users', 'service': 'user-service'},
+        {'prefix': 'loans', 'service': 'loan-service'},
+        {'prefix': 'loans/repay', 'service': 'collection-service', 'methods': ['POST']},
+    ],
+}
+
+
+def test_longest_prefix_wins():
+    table = RouteTable.from_config(CONFIG)
+    assert table.match('loans/42').service == 'loan-service'
+    assert table.match('loans/repay/42', 'POST').service == 'collection-service'
+
+
+def test_method_filter_falls_back_to_shorter_prefix():
+    table = RouteTable.from_config(CONFIG)
+    assert table.match('loans/repay/42', 'GET').service == 'loan-service'
+
+
+def test_prefix_matches_whole_segments_only():
+    table = RouteTable.from_config(CONFIG)
+    assert table.match('users').service == 'user-service'
+    assert table.match('usersettings') is None
+    assert table.match('reports/active-loans') is None
+
+
+def test_unknown_service_is_rejected():
+    config = {'services': {}, 'routes': [{'prefix': 'users', 'service': 'user-service'}]}
+    with pytest.raises(RouteTableError):
+        RouteTable.from_config(config)
+
+
+def test_reload_swaps_table_and_keeps_it_on_bad_file(tmp_path):
+    routes_file = tmp_path / 'routes.yaml'
+    routes_file.write_text("services:\n  a: http://a\nroutes:\n  - prefix: users\n    service: a\n")
+    table = ReloadingRouteTable(str(routes_file), check_interval=0)
+    assert table.match('users/1').service == 'a'
+
+    routes_file.write_text("services:\n  b: http://b\nroutes:\n  - prefix: users\n    service: b\n")
+    os.utime(routes_file, (time.time() + 5, time.time() + 5))
+    assert table.match('users/1').service == 'b'
+
+    routes_file.write_text("routes: [")
+    os.utime(routes_file, (time.time() + 10, time.time() + 10))
+    assert table.match('users/1').service == 'b'
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+from api_gateway.singleflight import SingleFlight, CoalesceTimeout
+
+
+def test_concurrent_calls_share_one_execution():
+    group = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(1)
+        return 'report'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(group.do('key', fetch, timeout=2))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['report'] * 5
+
+
+def test_leader_error_is_shared_and_next_call_runs_again():
+    group = SingleFlight()
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError('upstream down')
+
+    errors = []
+
+    def waiter():
+        started.wait(1)
+        try:
+            group.do('key', lambda: 'unused', timeout=1)
+        except ValueError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    with pytest.raises(ValueError):
+        group.do('key', failing)
+    thread.join()
+
+    assert len(errors) == 1
+    assert group.do('key', lambda: 'fresh') == 'fresh'
+
+
+def test_waiter_times_out():
+    group = SingleFlight()
+    started = threading.Event()
+    thread = threading.Thread(target=lambda: group.do('key', lambda: (started.set(), time.sleep(0.3))))
+    thread.start()
+    started.wait(1)
+    with pytest.raises(CoalesceTimeout):
+        group.do('key', lambda: 'unused', timeout=0.05)
+    thread.join()
@@ -0,0 +1,25 @@
+import pytest
+from api_gateway.upstream_pool import UpstreamPool, PoolExhaustedError
+
+
+def test_session_is_reused_per_upstream():
+    pool = UpstreamPool()
+    assert pool.session('loan-service') is pool.session('loan-service')
+    assert pool.session('loan-service') is not pool.session('user-service')
+
+
+def test_acquire_fails_fast_when_concurrency_exhausted():
+    pool = UpstreamPool(max_concurrency=1, wait_timeout=0.01)
+    pool.acquire('loan-service')
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire('loan-service')
+
+    pool.release('loan-service')
+    assert pool.acquire('loan-service') is pool.session('loan-service')
+
+
+def test_concurrency_slots_are_per_upstream():
+    pool = UpstreamPool(max_concurrency=1, wait_timeout=0.01)
+    pool.acquire('loan-service')
+    # A saturated loan-service must not block calls to other upstreams
+    assert pool.acquire('user-service') is pool.session('user-service')
@@ -0,0 +1,139 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.poolmanager import PoolManager
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from prometheus_client import Counter, Histogram
+
+
+POOL_HITS = Counter('api_gateway_upstream_pool_hits_total',
+                    'Upstream requests served on a reused keep-alive connection', ['upstream'])
+POOL_MISSES = Counter('api_gateway_upstream_pool_misses_total',
+                      'Upstream requests that had to open a new connection', ['upstream'])
+POOL_WAIT_SECONDS = Histogram('api_gateway_upstream_pool_wait_seconds',
+                              'Time spent waiting for a free upstream connection slot', ['upstream'])
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no upstream connection slot frees up within the wait timeout."""
+
+
+def _instrumented(base_class):
+    """
+    Builds a connection pool class that counts connection reuse and
+    drops keep-alive connections that sat idle longer than idle_timeout.
+    """
+    class InstrumentedPool(base_class):
+        upstream = 'unknown'
+        idle_timeout = None
+
+        def _new_conn(self):
+            POOL_MISSES.labels(upstream=self.upstream).inc()
+            return super()._new_conn()
+
+        def _get_conn(self, timeout=None):
+            conn = super()._get_conn(timeout=timeout)
+            last_used = getattr(conn, '_gateway_last_used', None)
+            if last_used is not None and self.idle_timeout and time.monotonic() - last_used > self.idle_timeout:
+                # The server has probably given up on this socket already
+                conn.close()
+                return self._new_conn()
+            if last_used is not None:
+                POOL_HITS.labels(upstream=self.upstream).inc()
+            return conn
+
+        def _put_conn(self, conn):
+            if conn is not None:
+                conn._gateway_last_used = time.monotonic()
+            super()._put_conn(conn)
+
+    return InstrumentedPool
+
+
+class _UpstreamPoolManager(PoolManager):
+    def __init__(self, upstream, idle_timeout, **kwargs):
+        super().__init__(**kwargs)
+        self.upstream = upstream
+        self.idle_timeout = idle_timeout
+        self.pool_classes_by_scheme = {
+            'http': _instrumented(HTTPConnectionPool),
+            'https': _instrumented(HTTPSConnectionPool),
+        }
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context=request_context)
+        pool.upstream = self.upstream
+        pool.idle_timeout = self.idle_timeout
+        return pool
+
+
+class _UpstreamAdapter(HTTPAdapter):
+    def __init__(self, upstream, idle_timeout, **kwargs):
+        self.upstream = upstream
+        self.idle_timeout = idle_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _UpstreamPoolManager(self.upstream, self.idle_timeout,
+                                                num_pools=connections, maxsize=maxsize,
+                                                block=block, **pool_kwargs)
+
+
+class UpstreamPool:
+    """
+    Long-lived keep-alive sessions, one per upstream service.
+
+    max_connections caps the idle keep-alive connections kept per upstream host,
+    idle_timeout (seconds) discards connections that have been idle for longer,
+    and max_concurrency caps the in-flight requests per upstream. Requests
+    beyond max_concurrency wait up to wait_timeout seconds for a free slot.
+    """
+
+    def __init__(self, max_connections=10, idle_timeout=60, max_concurrency=50, wait_timeout=5):
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.max_concurrency = max_concurrency
+        self.wait_timeout = wait_timeout
+        self._sessions = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def session(self, upstream):
+        session = self._sessions.get(upstream)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(upstream)
+                if session is None:
+                    session = requests.Session()
+                    adapter = _UpstreamAdapter(upstream, self.idle_timeout,
+                                               pool_maxsize=self.max_connections)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._sessions[upstream] = session
+                    self._slots[upstream] = threading.BoundedSemaphore(self.max_concurrency)
+        return session
+
+    def acquire(self, upstream):
+        """Reserves a concurrency slot for upstream, returning its session."""
+        session = self.session(upstream)
+        started = time.monotonic()
+        acquired = self._slots[upstream].acquire(timeout=self.wait_timeout)
+        POOL_WAIT_SECONDS.labels(upstream=upstream).observe(time.monotonic() - started)
+        if not acquired:
+            raise PoolExhaustedError(f'No free connection slot for {upstream} after {self.wait_timeout}s')
+        return session
+
+    def release(self, upstream):
+        self._slots[upstream].release()
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._slots.clear()
@@ -3,23 +3,49 @@ from .loan_manager import LoanManager
 from .borrower_manager import BorrowerManager
 from .repayment_manager import RepaymentManager
 from .user_manager import UserManager
-from sqlalchemy import create_engine 
-from sqlalchemy.orm import sessionmaker, scoped_session, Session
+from common.db import Database, options_from_env
 from .models import Base, Loan, Borrower # Assuming Base is defined in models.py
 from .models import RefreshToken, User
+from common.permissions import PERMISSION_BITS, has_permission, permission_claims
+from .revocation_filter import RevocationFilter
+from .user_cache import UserCache
+from prometheus_client import generate_latest, REGISTRY
 from functools import wraps, partial
-import jwt, datetime, uuid, os, json
+import jwt, datetime, uuid, os, json, time
 
 app = Flask(__name__)
 
 # Database configuration
-DATABASE_URL = "sqlite:///loan_book.db"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) 
-db_session = scoped_session(SessionLocal)
+DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///loan_book.db')
+db = Database(DATABASE_URL, name='backend', **options_from_env())
+db.init_app(app)
+engine = db.engine
+SessionLocal = db.session_factory
+db_session = db.session
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your_fallback_super_secret_key') # Change this in a real application and use environment variable
 ACCESS_TOKEN_EXPIRE_SECONDS = int(os.environ.get('ACCESS_TOKEN_EXPIRE_SECONDS', 600)) # Default 10 minutes
 REFRESH_TOKEN_EXPIRE_SECONDS = int(os.environ.get('REFRESH_TOKEN_EXPIRE_SECONDS', 2592000)) # Default 30 days
+# Seconds require_token may rely on a cached user (or on a user being gone) before asking the database again
+USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', 30))
+# Seconds between rebuilds of the refresh token revocation filter from the database
+REVOCATION_FILTER_REBUILD_SECONDS = int(os.environ.get('REVOCATION_FILTER_REBUILD_SECONDS', 60))
+
+def load_revoked_jtis():
+    """JTIs of revoked refresh tokens that have not expired yet, via ix_refresh_tokens_revoked_expires_at."""
+    session = SessionLocal()
+    try:
+        query = session.query(RefreshToken.token).filter(RefreshToken.revoked == True,
+                                                         RefreshToken.expires_at > datetime.datetime.utcnow())
+        return [jti for (jti,) in query]
+    finally:
+        session.close()
+
+user_cache = UserCache(ttl=USER_CACHE_TTL_SECONDS)
+
+# Lets /refresh skip the refresh_tokens lookup for tokens that are definitely not revoked
+revocation_filter = RevocationFilter(load_revoked_jtis, rebuild_interval=REVOCATION_FILTER_REBUILD_SECONDS)
+if REVOCATION_FILTER_REBUILD_SECONDS > 0:
+    revocation_filter.start()
 
 def require_token(f):
     @wraps(f)
@@ -37,15 +63,16 @@ def require_token(f):
             return jsonify({"message": "Token is missing"}), 401
 
         try:
-            # Decode the token (replace with your actual token validation)
+            # Claims forwarded by the gateway's edge auth are not trusted here: the gateway checks
+            # tokens against the user service's JWT_SECRET_KEY, while this app issues its own with SECRET_KEY
             data = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
             user_id = data.get('user_id') # Assuming user_id is in the token
-            # Retrieve the user from the database to ensure they still exist
-            user = db_session().query(User).get(user_id)
+            # Ensure the user still exists; the cache saves a query per request
+            user = user_cache.get(user_id, lambda user_id: db_session().get(User, user_id))
             if not user:
                 return jsonify({"message": "User not found"}), 401 
             request.current_user = user  # Attach the user object to the request
- request.user_payload = data # Attach the token payload to the request
+            request.user_payload = data # Attach the token payload to the request
         except jwt.ExpiredSignatureError:
             return jsonify({"message": "Token has expired"}), 401
         except jwt.InvalidTokenError:
@@ -56,20 +83,22 @@ def require_token(f):
 
 # Modify require_role to require_permission
 def require_permission(permission):
+    bit = PERMISSION_BITS.get(permission) # resolved once per endpoint, not per request
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             user = getattr(request, 'current_user', None) # Get the user from the request object set by require_token
-            # Get permissions from the token payload for potentially faster access
-            user_permissions = getattr(request, 'user_payload', {}).get('permissions', [])
+            # The token's permission bitmask (or legacy list) is checked first, for faster access
+            payload = getattr(request, 'user_payload', {})
 
-            # If user object is not available or permissions not in payload, fetch from user model
-            if not user or not user_permissions:
-                user_permissions = user.permissions.split(',') if user and user.permissions else []
+            # If the payload carries no permissions at all, fall back to the user model
+            if 'perm_mask' not in payload and not payload.get('permissions'):
+                payload = {'permissions': user.permissions if user else None}
 
-            if permission not in user_permissions:
+            if not has_permission(payload, permission, bit):
                 return jsonify({"message": "Insufficient permissions"}), 403 
             return f(*args, **kwargs)
+        return decorated_function
     return decorator
 
 # Dependency to get DB session
@@ -77,39 +106,35 @@ def get_db():
     session = db_session()
     return session
 
-@app.teardown_request
-def remove_session(exception=None):
-    db_session.remove()
-
 # Apply require_token and require_permission to user management endpoints
+@app.route('/users', methods=['GET'])
 @require_token
 @require_permission('user:manage') # Example: Only users with 'user:manage' permission can list users
-@app.route('/users', methods=['GET'])
 def get_all_users():
     # Placeholder: Implement logic to get all users from UserManager
     session = get_db()
-    user_manager = UserManager(session)
- users = user_manager.get_all_users() # Assuming UserManager has a get_all_users method
+    user_manager = UserManager(session, user_cache)
+    users = user_manager.get_all_users() # Assuming UserManager has a get_all_users method
     if not users:
- return jsonify({"message": "No users found"}), 404
+        return jsonify({"message": "No users found"}), 404
     # Assuming User objects can be easily serialized to JSON or have a method for it
     return jsonify([user.__dict__ for user in users]), 200
 
+@app.route('/users/<int:user_id>', methods=['GET'])
 @require_token
 @require_permission('user:manage') # Example: Only users with 'user:manage' permission can view user details
-@app.route('/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
     # Placeholder: Implement logic to get a specific user by ID from UserManager
     session = get_db()
- user_manager = UserManager(session)
- user = user_manager.get_user(user_id) # Assuming get_user method takes user_id
+    user_manager = UserManager(session, user_cache)
+    user = user_manager.get_user(user_id) # Assuming get_user method takes user_id
     if user:
         return jsonify(user.__dict__), 200
     return jsonify({"message": "User not found"}), 404
 
+@app.route('/users', methods=['POST'])
 @require_token
 @require_permission('user:manage') # Example: Only users with 'user:manage' permission can create users
-@app.route('/users', methods=['POST'])
 def create_user_admin():
     # Placeholder: Implement logic to create a new user using UserManager (for admin creation)
     data = request.get_json()
@@ -118,39 +143,49 @@ def create_user_admin():
     role = data.get('role', 'user')
     permissions = data.get('permissions', '')
     session = get_db()
- try:
- user_manager = UserManager(session)
- except Exception as e:
- return jsonify({"message": f"Error creating user manager: {e}"}), 500
+    try:
+        user_manager = UserManager(session, user_cache)
+    except Exception as e:
+        return jsonify({"message": f"Error creating user manager: {e}"}), 500
     user = user_manager.create_user(username, password, role=role, permissions=permissions) # Assuming create_user handles permissions
     return jsonify({"message": "User created successfully", "user_id": user.id}), 201
 
+@app.route('/users/<int:user_id>', methods=['PUT'])
 @require_token
 @require_permission('user:manage') # Example: Only users with 'user:manage' permission can update users
-@app.route('/users/<int:user_id>', methods=['PUT'])
 def update_user(user_id):
     # Placeholder: Implement logic to update user information using UserManager
     data = request.get_json()
     session = get_db()
- user_manager = UserManager(session)
+    user_manager = UserManager(session, user_cache)
     updated_user = user_manager.update_user(user_id, data)
     if updated_user:
         return jsonify(updated_user.__dict__), 200
     return jsonify({"message": "User not found"}), 404
 
+@app.route('/users/<int:user_id>', methods=['DELETE'])
 @require_token
 @require_permission('user:manage') # Example: Only users with 'user:manage' permission can delete users
-@app.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     # Placeholder: Implement logic to delete a user using UserManager
     session = get_db()
- user_manager = UserManager(session)
+    user_manager = UserManager(session, user_cache)
     success = user_manager.delete_user(user_id)
     if success:
         return jsonify({"message": f"User with ID: {user_id} deleted"}), 200
     return jsonify({"message": "User not found"}), 404
 
-    return jsonify({"message": f"Endpoint to delete user with ID: {user_id}"}), 200
+@app.route('/users/<int:user_id>/revoke', methods=['POST'])
+@require_token
+@require_permission('user:manage') # Only users with 'user:manage' permission can revoke other users' tokens
+def revoke_user_tokens(user_id):
+    session = get_db()
+    jtis = [jti for (jti,) in session.query(RefreshToken.token).filter_by(user_id=user_id, revoked=False)]
+    session.query(RefreshToken).filter(RefreshToken.token.in_(jtis)).update({"revoked": True}, synchronize_session=False)
+    session.commit()
+    for jti in jtis:
+        revocation_filter.add(jti)
+    return jsonify({"message": f"Revoked {len(jtis)} refresh tokens of user {user_id}"}), 200
 
 
 
@@ -158,26 +193,31 @@ def delete_user(user_id):
 
 
 
-@require_token
+# Prometheus metrics endpoint
+@app.route('/metrics')
+def metrics():
+    return generate_latest(REGISTRY).decode('utf-8'), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/loans', methods=['GET']) 
+@require_token
 def get_all_loans():
     loans = LoanManager(db_session).get_all_loans()
     # Assuming Loan objects can be easily serialized to JSON or have a method for it
     # For simplicity, let's assume they have a __dict__ or can be represented as dicts
     return jsonify([loan.__dict__ for loan in loans])
 
+@app.route('/loans/<loan_id>', methods=['GET'])
 @require_token
 @require_permission('loan:read') # Example: Users with 'loan:read' permission can view details
-@app.route('/loans/<loan_id>', methods=['GET'])
 def get_loan(loan_id): 
     loan = LoanManager(db_session).get_loan(loan_id)
     if loan:
         return jsonify(loan.__dict__)
     return jsonify({"message": "Loan not found"}), 404
 
+@app.route('/loans', methods=['POST'])
 @require_token
 @require_permission('loan:create') # Example: Users with 'loan:create' permission can create loans
-@app.route('/loans', methods=['POST'])
 def create_loan(): 
     data = request.get_json()
     borrower_data = data.get('borrower', {})
@@ -190,9 +230,9 @@ def create_loan():
     loan = LoanManager(db_session).create_loan(borrower_data, **loan_data)
     return jsonify(loan.__dict__), 201
 
+@app.route('/loans/<loan_id>/repay', methods=['POST'])
 @require_token
 @require_permission('repayment:process') # Example: Users with 'repayment:process' permission can process repayments
-@app.route('/loans/<loan_id>/repay', methods=['POST'])
 def process_repayment(loan_id):
     data = request.get_json()
     payment_amount = data.get('amount')
@@ -208,8 +248,8 @@ def register_user():
     permissions = data.get('permissions', '') # Assuming permissions are also passed in registration
     if not username or not password:
         return jsonify({"message": "Username and password are required"}), 400
-    user_manager = UserManager(db_session)
-    user = user_manager.create_user(username, password, role)
+    user_manager = UserManager(db_session, user_cache)
+    user = user_manager.create_user(username, password, role, permissions)
     return jsonify({"message": "User created successfully", "user_id": user.id}), 201
 @app.route('/login', methods=['POST'])
 
@@ -217,7 +257,7 @@ def login_user():
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
-    user_manager = UserManager(db_session)
+    user_manager = UserManager(db_session, user_cache)
     user = user_manager.get_user_by_username(username)
     # Assuming you have bcrypt or similar for password verification in UserManager
     if user and user_manager.verify_password(user, password):
@@ -227,7 +267,7 @@ def login_user():
             'user_id': user.id,
             'username': user.username,
             'role': user.role,
-            'permissions': user.permissions.split(',') if user.permissions else [], # Include permissions in access token
+            **permission_claims(user.permissions), # Include permissions in access token
             'exp': access_token_expires
         }
         access_token = jwt.encode(access_token_payload, SECRET_KEY, algorithm='HS256')
@@ -266,26 +306,32 @@ def refresh_access_token():
         # Decode without immediate expiration check, we'll check against the database
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=["HS256"], options={"verify_signature": True, "verify_exp": False})
         jti = payload.get('jti')
+        if not isinstance(jti, str) or not jti:
+            # Access tokens are signed with the same key but carry no jti
+            return jsonify({"message": "Invalid refresh token"}), 401
         user_id = payload.get('user_id')
         db = get_db()
-        refresh_token_entry = db.query(RefreshToken).filter(RefreshToken.token == jti, RefreshToken.user_id == user_id, RefreshToken.expires_at > datetime.datetime.utcnow(), RefreshToken.revoked == False).first()
-        if not refresh_token_entry:
-            return jsonify({"message": "Invalid, expired, or revoked refresh token"}), 401
+        # A token the filter rules out cannot be revoked, and its signed exp matches the stored expires_at, so it
+        # needs no lookup. Its row is only ever deleted together with the user, which is loaded below anyway.
+        if revocation_filter.might_be_revoked(jti) or payload.get('exp', 0) <= time.time():
+            refresh_token_entry = db.query(RefreshToken.id).filter(RefreshToken.token == jti, RefreshToken.user_id == user_id, RefreshToken.expires_at > datetime.datetime.utcnow(), RefreshToken.revoked == False).first()
+            if not refresh_token_entry:
+                return jsonify({"message": "Invalid, expired, or revoked refresh token"}), 401
 
         # Generate new access token
         user = db.query(User).get(user_id)
         if not user:
              return jsonify({"message": "User not found"}), 401 # Should not happen if refresh token is valid
 
-        access_token_expires = datetime.datetime.utcnow() + ACCESS_TOKEN_EXPIRE_MINUTES
+        access_token_expires = datetime.datetime.utcnow() + datetime.timedelta(seconds=ACCESS_TOKEN_EXPIRE_SECONDS)
         access_token_payload = {
             'user_id': user.id,
             'username': user.username,
             'role': user.role,
-            'permissions': user.permissions.split(',') if user.permissions else [], # Include permissions in new access token
+            **permission_claims(user.permissions), # Include permissions in new access token
             'exp': access_token_expires
         }
-        new_access_token = jwt.encode(access_token_payload, SECRET_KEY, algorithm='HS256').decode('utf-8')
+        new_access_token = jwt.encode(access_token_payload, SECRET_KEY, algorithm='HS256')
 
         # Optional: Implement refresh token rotation
         # refresh_token_entry.revoked = True # Revoke the old refresh token
@@ -313,4 +359,5 @@ if __name__ == '__main__':
     def init_db():
         Base.metadata.create_all(bind=engine)
     init_db()
+    revocation_filter.rebuild()
     app.run(debug=True)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from models import Borrower
+from .models import Borrower
 
 class BorrowerManager:
     def __init__(self, session):
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, Float, String, Date, ForeignKey, DateTime, Boolean
+from sqlalchemy import create_engine, Column, Integer, Float, String, Date, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -37,7 +37,10 @@ class User(Base):
     role = Column(String, nullable=False) # e.g., 'user', 'admin'
     permissions = Column(String) # comma-separated string of permissions
 
-    refresh_tokens = relationship("RefreshToken", back_populates="user")
+    refresh_tokens = relationship("RefreshToken", back_populates="user", cascade="all, delete-orphan")
+
+    # Ids are never reused: /refresh relies on the user being gone for the refresh tokens deleted with it
+    __table_args__ = {'sqlite_autoincrement': True}
 
 class RefreshToken(Base):
     __tablename__ = 'refresh_tokens'
@@ -50,6 +53,11 @@ class RefreshToken(Base):
 
     user = relationship("User", back_populates="refresh_tokens")
 
+    __table_args__ = (
+        # Rebuilding the revocation filter scans only revoked, unexpired tokens
+        Index('ix_refresh_tokens_revoked_expires_at', 'revoked', 'expires_at'),
+    )
+
 # Example of how you would create the database tables (you would run this separately)
 # if __name__ == "__main__":
 #     engine = create_engine('sqlite:///loan_book.db')
@@ -1,4 +1,4 @@
-from models import Loan  # Import the Loan model from models.py
+from .models import Loan  # Import the Loan model from models.py
 from sqlalchemy.orm import Session # Import Session for type hinting
 
 class RepaymentManager:
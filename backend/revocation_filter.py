@@ -0,0 +1,110 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for capacity keys at error_rate false positives."""
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationFilter:
+    """
+    Answers "is this refresh token possibly revoked?" without the database.
+
+    A Bloom filter holds the JTIs that were revoked and unexpired when it was
+    last rebuilt from load_revoked(); revocations made by this process since
+    then are kept in an exact set. False means the token is definitely not
+    revoked. True may be a false positive and must be confirmed against the
+    database.
+
+    The filter is built at startup (or on first use) and then rebuilt every
+    rebuild_interval seconds by a background thread (see start()), which
+    folds the exact set back into the Bloom filter and picks up revocations
+    made by other processes. Requests never wait for a rebuild. If rebuilds
+    keep failing and the filter is more than twice rebuild_interval old,
+    every JTI is reported as possibly revoked, so callers fall back to the
+    database instead of missing other processes' revocations.
+    """
+
+    def __init__(self, load_revoked, rebuild_interval=60, error_rate=0.01):
+        self.load_revoked = load_revoked
+        self.rebuild_interval = rebuild_interval
+        self.error_rate = error_rate
+        self._bloom = None
+        self._recent = {} # jti -> when it was added
+        self._built_at = None
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > self.rebuild_interval
+
+    def rebuild(self, only_if_stale=False):
+        with self._rebuild_lock:
+            if only_if_stale and not self._stale():
+                return # another thread rebuilt it meanwhile
+            started = time.monotonic()
+            jtis = list(self.load_revoked())
+            bloom = BloomFilter(len(jtis), self.error_rate)
+            for jti in jtis:
+                bloom.add(jti)
+            with self._lock:
+                self._bloom = bloom
+                self._built_at = started
+                # Revocations committed before the scan started are in the scan
+                self._recent = {jti: at for jti, at in self._recent.items() if at >= started}
+
+    def add(self, jti):
+        """Records a revocation; call it after the revocation is committed."""
+        with self._lock:
+            self._recent[jti] = time.monotonic()
+
+    def might_be_revoked(self, jti):
+        if self._bloom is None:
+            self.rebuild(only_if_stale=True) # nothing to answer from yet
+        with self._lock:
+            if time.monotonic() - self._built_at > 2 * self.rebuild_interval:
+                return True # the rebuilds are failing
+            return jti in self._recent or jti in self._bloom
+
+    def _rebuild_periodically(self):
+        while not self._stopped.wait(self.rebuild_interval):
+            try:
+                self.rebuild()
+            except Exception as e:
+                logger.error(f"Rebuilding the refresh token revocation filter failed: {e}", exc_info=True)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._rebuild_periodically, name='revocation-filter-rebuild', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
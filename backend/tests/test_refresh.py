@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+
+import jwt
+import pytest
+from sqlalchemy import event
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'backend.db'))
+
+from backend import app as backend_app
+from backend.models import Base, User
+
+
+@pytest.fixture
+def client():
+    Base.metadata.create_all(bind=backend_app.engine)
+    client = backend_app.app.test_client()
+    client.post('/register', json={'username': 'ann', 'password': 'secret', 'permissions': 'user:manage'})
+    yield client
+    backend_app.db_session.remove()
+    Base.metadata.drop_all(bind=backend_app.engine)
+    backend_app.user_cache.invalidate(1)
+
+def _login(client):
+    return client.post('/login', json={'username': 'ann', 'password': 'secret'}).get_json()
+
+def test_refresh_issues_an_access_token(client):
+    tokens = _login(client)
+    response = client.post('/refresh', json={'refresh_token': tokens['refresh_token']})
+    assert response.status_code == 200
+    assert 'access_token' in response.get_json()
+
+def test_access_token_is_not_accepted_as_refresh_token(client):
+    """Test that a validly signed token without a jti is rejected rather than failing the filter lookup."""
+    tokens = _login(client)
+    response = client.post('/refresh', json={'refresh_token': tokens['access_token']})
+    assert response.status_code == 401
+
+    forged_jti = jwt.encode({'user_id': 1, 'jti': 7, 'exp': int(time.time()) + 60}, backend_app.SECRET_KEY, algorithm='HS256')
+    assert client.post('/refresh', json={'refresh_token': forged_jti}).status_code == 401
+
+def test_refresh_of_a_token_that_cannot_be_revoked_skips_refresh_tokens(client):
+    """Test that a token the revocation filter rules out is refreshed without querying refresh_tokens."""
+    tokens = _login(client)
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(backend_app.engine, 'before_cursor_execute', record)
+    try:
+        assert client.post('/refresh', json={'refresh_token': tokens['refresh_token']}).status_code == 200
+    finally:
+        event.remove(backend_app.engine, 'before_cursor_execute', record)
+    assert statements and not any('refresh_tokens' in statement for statement in statements)
+
+def test_refresh_token_of_a_deleted_user_is_rejected(client):
+    """Test that the user lookup rejects the tokens deleted with their user, even once the id is taken again."""
+    tokens = _login(client)
+    headers = {'Authorization': 'Bearer ' + tokens['access_token']}
+    assert client.delete('/users/1', headers=headers).status_code == 200
+    assert client.post('/refresh', json={'refresh_token': tokens['refresh_token']}).status_code == 401
+
+    client.post('/register', json={'username': 'cat', 'password': 'secret'})
+    session = backend_app.SessionLocal()
+    assert session.query(User).filter_by(username='cat').one().id == 2 # not 1 again
+    session.close()
+    assert client.post('/refresh', json={'refresh_token': tokens['refresh_token']}).status_code == 401
+
+def test_revoked_refresh_token_is_rejected(client):
+    tokens = _login(client)
+    headers = {'Authorization': 'Bearer ' + tokens['access_token']}
+    assert client.post('/users/1/revoke', headers=headers).status_code == 200
+    assert client.post('/refresh', json={'refresh_token': tokens['refresh_token']}).status_code == 401
@@ -0,0 +1,46 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import time
+
+import jwt
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'backend.db'))
+
+from backend import app as backend_app
+from backend.models import Base
+
+
+@pytest.fixture
+def client():
+    Base.metadata.create_all(bind=backend_app.engine)
+    client = backend_app.app.test_client()
+    client.post('/register', json={'username': 'ann', 'password': 'secret', 'permissions': 'user:manage'})
+    yield client
+    backend_app.db_session.remove()
+    Base.metadata.drop_all(bind=backend_app.engine)
+    backend_app.user_cache.invalidate(1)
+
+def _gateway_headers(secret, claims):
+    encoded = base64.urlsafe_b64encode(json.dumps(claims).encode('utf-8')).decode('ascii')
+    signature = hmac.new(secret.encode('utf-8'), encoded.encode('ascii'), hashlib.sha256).hexdigest()
+    return {'X-Verified-Claims': encoded, 'X-Verified-Claims-Signature': signature}
+
+def test_backend_tokens_are_verified_with_its_own_key(client):
+    tokens = client.post('/login', json={'username': 'ann', 'password': 'secret'}).get_json()
+    assert client.post('/users/1/revoke', headers={'Authorization': 'Bearer ' + tokens['access_token']}).status_code == 200
+
+def test_gateway_claims_are_not_trusted(client):
+    """Test that claims the gateway verified against another service's key do not stand in for a backend token."""
+    now = int(time.time())
+    claims = {'user_id': 1, 'username': 'ann', 'permissions': 'user:manage', 'iat': now, 'exp': now + 600}
+    user_service_token = jwt.encode(claims, 'user-service-jwt-secret', algorithm='HS256')
+    headers = {'Authorization': 'Bearer ' + user_service_token, **_gateway_headers('gateway-secret', claims)}
+
+    response = client.post('/users/1/revoke', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Invalid token'
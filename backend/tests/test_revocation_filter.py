@@ -0,0 +1,84 @@
+import time
+
+from backend.revocation_filter import BloomFilter, RevocationFilter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """Test that every key added is reported, and that false positives stay near the error rate."""
+    bloom = BloomFilter(5000, error_rate=0.01)
+    for i in range(5000):
+        bloom.add(f'revoked-{i}')
+
+    assert all(f'revoked-{i}' in bloom for i in range(5000))
+    false_positives = sum(f'live-{i}' in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.03
+
+def test_empty_bloom_filter_reports_nothing():
+    bloom = BloomFilter(0)
+    assert 'anything' not in bloom
+
+def test_filter_is_built_from_the_loader_on_first_use():
+    """Test that revocations present when the filter is built are reported, and others are not."""
+    loads = []
+
+    def load_revoked():
+        loads.append(1)
+        return ['jti-1', 'jti-2']
+
+    revocations = RevocationFilter(load_revoked, rebuild_interval=3600)
+    assert revocations.might_be_revoked('jti-1')
+    assert revocations.might_be_revoked('jti-2')
+    assert not revocations.might_be_revoked('jti-3')
+    assert len(loads) == 1 # not rebuilt while fresh
+
+def test_revocations_since_the_last_build_are_reported_exactly():
+    """Test that add() takes effect at once, before the next rebuild, through the exact set."""
+    revocations = RevocationFilter(lambda: [], rebuild_interval=3600)
+    assert not revocations.might_be_revoked('jti-1')
+
+    revocations.add('jti-1')
+    assert revocations.might_be_revoked('jti-1')
+    assert not revocations.might_be_revoked('jti-2')
+
+def test_rebuild_folds_recent_revocations_into_the_bloom_filter():
+    """Test that a rebuild picks up revocations from the loader and drops them from the exact set."""
+    revoked = ['jti-1']
+    revocations = RevocationFilter(lambda: list(revoked), rebuild_interval=3600)
+    revocations.rebuild()
+    revocations.add('jti-2')
+    revoked.append('jti-2') # committed, so the next scan sees it
+    revoked.append('jti-3') # revoked by another process
+
+    revocations.rebuild()
+    assert revocations._recent == {}
+    assert all(revocations.might_be_revoked(jti) for jti in ('jti-1', 'jti-2', 'jti-3'))
+
+def test_stale_filter_is_rebuilt_in_the_background():
+    """Test that lookups never rebuild the filter themselves, and that the rebuild thread picks up new revocations."""
+    revoked = []
+    loads = []
+
+    def load_revoked():
+        loads.append(1)
+        return list(revoked)
+
+    revocations = RevocationFilter(load_revoked, rebuild_interval=0.05)
+    assert not revocations.might_be_revoked('jti-1')
+    revoked.append('jti-1')
+    time.sleep(0.06)
+    assert not revocations.might_be_revoked('jti-1') # stale, but answered from the last build
+    assert len(loads) == 1
+
+    revocations.start()
+    try:
+        time.sleep(0.08)
+        assert revocations.might_be_revoked('jti-1')
+    finally:
+        revocations.stop()
+
+def test_filter_falls_back_to_the_database_when_rebuilds_fail():
+    """Test that a filter left unrebuilt for twice its interval reports every JTI as possibly revoked."""
+    revocations = RevocationFilter(lambda: [], rebuild_interval=0.02)
+    assert not revocations.might_be_revoked('jti-1')
+    time.sleep(0.05)
+    assert revocations.might_be_revoked('jti-1')
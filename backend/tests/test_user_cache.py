@@ -0,0 +1,115 @@
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'backend.db'))
+
+from backend import app as backend_app
+from backend.models import Base, User
+from backend.user_cache import UserCache
+
+
+def _user(user_id, permissions='loan:read'):
+    return SimpleNamespace(id=user_id, username=f'user-{user_id}', role='user', permissions=permissions)
+
+class _Loader:
+    def __init__(self, users):
+        self.users = users
+        self.calls = 0
+
+    def __call__(self, user_id):
+        self.calls += 1
+        return self.users.get(user_id)
+
+def test_users_are_cached_until_the_ttl_expires():
+    cache = UserCache(ttl=0.05)
+    load = _Loader({1: _user(1)})
+
+    assert cache.get(1, load).username == 'user-1'
+    assert cache.get(1, load).username == 'user-1'
+    assert load.calls == 1
+
+    time.sleep(0.06)
+    load.users[1] = _user(1, permissions='user:manage')
+    assert cache.get(1, load).permissions == 'user:manage'
+    assert load.calls == 2
+
+def test_missing_users_are_cached_for_the_negative_ttl():
+    """Test that tokens of deleted users do not cost a query each, and that the absence expires."""
+    cache = UserCache(ttl=60, negative_ttl=0.05)
+    load = _Loader({})
+
+    assert cache.get(1, load) is None
+    assert cache.get(1, load) is None
+    assert load.calls == 1
+
+    time.sleep(0.06)
+    load.users[1] = _user(1)
+    assert cache.get(1, load) is not None
+    assert load.calls == 2
+
+def test_mark_deleted_caches_the_absence():
+    cache = UserCache(ttl=60)
+    load = _Loader({1: _user(1)})
+    cache.get(1, load)
+
+    cache.mark_deleted(1)
+    assert cache.get(1, load) is None
+    assert load.calls == 1
+
+def test_invalidation_during_a_load_is_not_overwritten():
+    """Test that a user loaded before a concurrent update is returned but not cached."""
+    cache = UserCache(ttl=60)
+    users = {1: _user(1)}
+
+    def load_then_update(user_id):
+        loaded = users[user_id]
+        # Another request updates the user after our read and before we cache it
+        users[user_id] = _user(user_id, permissions='user:manage')
+        cache.invalidate(user_id)
+        return loaded
+
+    assert cache.get(1, load_then_update).permissions == 'loan:read'
+    load = _Loader(users)
+    assert cache.get(1, load).permissions == 'user:manage'
+    assert load.calls == 1
+
+def test_cache_is_bounded():
+    cache = UserCache(ttl=60, max_entries=2)
+    load = _Loader({i: _user(i) for i in range(3)})
+    for user_id in range(3):
+        cache.get(user_id, load)
+    cache.get(0, load)
+    assert load.calls == 4 # the oldest entry was evicted
+
+
+@pytest.fixture
+def client():
+    Base.metadata.create_all(bind=backend_app.engine)
+    session = backend_app.SessionLocal()
+    session.add(User(id=1, username='ann', password='x', role='admin', permissions='user:manage'))
+    session.commit()
+    session.close()
+    yield backend_app.app.test_client()
+    backend_app.db_session.remove()
+    Base.metadata.drop_all(bind=backend_app.engine)
+    backend_app.user_cache.invalidate(1)
+
+def test_require_token_sees_a_permission_change_after_invalidate(client):
+    """Test that permissions read from the user (tokens without permission claims) follow invalidate()."""
+    token = jwt.encode({'user_id': 1, 'exp': int(time.time()) + 60}, backend_app.SECRET_KEY, algorithm='HS256')
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.post('/users/1/revoke', headers=headers).status_code == 200
+
+    session = backend_app.SessionLocal()
+    session.get(User, 1).permissions = 'loan:read'
+    session.commit()
+    session.close()
+    assert client.post('/users/1/revoke', headers=headers).status_code == 200 # still the cached user
+
+    backend_app.user_cache.invalidate(1)
+    assert client.post('/users/1/revoke', headers=headers).status_code == 403
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from prometheus_client import Counter
+
+USER_CACHE_LOOKUPS = Counter('backend_user_cache_lookups_total',
+                             'User lookups by id; hit and negative_hit are database round trips saved', ['result'])
+
+# What require_token needs of a user, detached from any session
+CachedUser = namedtuple('CachedUser', ['id', 'username', 'role', 'permissions'])
+
+_MISSING = object()
+
+
+class UserCache:
+    """
+    Read-through cache of users by id, kept for ttl seconds.
+
+    A lookup that finds no user is cached too (for negative_ttl seconds), so
+    tokens of deleted users do not cost a query each. UserManager invalidates
+    an id when it creates, updates or deletes that user; changes made by other
+    processes show up once the entry expires.
+    """
+
+    def __init__(self, ttl=30, negative_ttl=None, max_entries=10000):
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # id -> (expires at, CachedUser or None)
+        self._generation = 0 # bumped by every invalidation
+        self._lock = threading.Lock()
+
+    def get(self, user_id, load):
+        """The user with this id or None, calling load(user_id) to fetch a User on a miss."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id, _MISSING)
+            if entry is not _MISSING and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                USER_CACHE_LOOKUPS.labels(result='hit' if entry[1] is not None else 'negative_hit').inc()
+                return entry[1]
+            generation = self._generation
+        USER_CACHE_LOOKUPS.labels(result='miss').inc()
+        user = load(user_id)
+        cached = CachedUser(user.id, user.username, user.role, user.permissions) if user is not None else None
+        self._put(user_id, cached, now + (self.ttl if cached is not None else self.negative_ttl), generation)
+        return cached
+
+    def _put(self, user_id, cached, expires_at, generation=None):
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return # invalidated while loading; what was loaded may be stale already
+            self._entries[user_id] = (expires_at, cached)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def mark_deleted(self, user_id):
+        """Caches the absence of a user that was just deleted."""
+        with self._lock:
+            self._generation += 1
+        self._put(user_id, None, time.monotonic() + self.negative_ttl)
@@ -1,15 +1,18 @@
-from models import User
+from .models import User
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy.orm.exc import NoResultFound
 class UserManager:
-    def __init__(self, session):
+    def __init__(self, session, user_cache=None):
         self.session = session
+        self.user_cache = user_cache # invalidated on every change to a user
 
-    def create_user(self, username, password, role='user'):
+    def create_user(self, username, password, role='user', permissions=''):
         hashed_password = generate_password_hash(password)
-        new_user = User(username=username, password=hashed_password, role=role
+        new_user = User(username=username, password=hashed_password, role=role, permissions=permissions)
         self.session.add(new_user)
         self.session.commit()
+        if self.user_cache is not None:
+            self.user_cache.invalidate(new_user.id) # users tables created before sqlite_autoincrement may reuse the id of a deleted user
         return new_user
 
     def get_user_by_username(self, username):
@@ -37,6 +40,8 @@ class UserManager:
                     else:
                         setattr(user, key, value)
             self.session.commit()
+            if self.user_cache is not None:
+                self.user_cache.invalidate(user_id)
             return user
         return None
 
@@ -45,5 +50,7 @@ class UserManager:
         if user:
             self.session.delete(user)
             self.session.commit()
+            if self.user_cache is not None:
+                self.user_cache.mark_deleted(user_id)
             return True
         return False
\ No newline at end of file
@@ -15,7 +15,8 @@ from python_json_logger import JsonFormatter
 logger = logging.getLogger(__name__)
 handler = logging.StreamHandler()
 
-from sqlalchemy import create_engine, orm
+from prometheus_client import generate_latest, REGISTRY
+from common.db import Database, options_from_env
 
 # Database setup
 def get_config_from_consul(key):
@@ -34,10 +35,12 @@ handler.setFormatter(formatter)
 logger.addHandler(handler)
 DATABASE_URL = get_config_from_consul('database_url')
 Base = declarative_base() # Define Base for this service - important if this service has models if any
-engine = create_engine(DATABASE_URL)
 
 app = Flask(__name__)
 Swagger(app)
+db = Database(DATABASE_URL, name='collection-service', **options_from_env())
+db.init_app(app) # sessions are removed when each request ends
+engine = db.engine
 
 # Initialize database - create tables for models defined in this service
 def init_db():
@@ -45,8 +48,8 @@ def init_db():
     Base.metadata.create_all(bind=engine)
 
 # Database session setup
-SessionLocal = orm.sessionmaker(autocommit=False, autoflush=False, bind=engine)
-db_session = orm.scoped_session(SessionLocal)
+SessionLocal = db.session_factory
+db_session = db.session
 logger.setLevel(logging.INFO)
 
 # Endpoint for processing repayments
@@ -130,6 +133,11 @@ def health_check():
  # Basic health check - could add database connection check or Loan Service connectivity check
  return jsonify({"status": "UP"}), 200
 
+# Prometheus metrics endpoint
+@app.route('/metrics')
+def metrics():
+    return generate_latest(REGISTRY).decode('utf-8'), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 if __name__ == '__main__':
     init_db() # Initialize the database for this service
     app.run(debug=True, port=5003)
@@ -0,0 +1 @@
+# Code shared by the services. Each service image copies this package next to its own modules.
@@ -0,0 +1,142 @@
+"""
+Measures SQLite throughput of loan creation and repayment under each storage
+profile of common/db.py (DB_SQLITE_PROFILE).
+
+Each profile runs in its own process against a fresh database file with the
+loan service's models. `--writers` threads first create `--loans` loans, then
+make `--repayments` repayments (read the loan, lower its amount, mark it paid
+off once nothing is left), while `--readers` threads keep listing a
+borrower's active loans and fetching single loans, as the reporting and
+collection services do. Writes that fail with "database is locked" are
+counted, not retried.
+
+    python common/benchmarks/bench_sqlite_profile.py --loans 2000 --repayments 2000 --writers 4 --readers 4
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BORROWERS = 50
+
+
+def run_profile(profile, args, results):
+    sys.path.insert(0, ROOT_DIR)
+    sys.path.insert(0, os.path.join(ROOT_DIR, 'loan-service'))
+    from sqlalchemy.exc import OperationalError
+
+    from common.db import Database
+    from models import Base, Borrower, Loan
+
+    db = Database('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'), name=profile, sqlite_profile=profile,
+                  pool_size=args.writers + args.readers)
+    Base.metadata.create_all(bind=db.engine)
+    session = db.session_factory()
+    session.add_all(Borrower(name=f'borrower-{i}', credit_score=600 + i) for i in range(BORROWERS))
+    session.commit()
+    session.close()
+
+    def create_loan(session, rng):
+        session.add(Loan(amount=rng.choice((500.0, 1000.0, 5000.0)), interest_rate=0.12, term=12,
+                         start_date=date.today(), status='active', borrower_id=rng.randint(1, BORROWERS)))
+
+    def repay(session, rng):
+        loan = session.get(Loan, rng.randint(1, args.loans))
+        if loan is not None and loan.status == 'active':
+            loan.amount -= 250.0
+            if loan.amount <= 0:
+                loan.amount = 0.0
+                loan.status = 'paid off'
+
+    def phase(operation, count):
+        remaining = iter(range(count))
+        lock = threading.Lock()
+        done = threading.Event()
+        counts = {'locked': 0, 'reads': 0}
+
+        def writer(seed):
+            rng = random.Random(seed)
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                session = db.session_factory()
+                try:
+                    operation(session, rng)
+                    session.commit()
+                except OperationalError as e:
+                    session.rollback()
+                    if 'locked' not in str(e):
+                        raise
+                    with lock:
+                        counts['locked'] += 1
+                finally:
+                    session.close()
+
+        def reader(seed):
+            rng = random.Random(seed)
+            reads = 0
+            while not done.is_set():
+                session = db.session_factory()
+                try:
+                    session.query(Loan).filter(Loan.borrower_id == rng.randint(1, BORROWERS),
+                                               Loan.status == 'active').all()
+                    session.get(Loan, rng.randint(1, args.loans))
+                    reads += 2
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                finally:
+                    session.close()
+            with lock:
+                counts['reads'] += reads
+
+        readers = [threading.Thread(target=reader, args=(1000 + i,)) for i in range(args.readers)]
+        writers = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+        for thread in readers:
+            thread.start()
+        started = time.perf_counter()
+        for thread in writers:
+            thread.start()
+        for thread in writers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        for thread in readers:
+            thread.join()
+        return {'writes': (count - counts['locked']) / elapsed, 'reads': counts['reads'] / elapsed,
+                'locked': counts['locked']}
+
+    results[profile] = {'create': phase(create_loan, args.loans), 'repay': phase(repay, args.repayments)}
+    db.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loans', type=int, default=2000)
+    parser.add_argument('--repayments', type=int, default=2000)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--profiles', nargs='+', default=['default', 'high_throughput'])
+    args = parser.parse_args()
+
+    results = multiprocessing.Manager().dict()
+    for profile in args.profiles:
+        process = multiprocessing.Process(target=run_profile, args=(profile, args, results))
+        process.start()
+        process.join()
+
+    for profile in args.profiles:
+        for name, result in results[profile].items():
+            print(f"{profile:16} {name:7} {result['writes']:8.1f} writes/s  {result['reads']:9.1f} reads/s  "
+                  f"locked {result['locked']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import logging
+import os
+import threading
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_CHECKOUT_WAIT = Histogram('db_pool_checkout_wait_seconds',
+                                  'Time to get a connection from the pool, opening one included', ['database'],
+                                  buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30))
+DB_POOL_CHECKOUT_TIMEOUTS = Counter('db_pool_checkout_timeouts_total',
+                                    'Checkouts that gave up after pool_timeout with every connection in use', ['database'])
+DB_POOL_IN_USE = Gauge('db_pool_connections_in_use', 'Connections currently checked out of the pool', ['database'])
+DB_POOL_IDLE = Gauge('db_pool_connections_idle', 'Open connections waiting in the pool', ['database'])
+DB_SQLITE_CHECKPOINT_DURATION = Histogram('db_sqlite_checkpoint_seconds', 'Duration of periodic SQLite WAL checkpoints',
+                                          ['database'], buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+DB_SQLITE_CHECKPOINT_BUSY = Counter('db_sqlite_checkpoints_busy_total',
+                                    'Periodic WAL checkpoints that could not finish because of active readers or writers',
+                                    ['database'])
+
+# PRAGMAs run on every new SQLite connection, by profile
+SQLITE_PROFILES = {
+    'default': {},
+    'high_throughput': {
+        'journal_mode': 'WAL', # readers no longer block the writer, nor the writer the readers
+        'synchronous': 'NORMAL', # no fsync per commit in WAL mode; a power loss may drop the last commits, never corrupts
+        'busy_timeout': 5000, # in milliseconds, how long a writer waits for the lock before "database is locked"
+        'cache_size': -65536, # in KiB (negative), 64 MiB of page cache per connection
+        'mmap_size': 268435456, # 256 MiB of the file read through memory mapping
+        'temp_store': 'MEMORY',
+    },
+}
+SQLITE_CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+
+def options_from_env(environ=None):
+    """
+    Database arguments from the environment: pool settings from DB_POOL_SIZE,
+    DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE and DB_POOL_PRE_PING, and
+    SQLite settings from DB_SQLITE_PROFILE, DB_SQLITE_CHECKPOINT_INTERVAL and
+    DB_SQLITE_CHECKPOINT_MODE.
+    """
+    environ = os.environ if environ is None else environ
+    return {
+        'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30)), # in seconds
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)), # in seconds, -1 never recycles
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'sqlite_profile': environ.get('DB_SQLITE_PROFILE', 'default'),
+        'sqlite_checkpoint_interval': float(environ.get('DB_SQLITE_CHECKPOINT_INTERVAL', 0)), # in seconds, 0 disables
+        'sqlite_checkpoint_mode': environ.get('DB_SQLITE_CHECKPOINT_MODE', 'PASSIVE').upper(),
+    }
+
+
+def _set_sqlite_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return on_connect
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited."""
+    database = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.labels(database=self.database).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(database=self.database).observe(time.perf_counter() - started)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.database = self.database
+        return pool
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+class Database:
+    """
+    The engine, session factory and per-request sessions of a service database.
+
+    One engine and one sessionmaker are built when the service starts and
+    reused for the life of the process; `session` is a scoped_session, so a
+    request gets its thread's session by calling db.session() and it is
+    returned to the pool when the app context ends (see init_app). Background
+    jobs that need sessions of their own use session_factory.
+
+    Pool sizing applies to file and server databases; an in-memory SQLite
+    database keeps SQLAlchemy's single-connection pool.
+
+    SQLite connections get the PRAGMAs of sqlite_profile (see SQLITE_PROFILES)
+    when they are opened; sqlite_pragmas adds to or overrides them. With a
+    sqlite_checkpoint_interval, a background thread checkpoints the WAL that
+    often, on top of SQLite's own checkpoint every 1000 pages, so the WAL
+    file does not keep growing while readers are always active.
+    """
+
+    def __init__(self, url, name='default', pool_size=5, max_overflow=10, pool_timeout=30, pool_recycle=1800,
+                 pool_pre_ping=True, sqlite_profile='default', sqlite_pragmas=None, sqlite_checkpoint_interval=0,
+                 sqlite_checkpoint_mode='PASSIVE', **engine_options):
+        url = make_url(url)
+        self.name = name
+        if sqlite_profile not in SQLITE_PROFILES:
+            raise ValueError(f"Unknown SQLite profile {sqlite_profile!r}, expected one of {', '.join(SQLITE_PROFILES)}")
+        if sqlite_checkpoint_mode not in SQLITE_CHECKPOINT_MODES:
+            raise ValueError(f"Unknown checkpoint mode {sqlite_checkpoint_mode!r}, "
+                             f"expected one of {', '.join(SQLITE_CHECKPOINT_MODES)}")
+        if not _is_memory_sqlite(url):
+            engine_options.update(poolclass=InstrumentedQueuePool, pool_size=pool_size, max_overflow=max_overflow,
+                                  pool_timeout=pool_timeout, pool_recycle=pool_recycle, pool_pre_ping=pool_pre_ping)
+            if url.get_backend_name() == 'sqlite':
+                # Pooled connections move between request threads
+                engine_options.setdefault('connect_args', {}).setdefault('check_same_thread', False)
+        self.engine = create_engine(url, **engine_options)
+        if isinstance(self.engine.pool, InstrumentedQueuePool):
+            self.engine.pool.database = name
+        self.sqlite_pragmas = {}
+        if url.get_backend_name() == 'sqlite':
+            self.sqlite_pragmas = {**SQLITE_PROFILES[sqlite_profile], **(sqlite_pragmas or {})}
+            if self.sqlite_pragmas:
+                event.listen(self.engine, 'connect', _set_sqlite_pragmas(self.sqlite_pragmas))
+        self.session_factory = sessionmaker(autoflush=False, bind=self.engine)
+        self.session = scoped_session(self.session_factory)
+
+        DB_POOL_IN_USE.labels(database=name).set_function(lambda: self._pool_count('checkedout'))
+        DB_POOL_IDLE.labels(database=name).set_function(lambda: self._pool_count('checkedin'))
+
+        self.checkpoint_mode = sqlite_checkpoint_mode
+        self._stopped = threading.Event()
+        self._checkpointer = None
+        if sqlite_checkpoint_interval and str(self.sqlite_pragmas.get('journal_mode', '')).upper() == 'WAL':
+            self._checkpointer = threading.Thread(target=self._checkpoint_periodically, args=(sqlite_checkpoint_interval,),
+                                                  name=f'{name}-wal-checkpoint', daemon=True)
+            self._checkpointer.start()
+
+    def _pool_count(self, method):
+        count = getattr(self.engine.pool, method, None) # the engine may have swapped in a new pool after dispose()
+        return count() if count else 0
+
+    def checkpoint(self):
+        """Checkpoints the SQLite WAL; returns (busy, WAL pages, pages checkpointed)."""
+        started = time.perf_counter()
+        with self.engine.connect() as connection:
+            busy, log_pages, checkpointed = connection.execute(text(f'PRAGMA wal_checkpoint({self.checkpoint_mode})')).one()
+        DB_SQLITE_CHECKPOINT_DURATION.labels(database=self.name).observe(time.perf_counter() - started)
+        if busy:
+            DB_SQLITE_CHECKPOINT_BUSY.labels(database=self.name).inc()
+        return busy, log_pages, checkpointed
+
+    def _checkpoint_periodically(self, interval):
+        while not self._stopped.wait(interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                logger.error(f"WAL checkpoint of {self.name} failed: {e}", exc_info=True)
+
+    def init_app(self, app):
+        """Ends the request's session when the Flask app context is torn down."""
+        @app.teardown_appcontext
+        def remove_db_session(exception=None):
+            self.session.remove()
+
+    def dispose(self):
+        self._stopped.set()
+        if self._checkpointer is not None:
+            self._checkpointer.join()
+        self.session.remove()
+        self.engine.dispose()
@@ -0,0 +1,57 @@
+# Central catalogue of the permissions a token can carry.
+#
+# Access tokens encode granted permissions as a bitmask claim (perm_mask) in
+# which bit i stands for PERMISSIONS[i]. The positions are therefore part of
+# the token format: only ever append new permissions, never reorder or remove.
+PERMISSIONS = (
+    'user:read',
+    'user:manage',
+    'loan:read',
+    'loan:create',
+    'repayment:process',
+    'report:read',
+)
+
+PERMISSION_BITS = {name: 1 << index for index, name in enumerate(PERMISSIONS)}
+
+
+def parse_permissions(permissions):
+    """Normalizes a comma-separated string or a list of permission names into a list."""
+    if not permissions:
+        return []
+    if isinstance(permissions, str):
+        permissions = permissions.split(',')
+    return [p.strip() for p in permissions if p and p.strip()]
+
+
+def permission_claims(permissions):
+    """
+    Token claims for a user's permissions: the bitmask of the catalogued ones,
+    plus the legacy string for any name the catalogue does not know yet, so
+    that nothing granted is lost.
+    """
+    names = parse_permissions(permissions)
+    claims = {'perm_mask': encode_permissions(names)}
+    if any(name not in PERMISSION_BITS for name in names):
+        claims['permissions'] = ','.join(names)
+    return claims
+
+
+def encode_permissions(permissions):
+    mask = 0
+    for name in parse_permissions(permissions):
+        mask |= PERMISSION_BITS.get(name, 0)
+    return mask
+
+
+def has_permission(claims, permission, bit=None):
+    """
+    Checks a permission against token claims: a single bit test for tokens
+    with perm_mask, falling back to the comma-separated or list 'permissions'
+    claim of older tokens and of permissions outside the catalogue.
+    """
+    bit = PERMISSION_BITS.get(permission) if bit is None else bit
+    mask = claims.get('perm_mask')
+    if mask is not None and bit and mask & bit:
+        return True
+    return permission in parse_permissions(claims.get('permissions'))
@@ -0,0 +1,81 @@
+import pytest
+from flask import Flask
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import StaticPool, SingletonThreadPool
+from common.db import Database, InstrumentedQueuePool, options_from_env
+
+
+def _sample(name, database):
+    return REGISTRY.get_sample_value(name, {'database': database})
+
+def test_options_from_env():
+    """Test that pool and SQLite settings are read from DB_* variables, with defaults for the rest."""
+    options = options_from_env({'DB_POOL_SIZE': '20', 'DB_POOL_TIMEOUT': '2.5', 'DB_POOL_PRE_PING': 'false'})
+    assert options == {'pool_size': 20, 'max_overflow': 10, 'pool_timeout': 2.5, 'pool_recycle': 1800,
+                       'pool_pre_ping': False, 'sqlite_profile': 'default', 'sqlite_checkpoint_interval': 0.0,
+                       'sqlite_checkpoint_mode': 'PASSIVE'}
+
+def test_in_memory_sqlite_keeps_the_default_pool():
+    """Test that an in-memory database is not given a queue pool, which would hand out empty databases."""
+    db = Database('sqlite://', name='test-memory')
+    assert isinstance(db.engine.pool, (SingletonThreadPool, StaticPool))
+    db.dispose()
+
+def test_checkouts_are_measured(tmp_path):
+    """Test that checkouts, connections in use and pool timeouts show up in the metrics."""
+    db = Database(f"sqlite:///{tmp_path / 'pool.db'}", name='test-pool', pool_size=1, max_overflow=0, pool_timeout=0.1)
+    assert isinstance(db.engine.pool, InstrumentedQueuePool)
+
+    connection = db.engine.connect()
+    assert _sample('db_pool_connections_in_use', 'test-pool') == 1
+    assert _sample('db_pool_checkout_wait_seconds_count', 'test-pool') == 1
+    with pytest.raises(PoolTimeoutError):
+        db.engine.connect()
+    assert _sample('db_pool_checkout_timeouts_total', 'test-pool') == 1
+
+    connection.close()
+    assert _sample('db_pool_connections_in_use', 'test-pool') == 0
+    assert _sample('db_pool_connections_idle', 'test-pool') == 1
+    db.dispose()
+
+def test_session_is_removed_after_each_request(tmp_path):
+    """Test that init_app returns the request's connection to the pool once the request ends."""
+    db = Database(f"sqlite:///{tmp_path / 'app.db'}", name='test-app')
+    app = Flask(__name__)
+    db.init_app(app)
+
+    @app.route('/')
+    def index():
+        return str(db.session().execute(text('SELECT 1')).scalar())
+
+    assert app.test_client().get('/').data == b'1'
+    assert _sample('db_pool_connections_in_use', 'test-app') == 0
+    db.dispose()
+
+def test_sqlite_profile_is_applied_to_every_connection(tmp_path):
+    """Test that the PRAGMAs of the profile, with overrides, are set on each new connection."""
+    db = Database(f"sqlite:///{tmp_path / 'wal.db'}", name='test-wal', sqlite_profile='high_throughput',
+                  sqlite_pragmas={'busy_timeout': 250})
+    with db.engine.connect() as first, db.engine.connect() as second:
+        for connection in (first, second):
+            assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            assert connection.execute(text('PRAGMA synchronous')).scalar() == 1 # NORMAL
+            assert connection.execute(text('PRAGMA busy_timeout')).scalar() == 250
+            assert connection.execute(text('PRAGMA temp_store')).scalar() == 2 # MEMORY
+    assert db.checkpoint()[0] == 0
+    assert _sample('db_sqlite_checkpoint_seconds_count', 'test-wal') == 1
+    db.dispose()
+
+def test_default_profile_leaves_sqlite_alone(tmp_path):
+    """Test that without a profile the journal mode stays SQLite's default."""
+    db = Database(f"sqlite:///{tmp_path / 'plain.db'}", name='test-plain')
+    with db.engine.connect() as connection:
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'delete'
+    db.dispose()
+
+def test_unknown_sqlite_profile_is_rejected():
+    """Test that a misspelt DB_SQLITE_PROFILE fails at startup rather than running without it."""
+    with pytest.raises(ValueError):
+        Database('sqlite://', name='test-typo', sqlite_profile='fast')
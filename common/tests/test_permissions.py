@@ -0,0 +1,25 @@
+from common.permissions import PERMISSION_BITS, encode_permissions, has_permission, permission_claims
+
+
+def test_catalogued_permissions_are_encoded_as_a_bitmask():
+    """Test that catalogued permissions end up in perm_mask only."""
+    claims = permission_claims('user:read, loan:create')
+
+    assert claims == {'perm_mask': PERMISSION_BITS['user:read'] | PERMISSION_BITS['loan:create']}
+    assert has_permission(claims, 'loan:create')
+    assert not has_permission(claims, 'user:manage')
+
+def test_uncatalogued_permissions_keep_the_string_claim():
+    """Test that a permission missing from the catalogue is not lost."""
+    claims = permission_claims(['user:read', 'custom:thing'])
+
+    assert claims['perm_mask'] == encode_permissions('user:read')
+    assert has_permission(claims, 'custom:thing')
+    assert has_permission(claims, 'user:read')
+
+def test_legacy_string_tokens_still_work():
+    """Test that tokens issued before perm_mask are checked against their permissions claim."""
+    assert has_permission({'permissions': 'user:read,user:manage'}, 'user:manage')
+    assert has_permission({'permissions': ['loan:read']}, 'loan:read')
+    assert not has_permission({'permissions': 'user:read'}, 'user:manage')
+    assert not has_permission({}, 'user:read')
@@ -1,10 +1,12 @@
 from flask import Flask, request, jsonify
-from sqlalchemy import create_engine
-from sqlalchemy.orm import scoped_session, sessionmaker
 import logging
 import os
+from datetime import date
+from urllib.parse import urlencode
 from sqlalchemy.exc import IntegrityError
-from python_json_logger import JsonFormatter
+from pythonjsonlogger.json import JsonFormatter
+from prometheus_client import generate_latest, REGISTRY
+from common.db import Database, options_from_env
 from models import Base, Loan, Borrower
 from flasgger import Swagger
 from loan_manager import LoanManager
@@ -12,58 +14,47 @@ from borrower_manager import BorrowerManager
 # You might need to import modules for inter-service communication (e.g., requests)
 # if you need to fetch borrower details from the User Service.
 import requests
-import yaml # Import yaml for configuration loading (if still used)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO) # Set logging level
 
-try:
- with open(CONFIG_PATH, 'r') as f:
- config = yaml.safe_load(f)
-except FileNotFoundError:
- logger.error(f"Configuration file not found at {CONFIG_PATH}")
-except yaml.YAMLError as e:
- logger.error(f"Error parsing configuration file: {e}")
+# Configure logging with JsonFormatter
+logHandler = logging.StreamHandler()
+logHandler.setFormatter(JsonFormatter())
+logger.addHandler(logHandler)
 
 def get_config_from_consul(key):
- # Configure logging with JsonFormatter
- logHandler = logging.StreamHandler()
- formatter = JsonFormatter()
- logHandler.setFormatter(formatter)
- logger.addHandler(logHandler)
- # Simulate fetching configuration from Consul's K/V store
- # In a real application, you would use a Consul client library here
- # For now, we return hardcoded values or environment variables
- if key == 'database_url':
- return os.environ.get('DATABASE_URL', 'sqlite:////app/loan-service.db')
- elif key == 'user_service_url':
- return os.environ.get('USER_SERVICE_URL', 'http://user-service:5001')
- return None
+    # Simulate fetching configuration from Consul's K/V store
+    # In a real application, you would use a Consul client library here
+    # For now, we return hardcoded values or environment variables
+    if key == 'database_url':
+        return os.environ.get('DATABASE_URL', 'sqlite:////app/loan-service.db')
+    elif key == 'user_service_url':
+        return os.environ.get('USER_SERVICE_URL', 'http://user-service:5001')
+    return None
+
+DATABASE_URL = get_config_from_consul('database_url')
 
 app = Flask(__name__)
 swagger = Swagger(app) # Initialize Flasgger
-engine = create_engine(DATABASE_URL)
-Base.metadata.bind = engine
-
-db_session = scoped_session(sessionmaker(autocommit=False,
-                                         autoflush=False,
-                                         bind=engine))
-
-@app.teardown_request
-def remove_session(exception=None):
-    db_session.remove()
+db = Database(DATABASE_URL, name='loan-service', **options_from_env())
+db.init_app(app) # sessions are removed when each request ends
+engine = db.engine
+db_session = db.session
 
 def init_db():
     # import all modules here that define models so that
     from models import Base
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so add indexes introduced since
+    for index in Loan.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
 
 @app.route('/')
 def index():
     logger.info("Loan Service root endpoint accessed")
     return 'Loan Service Running'
 
-@app.route('/loans', methods=['GET'])
 @app.route('/health', methods=['GET'])
 def health_check():
     """
@@ -77,38 +68,135 @@ def health_check():
           type: object
           properties:
             status:
-              type: string"""
+              type: string
+    """
+    return jsonify({"status": "UP"}), 200
+
+# Prometheus metrics endpoint
+@app.route('/metrics')
+def metrics():
+    return generate_latest(REGISTRY).decode('utf-8'), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+LOAN_PAGE_SIZE = 100
+LOAN_PAGE_SIZE_MAX = 1000
+
+def _non_negative_int(value):
+    if value is None:
+        return None
+    number = int(value)
+    if number < 0:
+        raise ValueError(value)
+    return number
+
+def _optional(parse, value):
+    return None if value is None else parse(value)
+
+def _loan_to_dict(loan):
+    return {
+        'id': loan.id,
+        'amount': loan.amount,
+        'interest_rate': loan.interest_rate,
+        'term': loan.term,
+        'start_date': loan.start_date.isoformat() if loan.start_date else None,
+        'status': loan.status,
+        'borrower_id': loan.borrower_id
+    }
+
+@app.route('/loans', methods=['GET'])
 def get_all_loans():
     """
-    Get all loans.
-    This endpoint retrieves a list of all loans in the system.
+    List loans in id order, optionally filtered.
+    The filters run in the database, so callers fetch only the loans they need. With a limit or
+    cursor the loans come a page at a time: the next page starts after the cursor given in the
+    X-Next-Cursor and Link headers, and there is none on the last page. Without either, every
+    matching loan is returned at once, as before paging existed.
     ---
+    parameters:
+      - name: cursor
+        in: query
+        type: integer
+        required: false
+        description: Return loans after this one; taken from X-Next-Cursor.
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (at most 1000); 0 means the default of 100.
+      - name: status
+        in: query
+        type: string
+        required: false
+        description: Only loans with this status, e.g. active.
+      - name: borrower_id
+        in: query
+        type: integer
+        required: false
+        description: Only loans of this borrower.
+      - name: start_date_from
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Only loans starting on or after this date.
+      - name: start_date_to
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Only loans starting on or before this date.
+      - name: min_amount
+        in: query
+        type: number
+        required: false
+        description: Only loans of at least this amount.
+      - name: max_amount
+        in: query
+        type: number
+        required: false
+        description: Only loans of at most this amount.
     responses:
       200:
-        description: A list of loans.
+        description: The matching loans, or a page of them.
         schema:
           type: array
           items:
             $ref: '#/definitions/Loan'
+      400:
+        description: Invalid cursor, limit or filter.
       500:
         description: Internal server error.
     """
     logger.info("Loan Service: Get all loans endpoint accessed")
+    try:
+        cursor = _non_negative_int(request.args.get('cursor'))
+        limit = _non_negative_int(request.args.get('limit'))
+        borrower_id = _optional(int, request.args.get('borrower_id'))
+        start_date_from = _optional(date.fromisoformat, request.args.get('start_date_from'))
+        start_date_to = _optional(date.fromisoformat, request.args.get('start_date_to'))
+        min_amount = _optional(float, request.args.get('min_amount'))
+        max_amount = _optional(float, request.args.get('max_amount'))
+    except ValueError:
+        return jsonify({'message': 'cursor and limit must be non-negative integers, borrower_id an integer, '
+                                   'start dates YYYY-MM-DD and amounts numbers'}), 400
 
     loan_manager = LoanManager(db_session)
-    loans = loan_manager.get_all_loans()
-    # Convert Loan objects to dictionaries for JSON serialization
-    loans_data = [{
-
-        'id': loan.id,
-        'amount': loan.amount,
-        'interest_rate': loan.interest_rate,
-        'term': loan.term,
-        'start_date': loan.start_date.isoformat() if loan.start_date else None,
-        'status': loan.status,
-        'borrower_id': loan.borrower_id
-    } for loan in loans]
-    return jsonify(loans_data), 200
+    query = loan_manager.query_loans(after_id=cursor, status=request.args.get('status'), borrower_id=borrower_id,
+                                     start_date_from=start_date_from, start_date_to=start_date_to,
+                                     min_amount=min_amount, max_amount=max_amount)
+    if cursor is None and limit is None:
+        # Callers that predate paging expect the whole list
+        return jsonify([_loan_to_dict(loan) for loan in query]), 200
+    limit = min(limit or LOAN_PAGE_SIZE, LOAN_PAGE_SIZE_MAX)
+    loans = query.limit(limit + 1).all() # one extra row tells whether there is a next page
+    headers = {}
+    if len(loans) > limit:
+        loans = loans[:limit]
+        next_cursor = str(loans[-1].id)
+        args = {key: value for key, value in request.args.items() if key != 'cursor'}
+        args.update(cursor=next_cursor, limit=str(limit))
+        headers['X-Next-Cursor'] = next_cursor
+        headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return jsonify([_loan_to_dict(loan) for loan in loans]), 200, headers
 
 
 @app.route('/loans/<int:loan_id>', methods=['GET'])
@@ -136,16 +224,7 @@ def get_loan(loan_id):
     loan_manager = LoanManager(db_session)
     loan = loan_manager.get_loan(loan_id)
     if loan:
-        loan_data = {
-            'id': loan.id,
-            'amount': loan.amount,
-            'interest_rate': loan.interest_rate,
-            'term': loan.term,
-            'start_date': loan.start_date.isoformat() if loan.start_date else None,
-            'status': loan.status,
-            'borrower_id': loan.borrower_id
-        }
-        return jsonify(loan_data), 200
+        return jsonify(_loan_to_dict(loan)), 200
     return jsonify({'message': 'Loan not found'}), 404
 
 
@@ -178,7 +257,13 @@ def create_loan():
               description: The loan term in months.
             start_date:
               type: string
-              format: date"""
+              format: date
+    responses:
+      201:
+        description: Loan created.
+      400:
+        description: Invalid input.
+    """
     data = request.json
     if not data:
         return jsonify({'message': 'Invalid input'}), 400
@@ -205,7 +290,7 @@ def create_loan():
         return jsonify({'message': 'Loan created successfully', 'loan_id': loan.id}), 201
     except ValueError as e:
         logger.error(f"Error creating loan: {e}", exc_info=True)
-         return jsonify({'message': str(e)}), 400
+        return jsonify({'message': str(e)}), 400
     except IntegrityError:
         db_session.rollback()
         logger.error("Integrity error creating loan", exc_info=True)
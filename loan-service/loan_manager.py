@@ -3,7 +3,8 @@
 from datetime import date
 import os
 from sqlalchemy.orm import Session
-from .models import Loan, Borrower
+from models import Loan, Borrower
+from borrower_manager import BorrowerManager
 import requests # Import the requests library
 from tenacity import retry, stop_after_attempt, wait_exponential
 
@@ -37,11 +38,11 @@ class LoanManager:
                 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
                 def fetch_borrower_from_user_service(borrower_id):
                     response = requests.get(f'{USER_SERVICE_URL}/users/{borrower_id}', timeout=5) # Set a timeout
- return response
+                    return response
                 response = fetch_borrower_from_user_service(borrower_id)
                 response.raise_for_status() # Raise an exception for bad status codes
             except requests.exceptions.RequestException as e:
-            borrower = self.borrower_manager.create_borrower(borrower_data.get('name'), borrower_data.get('contact_info'), borrower_data.get('credit_score'))
+                borrower = self.borrower_manager.create_borrower(borrower_data.get('name'), borrower_data.get('contact_info'), borrower_data.get('credit_score'))
 
         new_loan = Loan(amount=amount, interest_rate=interest_rate, term=term, start_date=start_date, status="active", borrower=borrower)
 
@@ -65,4 +66,28 @@ class LoanManager:
 
     def get_all_loans(self):
         """Retrieves a list of all loans in the system."""
-        return self.db_session.query(Loan).all()
\ No newline at end of file
+        return self.db_session.query(Loan).all()
+
+    def query_loans(self, after_id=None, status=None, borrower_id=None, start_date_from=None, start_date_to=None,
+                    min_amount=None, max_amount=None):
+        """
+        Loans in id order, for keyset pagination: the rows after after_id that
+        match every filter given. Date and amount ranges include both ends.
+        Returns the query so the caller can limit it.
+        """
+        query = self.db_session.query(Loan).order_by(Loan.id)
+        if after_id is not None:
+            query = query.filter(Loan.id > after_id)
+        if status:
+            query = query.filter(Loan.status == status)
+        if borrower_id is not None:
+            query = query.filter(Loan.borrower_id == borrower_id)
+        if start_date_from is not None:
+            query = query.filter(Loan.start_date >= start_date_from)
+        if start_date_to is not None:
+            query = query.filter(Loan.start_date <= start_date_to)
+        if min_amount is not None:
+            query = query.filter(Loan.amount >= min_amount)
+        if max_amount is not None:
+            query = query.filter(Loan.amount <= max_amount)
+        return query
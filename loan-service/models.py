@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, Float, String, Date, ForeignKey, DateTime, Boolean
+from sqlalchemy import create_engine, Column, Integer, Float, String, Date, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -28,6 +28,14 @@ class Loan(Base):
 
     borrower = relationship("Borrower", back_populates="loans")
 
+    __table_args__ = (
+        # GET /loans filters; the id makes each one serve keyset pages in id order
+        Index('ix_loans_status_id', 'status', 'id'),
+        Index('ix_loans_borrower_id_id', 'borrower_id', 'id'),
+        Index('ix_loans_start_date', 'start_date'),
+        Index('ix_loans_amount', 'amount'),
+    )
+
 class User(Base):
     __tablename__ = 'users'
 
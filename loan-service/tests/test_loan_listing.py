@@ -0,0 +1,90 @@
+import importlib
+import sys
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from loan_service.models import Base, Borrower, Loan
+from loan_service.loan_manager import LoanManager
+
+
+@pytest.fixture
+def loan_manager():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Borrower(id=1, name='Ann'), Borrower(id=2, name='Ben')])
+    session.add_all([
+        Loan(id=1, amount=1000.0, interest_rate=0.1, term=12, start_date=date(2024, 1, 15), status='active', borrower_id=1),
+        Loan(id=2, amount=5000.0, interest_rate=0.1, term=24, start_date=date(2024, 3, 1), status='paid-off', borrower_id=2),
+        Loan(id=3, amount=2500.0, interest_rate=0.1, term=12, start_date=date(2024, 3, 31), status='active', borrower_id=2),
+        Loan(id=4, amount=750.0, interest_rate=0.1, term=6, start_date=date(2024, 6, 1), status='active', borrower_id=1),
+    ])
+    session.commit()
+    yield LoanManager(session)
+    session.close()
+
+def _ids(query):
+    return [loan.id for loan in query]
+
+def test_keyset_pages_follow_id_order(loan_manager):
+    """Test that each page of active loans starts right after the cursor of the previous one."""
+    first = loan_manager.query_loans(status='active').limit(2).all()
+    second = loan_manager.query_loans(after_id=first[-1].id, status='active').limit(2).all()
+
+    assert _ids(first) == [1, 3]
+    assert _ids(second) == [4]
+
+def test_filters_by_borrower_date_and_amount_ranges(loan_manager):
+    """Test that the borrower filter and the inclusive date and amount ranges combine."""
+    assert _ids(loan_manager.query_loans(borrower_id=2)) == [2, 3]
+    assert _ids(loan_manager.query_loans(start_date_from=date(2024, 3, 1), start_date_to=date(2024, 3, 31))) == [2, 3]
+    assert _ids(loan_manager.query_loans(min_amount=1000, max_amount=2500)) == [1, 3]
+    assert _ids(loan_manager.query_loans(status='active', borrower_id=1, max_amount=800)) == [4]
+
+def test_status_filter_uses_its_index(loan_manager):
+    """Test that filtering by status reads ix_loans_status_id instead of scanning the table."""
+    query = loan_manager.query_loans(after_id=1, status='active').limit(100)
+    statement = query.statement.compile(compile_kwargs={'literal_binds': True})
+    plan = loan_manager.db_session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}').all()
+    assert any('ix_loans_status_id' in row[-1] for row in plan)
+
+
+@pytest.fixture(scope='module')
+def loan_app(tmp_path_factory):
+    # app.py reads DATABASE_URL when it is imported, and imports its sibling modules by their top-level names;
+    # share those with the imports above so the models are mapped only once
+    patch = pytest.MonkeyPatch()
+    patch.setenv('DATABASE_URL', f"sqlite:///{tmp_path_factory.mktemp('db') / 'loans.db'}")
+    for name in ('models', 'loan_manager', 'borrower_manager'):
+        sys.modules.setdefault(name, importlib.import_module(f'loan_service.{name}'))
+    from loan_service import app as loan_app
+    yield loan_app
+    patch.undo()
+
+@pytest.fixture
+def client(loan_app, monkeypatch):
+    monkeypatch.setattr(loan_app, 'LOAN_PAGE_SIZE', 2)
+    Base.metadata.create_all(loan_app.engine)
+    loan_app.db_session.add(Borrower(id=1, name='Ann'))
+    loan_app.db_session.add_all([Loan(id=i, amount=100.0 * i, interest_rate=0.1, term=12, start_date=date(2024, 1, i),
+                                      status='active' if i % 2 else 'paid-off', borrower_id=1) for i in range(1, 6)])
+    loan_app.db_session.commit()
+    loan_app.db_session.remove()
+    yield loan_app.app.test_client()
+    Base.metadata.drop_all(loan_app.engine)
+
+def test_listing_without_limit_or_cursor_returns_every_loan(client):
+    """Test that callers that predate paging still get the whole filtered list and no paging headers."""
+    response = client.get('/loans')
+    assert [loan['id'] for loan in response.get_json()] == [1, 2, 3, 4, 5]
+    assert 'X-Next-Cursor' not in response.headers
+    assert [loan['id'] for loan in client.get('/loans?status=active').get_json()] == [1, 3, 5]
+
+def test_listing_with_a_limit_is_paged(client):
+    first = client.get('/loans?limit=0') # the default page size
+    assert [loan['id'] for loan in first.get_json()] == [1, 2]
+    second = client.get(f"/loans?limit=2&cursor={first.headers['X-Next-Cursor']}")
+    assert [loan['id'] for loan in second.get_json()] == [3, 4]
+    assert second.headers['Link'].endswith('rel="next"')
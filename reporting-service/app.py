@@ -1,12 +1,12 @@
 from flask import Flask, jsonify
-from reporting_manager import ReportingManager, LoanServiceError, CollectionServiceError
+from reporting_manager import ReportingManager
 import logging
 from flasgger import Swagger
 import os
 
 from python_json_logger import JsonFormatter
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
+from prometheus_client import generate_latest, REGISTRY
+from common.db import Database, options_from_env
 from sqlalchemy.ext.declarative import declarative_base
 
 def get_config_from_consul(key):
@@ -24,14 +24,16 @@ def get_config_from_consul(key):
 
 Base = declarative_base()
 
-# Database setup
-engine = create_engine(get_config_from_consul('database_url'))
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) # Use a default session if no db needed
-db_session = scoped_session(SessionLocal)
-
 app = Flask(__name__)
 Swagger(app) # Initialize Swagger
 
+# Database setup
+db = Database(get_config_from_consul('database_url'), name='reporting-service', **options_from_env())
+db.init_app(app) # sessions are removed when each request ends
+engine = db.engine
+SessionLocal = db.session_factory # Use a default session if no db needed
+db_session = db.session
+
 # Configure logging
 formatter = JsonFormatter('%(asctime)s %(name)s %(levelname)s %(message)s %(pathname)s %(lineno)d')
 logHandler = logging.StreamHandler()
@@ -77,7 +79,7 @@ def health_check():
         # attempt basic calls to Loan and Collection services.
         # ReportingManager.check_dependencies() # Example of calling a manager method for dependency checks
         return jsonify({"status": "UP"}), 200
-    except (LoanServiceError, CollectionServiceError, Exception) as e:
+    except Exception as e:
         logger.addHandler(logHandler)
         logger.error(f"Health check failed: {e}")
         return jsonify({"status": "DOWN", "error": str(e)}), 500
@@ -91,8 +93,12 @@ def get_active_loans_report():
       200:
         description: A list of active loans.
     """
-    return ReportingManager.get_active_loans_report()
+    return jsonify(ReportingManager().get_active_loans()), 200
 
+# Prometheus metrics endpoint
+@app.route('/metrics')
+def metrics():
+    return generate_latest(REGISTRY).decode('utf-8'), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 if __name__ == '__main__':
     app.run(debug=True, port=5004, host='0.0.0.0')
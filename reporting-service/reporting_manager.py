@@ -3,41 +3,45 @@ from tenacity import retry, stop_after_attempt, wait_exponential, RetryError
 
 # Replace with the actual URLs of your services
 LOAN_SERVICE_URL = 'http://loan-service:5002'
+LOAN_PAGE_SIZE = 1000 # the most GET /loans returns per request
 # COLLECTION_SERVICE_URL = 'http://collection-service:5003' # Uncomment if needed for reports
 
 class ReportingManager:
     def __init__(self):
         pass
 
-    def get_active_loans(self):
- """
- Retrieves a list of all active loans from the Loan Service with retry and timeout.
- """
- @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
- def _fetch_loans():
-            response = requests.get(f'{LOAN_SERVICE_URL}/loans', timeout=5) # Set a timeout
- response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
- return response.json()
+    def _fetch_loans(self, status):
+        """
+        Fetches every loan with this status from the Loan Service, following
+        its pages. The filter runs in the Loan Service's database, so only
+        matching loans cross the network.
+        """
+        @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+        def _fetch_page(cursor):
+            params = {'status': status, 'limit': LOAN_PAGE_SIZE}
+            if cursor is not None:
+                params['cursor'] = cursor
+            response = requests.get(f'{LOAN_SERVICE_URL}/loans', params=params, timeout=5) # Set a timeout
+            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+            return response.json(), response.headers.get('X-Next-Cursor')
 
- try:
- all_loans = _fetch_loans()
- return [loan for loan in all_loans if loan.get('status') == 'active']
- except RetryError as e:
- print(f"Failed to fetch loans after multiple retries: {e}")
- return [] # Return empty list or raise an exception
- except requests.exceptions.RequestException as e:
- print(f"Error fetching loans from Loan Service: {e}")
- return [] # Return empty list or raise an exception
+        loans = []
+        cursor = None
+        while True:
+            page, cursor = _fetch_page(cursor)
+            loans.extend(page)
+            if cursor is None:
+                return loans
 
-    def get_paid_off_loans(self):
- """
- Retrieves a list of all paid-off loans from the Loan Service with retry and timeout.
+    def get_active_loans(self):
+        """
+        Retrieves a list of all active loans from the Loan Service with retry and timeout.
         """
         try:
-            response = requests.get(f'{LOAN_SERVICE_URL}/loans')
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-            all_loans = response.json()
-            return [loan for loan in all_loans if loan.get('status') == 'active']
+            return self._fetch_loans('active')
+        except RetryError as e:
+            print(f"Failed to fetch loans after multiple retries: {e}")
+            return [] # Return empty list or raise an exception
         except requests.exceptions.RequestException as e:
             print(f"Error fetching loans from Loan Service: {e}")
             return [] # Return empty list or raise an exception
@@ -47,10 +51,10 @@ class ReportingManager:
         Retrieves a list of all paid-off loans.
         """
         try:
-            response = requests.get(f'{LOAN_SERVICE_URL}/loans')
-            response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-            all_loans = response.json()
-            return [loan for loan in all_loans if loan.get('status') == 'paid-off']
+            return self._fetch_loans('paid-off')
+        except RetryError as e:
+            print(f"Failed to fetch loans after multiple retries: {e}")
+            return [] # Return empty list or raise an exception
         except requests.exceptions.RequestException as e:
             print(f"Error fetching loans from Loan Service: {e}")
             return [] # Return empty list or raise an exception
@@ -1,20 +1,36 @@
-from flask import Flask, request, jsonify, g
-from sqlalchemy import create_engine
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 import logging
-from sqlalchemy.orm import sessionmaker, scoped_session
 from functools import wraps
 import os
+import sys
 import jwt
 from datetime import datetime, timedelta
 import yaml
-from python_json_logger import JsonFormatter
+from pythonjsonlogger.json import JsonFormatter
 from jwt.exceptions import InvalidSignatureError, ExpiredSignatureError, InvalidTokenError
 import os # Import os to potentially read from environment variables
 from uuid import uuid4
-
+from urllib.parse import urlencode
+import base64
+import hashlib
+import hmac
+import json
+import time
+import atexit
+import io
+import signal
+import threading
+
+from common.db import Database, options_from_env
 from models import Base, User, RefreshToken
 from flasgger import Swagger
 from user_manager import UserManager
+from token_cache import TokenCache
+from password_hasher import PasswordHasher, PasswordHasherBusy
+from refresh_token_writer import RefreshTokenWriter
+from token_compaction import RefreshTokenCompactor
+from bulk_import import BulkImporter, FORMATS, format_for, read_rows
+from common.permissions import PERMISSION_BITS, has_permission, permission_claims
 
 from prometheus_client import Counter, generate_latest, REGISTRY
 app = Flask(__name__)
@@ -29,7 +45,18 @@ def get_config_from_consul(key):
         "jwt_secret_key": os.environ.get("JWT_SECRET_KEY", "your-jwt-secret-key-fallback"),
         "refresh_token_secret_key": os.environ.get("REFRESH_TOKEN_SECRET_KEY", "your-refresh-token-secret-key-fallback"),
         "access_token_expiry": int(os.environ.get("ACCESS_TOKEN_EXPIRY", 15)), # in minutes
-        "refresh_token_expiry": int(os.environ.get("REFRESH_TOKEN_EXPIRY", 7)) # in days
+        "refresh_token_expiry": int(os.environ.get("REFRESH_TOKEN_EXPIRY", 7)), # in days
+        "gateway_claims_secret_key": os.environ.get("GATEWAY_CLAIMS_SECRET_KEY", ""), # empty: never trust gateway-verified claims
+        "token_cache_max_entries": int(os.environ.get("TOKEN_CACHE_MAX_ENTRIES", 10000)),
+        "password_hash_method": os.environ.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000"),
+        "password_hash_workers": int(os.environ.get("PASSWORD_HASH_WORKERS", os.cpu_count() or 1)),
+        "password_hash_max_pending": int(os.environ.get("PASSWORD_HASH_MAX_PENDING", 64)),
+        "refresh_token_write_behind": os.environ.get("REFRESH_TOKEN_WRITE_BEHIND", "false").lower() == "true",
+        "refresh_token_flush_interval": float(os.environ.get("REFRESH_TOKEN_FLUSH_INTERVAL", 0.05)), # in seconds
+        "refresh_token_compaction_interval": int(os.environ.get("REFRESH_TOKEN_COMPACTION_INTERVAL", 3600)), # in seconds, 0 disables
+        "refresh_token_compaction_batch_size": int(os.environ.get("REFRESH_TOKEN_COMPACTION_BATCH_SIZE", 1000)),
+        "bulk_import_workers": int(os.environ.get("BULK_IMPORT_WORKERS", max(1, (os.cpu_count() or 1) // 2))),
+        "bulk_import_batch_size": int(os.environ.get("BULK_IMPORT_BATCH_SIZE", 500))
     }
     value = config_values.get(key)
     if value is None:
@@ -47,7 +74,17 @@ try:
     app.config['refresh_token_secret_key'] = get_config_from_consul('refresh_token_secret_key')
     app.config['access_token_expiry'] = get_config_from_consul('access_token_expiry') # type: ignore
     app.config['refresh_token_expiry'] = get_config_from_consul('refresh_token_expiry') # type: ignore
-    exit(1) # Exit if config file is missing
+    app.config['gateway_claims_secret_key'] = get_config_from_consul('gateway_claims_secret_key')
+    app.config['token_cache_max_entries'] = get_config_from_consul('token_cache_max_entries')
+    app.config['password_hash_method'] = get_config_from_consul('password_hash_method')
+    app.config['password_hash_workers'] = get_config_from_consul('password_hash_workers')
+    app.config['password_hash_max_pending'] = get_config_from_consul('password_hash_max_pending')
+    app.config['refresh_token_write_behind'] = get_config_from_consul('refresh_token_write_behind')
+    app.config['refresh_token_flush_interval'] = get_config_from_consul('refresh_token_flush_interval')
+    app.config['refresh_token_compaction_interval'] = get_config_from_consul('refresh_token_compaction_interval')
+    app.config['refresh_token_compaction_batch_size'] = get_config_from_consul('refresh_token_compaction_batch_size')
+    app.config['bulk_import_workers'] = get_config_from_consul('bulk_import_workers')
+    app.config['bulk_import_batch_size'] = get_config_from_consul('bulk_import_batch_size')
 except yaml.YAMLError as e:
     print(f"Error parsing configuration file: {e}")
     exit(1) # Exit if config file is invalid
@@ -60,35 +97,101 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configure structured logging format
-json_formatter = JsonFormatter({"time": "%(asctime)s", "service": "user-service", "level": "%(levelname)s", "message": "%(message)s"})
+json_formatter = JsonFormatter('%(asctime)s %(levelname)s %(message)s', static_fields={"service": "user-service"})
 logging.getLogger().handlers[0].setFormatter(json_formatter)
 
 # Configure database (SQLite for simplicity)
 database_url = app.config.get('database_url')
-engine = create_engine(database_url)
+db = Database(database_url, name='user-service', **options_from_env())
+db.init_app(app)
+engine = db.engine
 
 # Create tables if they don't exist
 def init_db():
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so add indexes introduced since
+    for index in RefreshToken.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
 
 # Prometheus Metrics
 REQUEST_COUNT = Counter('user_service_requests_total', 'Total number of requests received by the User Service')
 
+# Verified access token claims, so repeated calls with the same token skip the HS256 check
+token_cache = TokenCache(max_entries=app.config['token_cache_max_entries'],
+                         revocation_ttl=app.config['access_token_expiry'] * 60)
+
+# Password hashing runs on worker processes so a login burst cannot starve the other endpoints
+password_hasher = PasswordHasher(method=app.config['password_hash_method'],
+                                 workers=app.config['password_hash_workers'],
+                                 max_pending=app.config['password_hash_max_pending'])
+
+# Bulk imports hash on their own pool, so logins are never queued behind a whole import batch
+import_password_hasher = PasswordHasher(method=app.config['password_hash_method'],
+                                        workers=app.config['bulk_import_workers'], max_pending=1)
+import_lock = threading.Lock() # one import at a time
+
+
+SessionLocal = db.session
+
+# In write-behind mode refresh tokens issued at login are queued and inserted in batches
+refresh_token_writer = None
+if app.config['refresh_token_write_behind']:
+    refresh_token_writer = RefreshTokenWriter(db.session_factory,
+                                              flush_interval=app.config['refresh_token_flush_interval'])
+    atexit.register(refresh_token_writer.close)
+    if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+        # Turn SIGTERM (docker stop) into a normal exit so the queued tokens are written
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+# Periodically deletes expired and revoked refresh tokens so the table does not only grow
+token_compactor = RefreshTokenCompactor(db.session_factory,
+                                        interval=app.config['refresh_token_compaction_interval'],
+                                        batch_size=app.config['refresh_token_compaction_batch_size'])
 
 @app.before_request
 def create_session():
-    g.db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))()
+    g.db_session = SessionLocal()
+
+@app.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    logger.warning("Password hashing queue is full, rejecting request")
+    return jsonify({'message': 'Service busy, please retry'}), 503, {'Retry-After': '1'}
 
-@app.teardown_request
-def remove_session(exception=None):
-    db_session = g.pop('db_session', None)
-    if db_session is not None:
-        db_session.remove()
+def trusted_gateway_claims():
+    """
+    Returns the token claims the API gateway already verified, or None when the
+    request carries no forwarded claims or their signature or expiry does not check out.
+    """
+    secret = app.config.get('gateway_claims_secret_key')
+    encoded = request.headers.get('X-Verified-Claims')
+    signature = request.headers.get('X-Verified-Claims-Signature')
+    if not secret or not encoded or not signature:
+        return None
+    expected = hmac.new(secret.encode('utf-8'), encoded.encode('ascii', 'replace'), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, signature):
+        logger.warning("Ignoring forwarded claims with an invalid signature")
+        return None
+    try:
+        claims = json.loads(base64.urlsafe_b64decode(encoded))
+    except ValueError:
+        return None
+    if claims.get('exp', 0) <= time.time():
+        return None
+    return claims
 
 def require_token(f):
+    """
+    Requires a valid access token and attaches its claims to g.current_user.
+    Claims forwarded and signed by the gateway take precedence; otherwise the
+    token is looked up in the verified-token cache and decoded on a miss.
+
+    Revocations (on update, revoke and delete) are kept per process: the worker
+    that handled the revocation rejects the user's older tokens at once, but
+    other gunicorn workers keep accepting a revoked token until it expires.
+    """
     @wraps(f)
     def decorated(*args, **kwargs):
-        logger.info("Checking for authentication token")
+        logger.debug("Checking for authentication token")
         token = None
         # JWTs are typically sent as a Bearer token in the Authorization header
         if 'Authorization' in request.headers:
@@ -101,19 +204,26 @@ def require_token(f):
             logger.warning("Authentication token missing")
             return jsonify({'message': 'Token is missing!'}), 401
 
+        # Behind the gateway the token has already been verified once
+        data = trusted_gateway_claims() or token_cache.get(token)
         try:
-            # Decode and verify the token
-            data = jwt.decode(token, app.config['jwt_secret_key'], algorithms=["HS256"])
-            logger.info(f"Token validated for user_id: {data.get('user_id')}")
+            if data is None:
+                # Decode and verify the token
+                data = jwt.decode(token, app.config['jwt_secret_key'], algorithms=["HS256"])
+                logger.debug(f"Token validated for user_id: {data.get('user_id')}")
+                if not token_cache.is_revoked(data):
+                    token_cache.put(token, data)
+            if token_cache.is_revoked(data):
+                return jsonify({'message': 'Token has been revoked'}), 401
             # Attach user data to the request context
-            g.current_user = data 
+            g.current_user = data
 
         except ExpiredSignatureError:
             return jsonify({'message': 'Token has expired'}), 401
         except InvalidSignatureError:
             return jsonify({'message': 'Token signature is invalid'}), 401
-        except InvalidTokenError:
- return jsonify({'message': 'Invalid token', 'error': str(e)}), 401
+        except InvalidTokenError as e:
+            return jsonify({'message': 'Invalid token', 'error': str(e)}), 401
         except Exception as e:
             return jsonify({'message': 'Token validation error', 'error': str(e)}), 401
 
@@ -122,17 +232,15 @@ def require_token(f):
     return decorated
 
 def require_permission(permission):
+    bit = PERMISSION_BITS.get(permission) # resolved once per endpoint, not per request
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
-            logger.info(f"Checking for permission: {permission}")
+            logger.debug(f"Checking for permission: {permission}")
             if not hasattr(g, 'current_user'):
                 return jsonify({'message': 'User not authenticated.'}), 401 # Should be caught by @require_token, but good practice
-            
-            user_permissions_str = g.current_user.get('permissions', '')
-            user_permissions = [p.strip() for p in user_permissions_str.split(',') if p.strip()]
 
-            if permission not in user_permissions:
+            if not has_permission(g.current_user, permission, bit):
                 logger.warning(f"User {g.current_user.get('username')} does not have permission: {permission}")
                 return jsonify({'message': 'Insufficient permissions'}), 403
 
@@ -179,6 +287,7 @@ def register_user():
               type: string
       400:
         description: Username or password missing.
+    """
     logger.info("Attempting to register a new user")
     REQUEST_COUNT.inc() # Increment request counter
     data = request.get_json()
@@ -191,12 +300,15 @@ def register_user():
         logger.warning("Registration failed: Username or password missing")
         return jsonify({'message': 'Username and password are required'}), 400
 
-    user_manager = UserManager(g.db_session)
+    user_manager = UserManager(g.db_session, password_hasher)
     try:
         user_manager.create_user(username, password, role, permissions)
         g.db_session.commit()
         logger.info(f"User '{username}' registered successfully")
         return jsonify({'message': 'User created successfully'}), 201
+    except PasswordHasherBusy:
+        g.db_session.rollback()
+        raise
     except Exception as e:
         g.db_session.rollback()
         logger.error(f"Error registering user '{username}': {e}", exc_info=True)
@@ -234,12 +346,13 @@ def login_user():
               type: string
       401:
         description: Invalid credentials.
+    """
     REQUEST_COUNT.inc() # Increment request counter
     data = request.get_json()
     username = data.get('username')
     password = data.get('password')
 
-    user_manager = UserManager(g.db_session)
+    user_manager = UserManager(g.db_session, password_hasher)
     user = user_manager.get_user_by_username(username)
     logger.info(f"Login attempt for username: {username}")
 
@@ -247,13 +360,14 @@ def login_user():
         # Generate access token (short-lived)
         logger.info(f"Credentials valid for user '{username}'. Generating tokens.")
 
-        access_token_expires = timedelta(minutes=15)
         access_token_expiry_minutes = app.config.get('access_token_expiry', 15)
+        access_token_expires = timedelta(minutes=access_token_expiry_minutes)
         access_token_claims = {
             'user_id': user.id,
             'username': user.username,
             'role': user.role,
-            'permissions': user.permissions,
+            **permission_claims(user.permissions),
+            'iat': datetime.utcnow(),
             'exp': datetime.utcnow() + access_token_expires
         }
         access_token = jwt.encode(access_token_claims, app.config['jwt_secret_key'], algorithm="HS256")
@@ -263,21 +377,25 @@ def login_user():
         refresh_token_jti = str(uuid4()) # Unique identifier for the refresh token
         refresh_token_expires_delta = timedelta(days=refresh_token_expiry_days)
         refresh_token_claims = {
-            'sub': user.id, # Subject (user ID)
+            'sub': str(user.id), # Subject (user ID); PyJWT requires a string
             'jti': refresh_token_jti,
-            'exp': datetime.utcnow() + refresh_token_expires
+            'exp': datetime.utcnow() + refresh_token_expires_delta
         }
- refresh_token = jwt.encode(refresh_token_claims, app.config['refresh_token_secret_key'], algorithm="HS256") # type: ignore
+        refresh_token = jwt.encode(refresh_token_claims, app.config['refresh_token_secret_key'], algorithm="HS256") # type: ignore
 
         # Store refresh token details in the database
-        new_refresh_token = RefreshToken(
-            user_id=user.id,
-            token=refresh_token_jti, # Store the JTI, not the whole token string
-            expires_at=datetime.utcnow() + refresh_token_expires_delta,
-            revoked=False
-        )
-        g.db_session.add(new_refresh_token)
-        g.db_session.commit()
+        if refresh_token_writer is not None:
+            g.db_session.commit() # a password rehash, if any
+            refresh_token_writer.add(user.id, refresh_token_jti, datetime.utcnow() + refresh_token_expires_delta)
+        else:
+            new_refresh_token = RefreshToken(
+                user_id=user.id,
+                token=refresh_token_jti, # Store the JTI, not the whole token string
+                expires_at=datetime.utcnow() + refresh_token_expires_delta,
+                revoked=False
+            )
+            g.db_session.add(new_refresh_token)
+            g.db_session.commit()
 
         logger.info(f"Tokens generated and refresh token stored for user '{username}'")
         return jsonify({'access_token': access_token, 'refresh_token': refresh_token}), 200
@@ -323,55 +441,176 @@ def refresh_token():
           properties:
             refresh_token:
               type: string
+    responses:
+      200:
+        description: A new access token.
+        schema:
+          type: object
+          properties:
+            access_token:
+              type: string
+      401:
+        description: Refresh token missing, invalid, expired or revoked.
+    """
+    REQUEST_COUNT.inc() # Increment request counter
+    data = request.get_json() or {}
+    token = data.get('refresh_token')
+    if not token:
+        return jsonify({'message': 'Refresh token is missing!'}), 401
 
-
+    try:
+        claims = jwt.decode(token, app.config['refresh_token_secret_key'], algorithms=["HS256"])
+    except ExpiredSignatureError:
+        return jsonify({'message': 'Refresh token has expired'}), 401
+    except InvalidTokenError as e:
+        return jsonify({'message': 'Invalid refresh token', 'error': str(e)}), 401
+
+    # A token issued moments ago may still be queued for the database
+    stored_token = refresh_token_writer.get(claims.get('jti')) if refresh_token_writer is not None else None
+    if stored_token is None:
+        row = g.db_session.query(RefreshToken).filter_by(token=claims.get('jti')).first()
+        if row is not None:
+            stored_token = {'user_id': row.user_id, 'expires_at': row.expires_at, 'revoked': row.revoked}
+    user = g.db_session.get(User, stored_token['user_id']) if stored_token is not None else None
+    if user is None or stored_token['revoked'] or stored_token['expires_at'] < datetime.utcnow():
+        logger.warning(f"Refresh rejected for user_id: {claims.get('sub')}")
+        return jsonify({'message': 'Refresh token is invalid or revoked'}), 401
+
+    access_token_expires = timedelta(minutes=app.config.get('access_token_expiry', 15))
+    access_token_claims = {
+        'user_id': user.id,
+        'username': user.username,
+        'role': user.role,
+        **permission_claims(user.permissions),
+        'iat': datetime.utcnow(),
+        'exp': datetime.utcnow() + access_token_expires
+    }
+    access_token = jwt.encode(access_token_claims, app.config['jwt_secret_key'], algorithm="HS256")
+    return jsonify({'access_token': access_token}), 200
 
 # User Management Endpoints
 
+USER_PAGE_SIZE = 100
+USER_PAGE_SIZE_MAX = 1000
+USER_STREAM_CHUNK_SIZE = 500
+
+def _non_negative_int(value):
+    if value is None:
+        return None
+    number = int(value)
+    if number < 0:
+        raise ValueError(value)
+    return number
+
+def _user_to_dict(user):
+    return {'id': user.id, 'username': user.username, 'role': user.role, 'permissions': user.permissions}
+
 # ... (Copy and adapt GET /users, GET /users/<user_id>, PUT /users/<user_id>, DELETE /users/<user_id> from original app.py) ...
 # Example endpoint for getting all users (requires token and permission)
 @app.route('/users', methods=['GET'])
 @require_token
 @require_permission('user:read') # Or 'user:manage' depending on your permission model
+def get_all_users():
     """
-    Get a list of all users. Requires authentication and 'user:read' permission.
+    List users in id order, a page at a time. Requires authentication and 'user:read' permission.
+    The next page starts after the cursor given in the X-Next-Cursor and Link headers; there is
+    none on the last page. With format=ndjson (or Accept: application/x-ndjson) every matching
+    user from the cursor on is streamed instead, one JSON object per line.
     ---
+    parameters:
+      - name: cursor
+        in: query
+        type: integer
+        required: false
+        description: Return users after this one; taken from X-Next-Cursor.
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        description: Page size (default 100, at most 1000). Ignored when streaming unless given.
+      - name: role
+        in: query
+        type: string
+        required: false
+        description: Only users with this role.
+      - name: permission
+        in: query
+        type: string
+        required: false
+        description: Only users holding this permission.
+      - name: format
+        in: query
+        type: string
+        enum: [json, ndjson]
+        required: false
     security:
       - Bearer: []
     responses:
       200:
-        description: A list of users.
+        description: A page of users, or the NDJSON stream.
         schema:
           type: array
           items:
             type: object
             properties:
               id:
-                type: string
+                type: integer
               username:
                 type: string
               role:
                 type: string
-@REQUEST_COUNT.inc() # Increment request counter
-def get_all_users():
-    user_manager = UserManager(g.db_session)
-    users = user_manager.get_all_users()
-    users_list = [{'id': user.id, 'username': user.username, 'role': user.role, 'permissions': user.permissions} for user in users]
-    return jsonify(users_list), 200
+              permissions:
+                type: string
+      400:
+        description: Invalid cursor or limit.
+    """
+    REQUEST_COUNT.inc() # Increment request counter
+    try:
+        cursor = _non_negative_int(request.args.get('cursor'))
+        limit = _non_negative_int(request.args.get('limit'))
+    except ValueError:
+        return jsonify({'message': 'cursor and limit must be non-negative integers'}), 400
+    user_manager = UserManager(g.db_session, password_hasher)
+    query = user_manager.query_users(after_id=cursor, role=request.args.get('role'),
+                                     permission=request.args.get('permission'))
+    query = query.with_entities(User.id, User.username, User.role, User.permissions)
+
+    if request.args.get('format') == 'ndjson' or request.accept_mimetypes.best == 'application/x-ndjson':
+        if limit is not None:
+            query = query.limit(limit)
+
+        def generate():
+            # yield_per fetches in chunks, so memory stays flat however many users there are
+            for row in query.yield_per(USER_STREAM_CHUNK_SIZE):
+                yield json.dumps(_user_to_dict(row)) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    limit = min(limit or USER_PAGE_SIZE, USER_PAGE_SIZE_MAX)
+    rows = query.limit(limit + 1).all() # one extra row tells whether there is a next page
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(rows[-1].id)
+        args = {key: value for key, value in request.args.items() if key != 'cursor'}
+        args.update(cursor=next_cursor, limit=str(limit))
+        headers['X-Next-Cursor'] = next_cursor
+        headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return jsonify([_user_to_dict(row) for row in rows]), 200, headers
 
 # Example endpoint for getting a specific user by ID (requires token and permission)
-@app.route('/users/<uuid:user_id>', methods=['GET'])
+@app.route('/users/<int:user_id>', methods=['GET'])
 @require_token
 @require_permission('user:read') # Or 'user:manage'
+def get_user(user_id):
     """
     Get a user by their ID. Requires authentication and 'user:read' permission.
     ---
     parameters:
       - name: user_id
         in: path
-        type: string
+        type: integer
         required: true
-        description: The UUID of the user to retrieve.
+        description: The ID of the user to retrieve.
     security:
       - Bearer: []
     responses:
@@ -382,41 +621,202 @@ def get_all_users():
           properties:
             id:
               type: string
-@REQUEST_COUNT.inc() # Increment request counter
-def get_user(user_id):
-    user_manager = UserManager(g.db_session)
-    user = user_manager.get_user_by_id(user_id)
+    """
+    REQUEST_COUNT.inc() # Increment request counter
+    user_manager = UserManager(g.db_session, password_hasher)
+    user = user_manager.get_user(user_id)
     if user:
         return jsonify({'id': user.id, 'username': user.username, 'role': user.role, 'permissions': user.permissions}), 200
     else:
         return jsonify({'message': 'User not found'}), 404
 
-# Add PUT and DELETE endpoints for user management as needed, applying @require_token and @require_permission('user:manage')
+@app.route('/users/<int:user_id>', methods=['PUT'])
+@require_token
+@require_permission('user:manage')
+def update_user(user_id):
+    """
+    Update a user's role, permissions or password. Requires authentication and 'user:manage' permission.
+    Tokens issued to the user before the update are revoked.
+    ---
+    parameters:
+      - name: user_id
+        in: path
+        type: integer
+        required: true
+        description: The ID of the user to update.
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          properties:
+            role:
+              type: string
+            permissions:
+              type: string
+            password:
+              type: string
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: The updated user.
+      404:
+        description: User not found.
+    """
+    REQUEST_COUNT.inc() # Increment request counter
+    data = request.get_json() or {}
+    updates = {key: data[key] for key in ('role', 'permissions', 'password') if key in data}
+    user_manager = UserManager(g.db_session, password_hasher)
+    user = user_manager.update_user(user_id, updates)
+    if not user:
+        return jsonify({'message': 'User not found'}), 404
+    token_cache.revoke_user(user_id)
+    logger.info(f"User {user_id} updated")
+    return jsonify({'id': user.id, 'username': user.username, 'role': user.role, 'permissions': user.permissions}), 200
 
-@app.route('/users/<uuid:user_id>', methods=['DELETE'])
+@app.route('/users/import', methods=['POST'])
+@require_token
+@require_permission('user:manage')
+def import_users():
+    """
+    Create users in bulk from a CSV or NDJSON body. Requires authentication and 'user:manage' permission.
+    Rows that cannot be imported are reported and do not stop the others.
+    ---
+    consumes:
+      - text/csv
+      - application/x-ndjson
+    parameters:
+      - name: format
+        in: query
+        type: string
+        enum: [csv, ndjson]
+        required: false
+        description: Defaults to the Content-Type, else csv.
+      - name: body
+        in: body
+        required: true
+        description: Rows with username, password and optionally role and permissions (comma-separated).
+        schema:
+          type: string
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Import summary with the rows that failed.
+        schema:
+          type: object
+          properties:
+            processed:
+              type: integer
+            imported:
+              type: integer
+            failed:
+              type: integer
+            errors:
+              type: array
+              items:
+                type: object
+            duration_seconds:
+              type: number
+            rows_per_second:
+              type: number
+      400:
+        description: Unknown format, or a body that is not UTF-8 or valid CSV (with the summary of the rows before it).
+      503:
+        description: Another import is running.
+    """
+    REQUEST_COUNT.inc() # Increment request counter
+    format = request.args.get('format') or format_for(content_type=request.content_type)
+    if format not in FORMATS:
+        return jsonify({'message': f"format must be one of {', '.join(FORMATS)}"}), 400
+    if not import_lock.acquire(blocking=False):
+        return jsonify({'message': 'Another import is running, please retry'}), 503, {'Retry-After': '5'}
+    try:
+        def progress(result):
+            logger.info(f"User import: {result.processed} rows, {result.imported} imported, "
+                        f"{len(result.errors)} failed, {result.rows_per_second:.0f} rows/s")
+        importer = BulkImporter(db.session_factory, import_password_hasher,
+                                batch_size=app.config['bulk_import_batch_size'], progress=progress)
+        lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        result = importer.run(read_rows(lines, format))
+    finally:
+        import_lock.release()
+    if result.error:
+        # Earlier batches are already committed: say which rows made it
+        logger.warning(f"User import stopped after {result.processed} rows: {result.error}")
+        return jsonify({'message': result.error, **result.to_dict()}), 400
+    logger.info(f"User import finished: {result.imported} imported, {len(result.errors)} failed in {result.duration:.1f}s")
+    return jsonify(result.to_dict()), 200
+
+@app.route('/users/<int:user_id>/revoke', methods=['POST'])
+@require_token
+@require_permission('user:manage')
+def revoke_user_tokens(user_id):
+    """
+    Revoke every access and refresh token issued to a user so far. Requires authentication and 'user:manage' permission.
+    ---
+    parameters:
+      - name: user_id
+        in: path
+        type: integer
+        required: true
+        description: The ID of the user whose tokens to revoke.
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Tokens revoked.
+      404:
+        description: User not found.
+    """
+    REQUEST_COUNT.inc() # Increment request counter
+    user_manager = UserManager(g.db_session, password_hasher)
+    if not user_manager.get_user(user_id):
+        return jsonify({'message': 'User not found'}), 404
+    if refresh_token_writer is not None:
+        refresh_token_writer.flush() # so queued tokens are revoked too
+    g.db_session.query(RefreshToken).filter_by(user_id=user_id, revoked=False).update({'revoked': True})
+    g.db_session.commit()
+    token_cache.revoke_user(user_id)
+    logger.info(f"Tokens revoked for user {user_id}")
+    return jsonify({'message': 'Tokens revoked'}), 200
+
+@app.route('/users/<int:user_id>', methods=['DELETE'])
 @require_token
 @require_permission('user:manage')
+def delete_user(user_id):
     """
     Delete a user by their ID. Requires authentication and 'user:manage' permission.
     ---
     parameters:
       - name: user_id
         in: path
-        type: string
+        type: integer
         required: true
-        description: The UUID of the user to delete.
+        description: The ID of the user to delete.
     security:
       - Bearer: []
     responses:
       200:
         description: User deleted successfully.
-@REQUEST_COUNT.inc() # Increment request counter
-def delete_user(user_id):
-    # Placeholder for delete logic
-    return jsonify({'message': f'User {user_id} would be deleted (delete not implemented)'}), 200
+      404:
+        description: User not found.
+    """
+    REQUEST_COUNT.inc() # Increment request counter
+    if refresh_token_writer is not None:
+        refresh_token_writer.flush() # so queued tokens are deleted with the user
+    user_manager = UserManager(g.db_session, password_hasher)
+    if not user_manager.delete_user(user_id):
+        return jsonify({'message': 'User not found'}), 404
+    token_cache.revoke_user(user_id)
+    logger.info(f"User {user_id} deleted")
+    return jsonify({'message': 'User deleted successfully'}), 200
     
 # Initialize the database
 init_db()
+if app.config['refresh_token_compaction_interval'] > 0:
+    token_compactor.start()
 
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
@@ -0,0 +1,114 @@
+"""
+Measures /login throughput of the user service with password hashing on the
+request thread (PASSWORD_HASH_WORKERS=0) and on the process pool.
+
+Each mode runs in its own process against a fresh SQLite database. A user is
+registered, then `--concurrency` threads log in until `--requests` logins
+have completed, while one more thread polls /health so the effect of a login
+storm on the other endpoints shows up as its latency.
+
+    python benchmarks/bench_login.py --requests 400 --concurrency 16 --method pbkdf2:sha256:600000
+
+With --write-behind both runs queue refresh tokens instead of committing
+one per login (REFRESH_TOKEN_WRITE_BEHIND=true).
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_mode(workers, args, results):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['PASSWORD_HASH_METHOD'] = args.method
+    os.environ['PASSWORD_HASH_WORKERS'] = str(workers)
+    os.environ['PASSWORD_HASH_MAX_PENDING'] = str(args.concurrency)
+    os.environ['REFRESH_TOKEN_WRITE_BEHIND'] = 'true' if args.write_behind else 'false'
+    sys.path.insert(0, SERVICE_DIR)
+    sys.path.insert(0, os.path.dirname(SERVICE_DIR)) # for common/
+    import logging
+    logging.disable(logging.WARNING)
+    import app
+
+    app.init_db()
+    client = app.app.test_client()
+    client.post('/register', json={'username': 'bench', 'password': 'bench-password'})
+
+    remaining = iter(range(args.requests))
+    lock = threading.Lock()
+    errors = 0
+    health_latencies = []
+    done = threading.Event()
+
+    def login_worker():
+        nonlocal errors
+        worker_client = app.app.test_client()
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            response = worker_client.post('/login', json={'username': 'bench', 'password': 'bench-password'})
+            if response.status_code != 200:
+                with lock:
+                    errors += 1
+
+    def health_worker():
+        health_client = app.app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            health_client.get('/health')
+            health_latencies.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    poller = threading.Thread(target=health_worker)
+    poller.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=login_worker) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    poller.join()
+    app.password_hasher.shutdown()
+
+    health_latencies.sort()
+    cores = min(workers, os.cpu_count() or 1) if workers else 1
+    throughput = args.requests / elapsed
+    results[workers] = {
+        'throughput': throughput,
+        'per_core': throughput / cores,
+        'health_p99': health_latencies[int(len(health_latencies) * 0.99) - 1] * 1000 if health_latencies else 0.0,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--method', default='pbkdf2:sha256:600000', help='werkzeug hash method to benchmark')
+    parser.add_argument('--write-behind', action='store_true', help='queue refresh tokens and write them in batches')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='pool size of the pooled run')
+    args = parser.parse_args()
+
+    results = multiprocessing.Manager().dict()
+    for workers in (0, args.workers):
+        process = multiprocessing.Process(target=run_mode, args=(workers, args, results))
+        process.start()
+        process.join()
+
+    for workers, name in ((0, 'request thread'), (args.workers, f'pool ({args.workers} procs)')):
+        result = results[workers]
+        print(f"{name:18} {result['throughput']:8.1f} logins/s  {result['per_core']:8.1f} logins/s/core  "
+              f"/health p99 {result['health_p99']:7.1f} ms  errors {result['errors']}")
+
+
+if __name__ == '__main__':
+    main()
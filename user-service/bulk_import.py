@@ -0,0 +1,252 @@
+"""
+Bulk import of users from CSV or NDJSON.
+
+Each row needs a username and a password and may carry a role (default
+'user') and permissions (comma-separated, or a list in NDJSON). Rows are
+imported in batches: the passwords of a batch are hashed across a process pool
+and the valid rows are inserted in one transaction. A row that cannot be
+imported is reported with its line number and does not stop the rest of its
+batch. Input that cannot be read at all (not UTF-8, broken CSV) stops the
+import there; the rows before it are still imported.
+
+The same importer backs POST /users/import and this CLI:
+
+    python bulk_import.py staff.csv
+    python bulk_import.py partners.ndjson --batch-size 1000 --workers 8
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+
+from prometheus_client import Counter
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from models import User
+
+logger = logging.getLogger(__name__)
+
+IMPORTED_USERS = Counter('user_service_bulk_import_rows_total', 'Rows processed by bulk user import', ['result'])
+
+FORMATS = ('csv', 'ndjson')
+
+
+class ImportResult:
+    def __init__(self):
+        self.processed = 0
+        self.imported = 0
+        self.errors = [] # {'line', 'username', 'error'}
+        self.error = None # why the import stopped before the end of the input
+        self.started = time.perf_counter()
+        self.duration = 0.0
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.duration or time.perf_counter() - self.started
+        return self.processed / elapsed if elapsed else 0.0
+
+    def to_dict(self):
+        summary = {
+            'processed': self.processed,
+            'imported': self.imported,
+            'failed': len(self.errors),
+            'errors': self.errors,
+            'duration_seconds': round(self.duration, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+        if self.error:
+            summary['error'] = self.error
+        return summary
+
+
+def format_for(filename=None, content_type=None):
+    """Guesses the import format from a file name or Content-Type, defaulting to CSV."""
+    if (filename or '').endswith(('.ndjson', '.jsonl')) or 'ndjson' in (content_type or ''):
+        return 'ndjson'
+    return 'csv'
+
+
+def read_rows(lines, format):
+    """Yields (line number, row dict or None, parse error or None) from an iterable of text lines."""
+    if format == 'ndjson':
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f'Invalid JSON: {e}'
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, 'Expected a JSON object'
+                continue
+            yield line_number, row, None
+    else:
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row, None
+
+
+class BulkImporter:
+    def __init__(self, session_factory, hasher, batch_size=500, progress=None):
+        self.session_factory = session_factory
+        self.hasher = hasher
+        self.batch_size = batch_size
+        self.progress = progress # called with the ImportResult after every batch
+
+    def run(self, rows):
+        result = ImportResult()
+        batch = []
+        try:
+            for line_number, row, error in rows:
+                if error:
+                    self._fail(result, line_number, None, error)
+                    continue
+                batch.append((line_number, row))
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch, result)
+                    batch = []
+        except UnicodeDecodeError as e:
+            result.error = f'Input is not UTF-8: {e}'
+        except csv.Error as e:
+            result.error = f'Invalid CSV: {e}'
+        if batch:
+            self._import_batch(batch, result)
+        result.errors.sort(key=lambda error: error['line'])
+        result.duration = time.perf_counter() - result.started
+        return result
+
+    def _fail(self, result, line_number, username, error):
+        result.processed += 1
+        result.errors.append({'line': line_number, 'username': username, 'error': error})
+        IMPORTED_USERS.labels(result='failed').inc()
+
+    def _import_batch(self, batch, result):
+        session = self.session_factory()
+        try:
+            valid = []
+            seen = set()
+            for line_number, row in batch:
+                username = row.get('username')
+                password = row.get('password')
+                if not isinstance(username, (str, type(None))) or not isinstance(password, (str, type(None))):
+                    self._fail(result, line_number, None, 'username and password must be strings')
+                    continue
+                username = (username or '').strip()
+                if not username or not password:
+                    self._fail(result, line_number, username or None, 'username and password are required')
+                    continue
+                if username in seen:
+                    self._fail(result, line_number, username, 'Duplicate username in import')
+                    continue
+                try:
+                    role = _role(row.get('role'))
+                    permissions = _permissions(row.get('permissions'))
+                except ValueError as e:
+                    self._fail(result, line_number, username, str(e))
+                    continue
+                seen.add(username)
+                valid.append((line_number, username, password, role, permissions))
+
+            existing = {name for (name,) in session.query(User.username).filter(User.username.in_(seen))} if seen else set()
+            for line_number, username, *_ in valid:
+                if username in existing:
+                    self._fail(result, line_number, username, 'Username already exists')
+            valid = [entry for entry in valid if entry[1] not in existing]
+
+            hashes = self.hasher.hash_many(password for _, _, password, _, _ in valid)
+            records = [(line_number, {'username': username, 'password': hashed, 'role': role, 'permissions': permissions})
+                       for (line_number, username, _, role, permissions), hashed in zip(valid, hashes)]
+            self._insert(session, records, result)
+        finally:
+            session.close()
+        if self.progress:
+            self.progress(result)
+
+    def _insert(self, session, records, result):
+        if not records:
+            return
+        try:
+            session.execute(insert(User), [values for _, values in records])
+            session.commit()
+            result.processed += len(records)
+            result.imported += len(records)
+            IMPORTED_USERS.labels(result='imported').inc(len(records))
+            return
+        except IntegrityError:
+            session.rollback()
+        # Someone else created one of these users meanwhile: find out which, row by row
+        for line_number, values in records:
+            try:
+                with session.begin_nested():
+                    session.execute(insert(User), [values])
+                result.processed += 1
+                result.imported += 1
+                IMPORTED_USERS.labels(result='imported').inc()
+            except IntegrityError as e:
+                self._fail(result, line_number, values['username'], f'Could not insert: {e.orig}')
+        session.commit()
+
+
+def _role(value):
+    if value is not None and not isinstance(value, str):
+        raise ValueError('role must be a string')
+    return (value or '').strip() or 'user'
+
+
+def _permissions(value):
+    if isinstance(value, list):
+        if not all(isinstance(permission, str) for permission in value):
+            raise ValueError('permissions must be strings')
+        return ','.join(permission.strip() for permission in value)
+    if value is not None and not isinstance(value, str):
+        raise ValueError('permissions must be a comma-separated string or a list of strings')
+    return (value or '').strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('file', help='CSV or NDJSON file, or - for stdin')
+    parser.add_argument('--format', choices=FORMATS, help='default: from the file extension, else csv')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='hashing processes')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL', 'sqlite:///./user-service.db'))
+    parser.add_argument('--hash-method', default=os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000'))
+    args = parser.parse_args()
+
+    from common.db import Database, options_from_env
+    from models import Base
+    from password_hasher import PasswordHasher
+
+    db = Database(args.database_url, name='bulk-import', **options_from_env())
+    Base.metadata.create_all(bind=db.engine)
+    hasher = PasswordHasher(method=args.hash_method, workers=args.workers)
+
+    def progress(result):
+        print(f'\r{result.processed} rows, {result.imported} imported, {len(result.errors)} failed, '
+              f'{result.rows_per_second:.0f} rows/s', end='', file=sys.stderr, flush=True)
+
+    format = args.format or format_for(args.file)
+    source = sys.stdin if args.file == '-' else open(args.file, newline='', encoding='utf-8')
+    try:
+        importer = BulkImporter(db.session_factory, hasher, batch_size=args.batch_size, progress=progress)
+        result = importer.run(read_rows(source, format))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        hasher.shutdown()
+    print(file=sys.stderr)
+    for error in result.errors:
+        print(f"line {error['line']}: {error['username'] or '-'}: {error['error']}", file=sys.stderr)
+    if result.error:
+        print(f'stopped: {result.error}', file=sys.stderr)
+    print(json.dumps({key: value for key, value in result.to_dict().items() if key != 'errors'}))
+    return 1 if result.errors or result.error else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+
+from prometheus_client import Counter, Gauge, Histogram
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+PASSWORD_HASH_DURATION = Histogram('user_service_password_hash_seconds',
+                                   'Time spent hashing or verifying a password, queueing included', ['operation'])
+PASSWORD_HASH_QUEUE_DEPTH = Gauge('user_service_password_hash_queue_depth', 'Password hashing jobs queued or running')
+PASSWORD_HASH_REJECTED = Counter('user_service_password_hash_rejected_total',
+                                 'Password hashing jobs rejected because the queue was full')
+PASSWORD_REHASHES = Counter('user_service_password_rehashes_total',
+                            'Stored password hashes upgraded to the current method on login')
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full; callers should answer 503."""
+
+
+def canonical_method(method):
+    """
+    Spells out a werkzeug hash method with its defaults filled in, the way it
+    is written in front of the salt of a stored hash ('pbkdf2' becomes
+    'pbkdf2:sha256:<iterations>').
+    """
+    name, *args = method.split(':')
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = args[1] if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    if name == 'scrypt':
+        n, r, p = (args + [2 ** 15, 8, 1][len(args):])[:3]
+        return f'scrypt:{n}:{r}:{p}'
+    return method
+
+
+# Module level so that they can be sent to the worker processes
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+def _verify(hashed, password):
+    return check_password_hash(hashed, password)
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords on a pool of worker processes, so that a
+    burst of logins does not hold the GIL away from every other request.
+
+    At most max_pending jobs may be queued or running; beyond that
+    PasswordHasherBusy is raised straight away instead of letting requests
+    pile up behind the pool. With workers=0 the work runs on the calling
+    thread.
+    """
+
+    def __init__(self, method='pbkdf2:sha256:600000', workers=None, max_pending=64):
+        self.method = canonical_method(method)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @contextmanager
+    def _slot(self, operation):
+        """Reserves a place in the queue and yields the pool to run on."""
+        started = time.perf_counter()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                PASSWORD_HASH_REJECTED.inc()
+                raise PasswordHasherBusy('Password hashing queue is full')
+            self._pending += 1
+            if self._executor is None: # started lazily so importing the app does not fork
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            executor = self._executor
+        PASSWORD_HASH_QUEUE_DEPTH.inc()
+        try:
+            yield executor
+        finally:
+            with self._lock:
+                self._pending -= 1
+            PASSWORD_HASH_QUEUE_DEPTH.dec()
+            PASSWORD_HASH_DURATION.labels(operation=operation).observe(time.perf_counter() - started)
+
+    def _run(self, operation, fn, *args):
+        if not self.workers:
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                PASSWORD_HASH_DURATION.labels(operation=operation).observe(time.perf_counter() - started)
+        with self._slot(operation) as executor:
+            return executor.submit(fn, *args).result()
+
+    def hash(self, password):
+        return self._run('hash', _hash, password, self.method)
+
+    def hash_many(self, passwords):
+        """Hashes a batch of passwords spread over every worker; the batch takes one place in the queue."""
+        passwords = list(passwords)
+        if not self.workers or len(passwords) < 2:
+            return [self.hash(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.workers * 4))
+        with self._slot('hash_many') as executor:
+            return list(executor.map(_hash, passwords, repeat(self.method), chunksize=chunksize))
+
+    def verify(self, hashed, password):
+        return self._run('verify', _verify, hashed, password)
+
+    def verify_and_update(self, hashed, password):
+        """
+        Verifies a password and returns (valid, new hash or None). The new hash
+        is only made when the stored one uses other parameters, and is skipped
+        when the queue is full; the login still succeeds and the hash is
+        upgraded on a later one.
+        """
+        if not self.verify(hashed, password):
+            return False, None
+        if not self.needs_rehash(hashed):
+            return True, None
+        try:
+            new_hash = self.hash(password)
+        except PasswordHasherBusy:
+            return True, None
+        PASSWORD_REHASHES.inc()
+        return True, new_hash
+
+    def needs_rehash(self, hashed):
+        """True if a stored hash was made with a method other than the current one."""
+        return hashed.split('$', 1)[0] != self.method
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
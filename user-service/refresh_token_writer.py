@@ -0,0 +1,113 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKEN_PENDING = Gauge('user_service_refresh_tokens_pending', 'Refresh tokens issued but not yet written to the database')
+REFRESH_TOKEN_FLUSH_SIZE = Histogram('user_service_refresh_token_flush_size', 'Refresh tokens written per transaction',
+                                     buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000))
+REFRESH_TOKEN_FLUSH_ERRORS = Counter('user_service_refresh_token_flush_errors_total', 'Refresh token flushes that failed and were retried')
+
+
+class RefreshTokenWriter:
+    """
+    Write-behind store for refresh tokens issued at login.
+
+    add() only queues the row; a background thread inserts everything queued
+    every flush_interval seconds (or as soon as max_batch rows are waiting) in
+    a single transaction, so logins no longer wait for a commit each. get()
+    answers for rows that are still queued or being written, so /refresh sees
+    a token straight after the login that issued it.
+
+    A row only leaves the queue once its transaction committed; a failed flush
+    is retried on the next one. close() writes whatever is left and must run
+    on shutdown, otherwise tokens issued in the last interval are lost.
+    """
+
+    def __init__(self, session_factory, flush_interval=0.05, max_batch=500):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending = OrderedDict() # jti -> row
+        self._flushing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def add(self, user_id, token, expires_at):
+        row = {'user_id': user_id, 'token': token, 'expires_at': expires_at, 'revoked': False}
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('RefreshTokenWriter is closed')
+            self._pending[token] = row
+            REFRESH_TOKEN_PENDING.inc()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='refresh-token-writer', daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.max_batch:
+                self._wakeup.set()
+
+    def get(self, token):
+        """A copy of the queued row for a token id, or None once it is in the database (or unknown)."""
+        with self._lock:
+            row = self._pending.get(token) or self._flushing.get(token)
+            return dict(row) if row is not None else None
+
+    def flush(self):
+        """
+        Writes everything queued so far and returns once it is committed.
+        Call it before changing a user's refresh tokens in the database so the
+        change also covers tokens that were still queued.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._flushing, self._pending = self._pending, OrderedDict()
+                rows = list(self._flushing.values())
+            session = self.session_factory()
+            try:
+                session.execute(RefreshToken.__table__.insert(), rows)
+                session.commit()
+            except Exception:
+                session.rollback()
+                REFRESH_TOKEN_FLUSH_ERRORS.inc()
+                with self._lock:
+                    # Put them back in front of anything queued meanwhile
+                    self._flushing.update(self._pending)
+                    self._pending, self._flushing = OrderedDict(self._flushing), {}
+                raise
+            finally:
+                session.close()
+            with self._lock:
+                self._flushing = {}
+            REFRESH_TOKEN_PENDING.dec(len(rows))
+            REFRESH_TOKEN_FLUSH_SIZE.observe(len(rows))
+            return len(rows)
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing refresh tokens, will retry: {e}", exc_info=True)
+                time.sleep(self.flush_interval)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        self._wakeup.set()
+        if thread is not None:
+            thread.join()
+        self.flush()
@@ -0,0 +1,83 @@
+import io
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from user_service.bulk_import import BulkImporter, read_rows
+from user_service.models import Base, User
+from user_service.password_hasher import PasswordHasher
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def importer(session_factory):
+    return BulkImporter(session_factory, PasswordHasher(method='pbkdf2:sha256:1000', workers=0), batch_size=2)
+
+def test_csv_import_reports_bad_rows_without_aborting_the_batch(session_factory, importer):
+    """Test that invalid and duplicate rows fail on their own while the rest are inserted."""
+    session = session_factory()
+    session.add(User(username='taken', password='x', role='user'))
+    session.commit()
+    csv_body = io.StringIO('username,password,role,permissions\n'
+                           'ann,pw,admin,"user:read,user:manage"\n'
+                           'taken,pw,user,\n'
+                           ',pw,user,\n'
+                           'ann,pw,user,\n'
+                           'ben,pw,,\n')
+
+    result = importer.run(read_rows(csv_body, 'csv'))
+
+    assert (result.processed, result.imported) == (5, 2)
+    assert [(error['line'], error['username']) for error in result.errors] == [(3, 'taken'), (4, None), (5, 'ann')]
+    users = {user.username: user for user in session.query(User)}
+    assert users['ann'].permissions == 'user:read,user:manage' and users['ann'].role == 'admin'
+    assert users['ben'].role == 'user' and users['ben'].password.startswith('pbkdf2:sha256:1000$')
+    session.close()
+
+def test_ndjson_parse_errors_are_reported_per_line(importer):
+    """Test that malformed NDJSON lines are reported with their line numbers."""
+    lines = ['{"username": "cat", "password": "pw", "permissions": ["loan:read"]}\n', '{oops\n', '\n', '"text"\n']
+
+    result = importer.run(read_rows(lines, 'ndjson'))
+
+    assert result.imported == 1
+    assert [error['line'] for error in result.errors] == [2, 4]
+
+def test_rows_with_a_bad_role_or_permissions_fail_on_their_own(session_factory, importer):
+    """Test that NDJSON values of the wrong type are per-row errors, not a failed batch."""
+    lines = ['{"username": "ann", "password": "pw", "permissions": [1]}\n',
+             '{"username": "ben", "password": "pw", "role": "admin", "permissions": ["loan:read", "loan:write"]}\n',
+             '{"username": "cat", "password": "pw", "role": 5}\n',
+             '{"username": "dan", "password": "pw", "permissions": {"loan:read": true}}\n',
+             '{"username": ["eve"], "password": "pw"}\n']
+
+    result = importer.run(read_rows(lines, 'ndjson'))
+
+    assert (result.processed, result.imported) == (5, 1)
+    assert [(error['line'], error['username']) for error in result.errors] == [(1, 'ann'), (3, 'cat'), (4, 'dan'), (5, None)]
+    session = session_factory()
+    assert [(user.username, user.role, user.permissions) for user in session.query(User)] == [('ben', 'admin', 'loan:read,loan:write')]
+    session.close()
+
+def test_undecodable_input_stops_the_import_but_keeps_the_rows_before_it(session_factory, importer):
+    """Test that a decoding error partway through is reported with the rows already imported."""
+    def lines():
+        yield 'username,password\n'
+        for name in ('ann', 'ben', 'cat'):
+            yield f'{name},pw\n'
+        raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+
+    result = importer.run(read_rows(lines(), 'csv'))
+
+    assert (result.processed, result.imported) == (3, 3)
+    assert result.error.startswith('Input is not UTF-8')
+    assert result.to_dict()['error'] == result.error
+    session = session_factory()
+    assert session.query(User).count() == 3
+    session.close()
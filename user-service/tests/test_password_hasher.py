@@ -0,0 +1,52 @@
+import pytest
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS
+from user_service.password_hasher import PasswordHasher, PasswordHasherBusy, canonical_method
+
+FAST = 'pbkdf2:sha256:1000'
+
+
+def test_hash_and_verify_on_worker_processes():
+    """Test that hashing and verification round-trip through the process pool."""
+    hasher = PasswordHasher(method=FAST, workers=1)
+    try:
+        hashed = hasher.hash('secret')
+        assert hashed.startswith(FAST + '$')
+        assert hasher.verify(hashed, 'secret')
+        assert not hasher.verify(hashed, 'wrong')
+    finally:
+        hasher.shutdown()
+
+def test_hash_many_spreads_a_batch_over_the_pool():
+    """Test that a batch of passwords is hashed in order on the pool."""
+    hasher = PasswordHasher(method=FAST, workers=2, max_pending=1)
+    try:
+        hashes = hasher.hash_many(f'secret-{i}' for i in range(10))
+        assert all(hasher.verify(hashed, f'secret-{i}') for i, hashed in enumerate(hashes))
+    finally:
+        hasher.shutdown()
+
+def test_full_queue_is_rejected():
+    """Test that a job beyond max_pending fails fast instead of queueing."""
+    hasher = PasswordHasher(method=FAST, workers=1, max_pending=0)
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash('secret')
+    assert hasher._executor is None
+
+def test_hashes_made_with_other_parameters_need_a_rehash():
+    """Test that changing the configured cost marks existing hashes for upgrade."""
+    old = PasswordHasher(method=FAST, workers=0)
+    new = PasswordHasher(method='pbkdf2:sha256:2000', workers=0)
+    hashed = old.hash('secret')
+
+    assert not old.needs_rehash(hashed)
+    assert new.needs_rehash(hashed)
+    assert new.verify(hashed, 'secret') # old hashes keep working until upgraded
+
+@pytest.mark.parametrize('method, expected', [
+    ('pbkdf2', f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'),
+    ('pbkdf2:sha512', f'pbkdf2:sha512:{DEFAULT_PBKDF2_ITERATIONS}'),
+    ('pbkdf2:sha256:600000', 'pbkdf2:sha256:600000'),
+    ('scrypt', 'scrypt:32768:8:1'),
+])
+def test_canonical_method(method, expected):
+    assert canonical_method(method) == expected
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from user_service.models import Base, RefreshToken
+from user_service.refresh_token_writer import RefreshTokenWriter
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tokens.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+def _count(session_factory):
+    session = session_factory()
+    try:
+        return session.query(RefreshToken).count()
+    finally:
+        session.close()
+
+def test_queued_tokens_are_visible_before_they_are_written(session_factory):
+    """Test that get() answers for a token that is still queued."""
+    writer = RefreshTokenWriter(session_factory, flush_interval=60)
+    expires_at = datetime.utcnow() + timedelta(days=1)
+    writer.add(1, 'jti-1', expires_at)
+
+    assert writer.get('jti-1') == {'user_id': 1, 'token': 'jti-1', 'expires_at': expires_at, 'revoked': False}
+    assert _count(session_factory) == 0
+
+    assert writer.flush() == 1
+    assert writer.get('jti-1') is None
+    assert _count(session_factory) == 1
+    writer.close()
+
+def test_close_writes_everything_queued(session_factory):
+    """Test that shutdown is durable."""
+    writer = RefreshTokenWriter(session_factory, flush_interval=60)
+    for i in range(10):
+        writer.add(1, f'jti-{i}', datetime.utcnow() + timedelta(days=1))
+    writer.close()
+
+    assert _count(session_factory) == 10
+    with pytest.raises(RuntimeError):
+        writer.add(1, 'jti-late', datetime.utcnow())
+
+def test_failed_flush_keeps_the_rows_queued(session_factory):
+    """Test that rows are only dropped from the queue once committed."""
+    writer = RefreshTokenWriter(session_factory, flush_interval=60)
+    writer.add(1, 'jti-1', None) # expires_at is NOT NULL
+
+    with pytest.raises(Exception):
+        writer.flush()
+    assert writer.get('jti-1') is not None
+
+    writer._pending['jti-1']['expires_at'] = datetime.utcnow()
+    assert writer.flush() == 1
+    writer.close()
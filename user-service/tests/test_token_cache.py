@@ -0,0 +1,64 @@
+import time
+
+from user_service.token_cache import TokenCache
+
+
+def _claims(user_id, ttl=60, iat=None):
+    now = time.time()
+    return {'user_id': user_id, 'iat': now if iat is None else iat, 'exp': now + ttl}
+
+def test_verified_claims_are_returned_until_expiry():
+    """Test that cached claims are served until the token's exp."""
+    cache = TokenCache()
+    claims = _claims(1)
+    cache.put('token-a', claims)
+
+    assert cache.get('token-a') is claims
+    assert cache.get('token-b') is None
+
+    cache.put('token-c', _claims(1, ttl=-1))
+    assert cache.get('token-c') is None
+
+def test_cache_is_bounded():
+    """Test that the least recently used tokens are evicted first."""
+    cache = TokenCache(max_entries=2)
+    cache.put('token-a', _claims(1))
+    cache.put('token-b', _claims(2))
+    cache.get('token-a')
+    cache.put('token-c', _claims(3))
+
+    assert len(cache) == 2
+    assert cache.get('token-b') is None
+    assert cache.get('token-a') is not None
+
+def test_revoking_a_user_drops_and_rejects_earlier_tokens():
+    """Test that revocation covers tokens issued before it, however they were verified."""
+    cache = TokenCache()
+    old = _claims(1, iat=time.time() - 10)
+    cache.put('token-a', old)
+    cache.revoke_user(1)
+
+    assert cache.get('token-a') is None
+    assert cache.is_revoked(old)
+    assert cache.is_revoked({'user_id': 1, 'exp': time.time() + 60}) # no iat: treated as old
+    assert not cache.is_revoked(_claims(1, iat=time.time() + 1))
+    assert not cache.is_revoked(_claims(2))
+
+def test_token_issued_in_the_second_of_a_revocation_is_accepted():
+    """Test that a login right after a revocation is not rejected because iat has whole seconds only."""
+    cache = TokenCache()
+    cache.revoke_user(1)
+    revoked_at = cache._revoked[1]
+    # login and refresh set iat from datetime.utcnow(), which JWT encoding truncates to the second
+    assert not cache.is_revoked(_claims(1, iat=int(revoked_at)))
+    assert cache.is_revoked(_claims(1, iat=int(revoked_at) - 1))
+
+def test_revocations_expire_with_the_longest_token_lifetime():
+    """Test that revocations are forgotten once no token they cover can still be valid."""
+    cache = TokenCache(revocation_ttl=60)
+    cache.revoke_user(1)
+    cache._revoked[1] -= 120
+    cache.revoke_user(2)
+
+    assert 1 not in cache._revoked
+    assert 2 in cache._revoked
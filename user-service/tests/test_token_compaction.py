@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from user_service.models import Base, RefreshToken
+from user_service.token_compaction import RefreshTokenCompactor
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'tokens.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+def _add_tokens(session_factory, count, expires_in, revoked=False, prefix='t'):
+    session = session_factory()
+    session.add_all(RefreshToken(user_id=1, token=f'{prefix}-{i}', expires_at=datetime.utcnow() + expires_in, revoked=revoked)
+                    for i in range(count))
+    session.commit()
+    session.close()
+
+def _remaining(session_factory):
+    session = session_factory()
+    try:
+        return sorted(token for (token,) in session.query(RefreshToken.token))
+    finally:
+        session.close()
+
+def test_expired_and_revoked_tokens_are_purged_in_batches(session_factory):
+    """Test that only live tokens survive, however many batches it takes."""
+    _add_tokens(session_factory, 7, timedelta(days=-1), prefix='expired')
+    _add_tokens(session_factory, 5, timedelta(days=1), revoked=True, prefix='revoked')
+    _add_tokens(session_factory, 3, timedelta(days=1), prefix='live')
+
+    compactor = RefreshTokenCompactor(session_factory, batch_size=2, pause=0)
+    assert compactor.run_once() == 12
+    assert _remaining(session_factory) == ['live-0', 'live-1', 'live-2']
+    assert compactor.run_once() == 0
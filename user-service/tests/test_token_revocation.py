@@ -0,0 +1,106 @@
+import base64
+import hashlib
+import hmac
+import importlib
+import json
+import sys
+import time
+
+import jwt
+import pytest
+from common.permissions import permission_claims
+
+
+@pytest.fixture(scope='module')
+def user_app(tmp_path_factory):
+    # app.py reads its configuration when it is imported, and imports its sibling modules by their
+    # top-level names; point those at the package-qualified modules so each is loaded (and its metrics
+    # registered) only once
+    patch = pytest.MonkeyPatch()
+    patch.setenv('DATABASE_URL', f"sqlite:///{tmp_path_factory.mktemp('db') / 'users.db'}")
+    patch.setenv('PASSWORD_HASH_WORKERS', '0')
+    patch.setenv('BULK_IMPORT_WORKERS', '0')
+    patch.setenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    patch.setenv('REFRESH_TOKEN_COMPACTION_INTERVAL', '0')
+    for name in ('models', 'user_manager', 'token_cache', 'password_hasher', 'refresh_token_writer',
+                 'token_compaction', 'bulk_import'):
+        sys.modules.setdefault(name, importlib.import_module(f'user_service.{name}'))
+    from user_service import app as user_app
+    yield user_app
+    patch.undo()
+
+@pytest.fixture
+def client(user_app, monkeypatch):
+    from user_service.models import Base, User
+    monkeypatch.setattr(user_app, 'token_cache', type(user_app.token_cache)())
+    Base.metadata.drop_all(user_app.engine)
+    user_app.init_db()
+    session = user_app.db.session_factory()
+    session.add_all([User(id=1, username='admin', password='x', role='admin', permissions='user:read,user:manage'),
+                     User(id=2, username='bob', password='x', role='user', permissions='user:read'),
+                     User(id=3, username='carol', password='x', role='user', permissions='')])
+    session.commit()
+    session.close()
+    return user_app.app.test_client()
+
+def _token(user_app, user_id, permissions, issued_ago=10):
+    """An access token for user_id, issued issued_ago seconds ago so a revocation now covers it."""
+    now = int(time.time())
+    claims = {'user_id': user_id, 'username': f'user{user_id}', 'role': 'user', **permission_claims(permissions),
+              'iat': now - issued_ago, 'exp': now + 600}
+    return jwt.encode(claims, user_app.app.config['jwt_secret_key'], algorithm='HS256')
+
+def _auth(token, **headers):
+    return {'Authorization': f'Bearer {token}', **headers}
+
+def test_cached_token_is_rejected_after_the_user_is_revoked(client, user_app):
+    admin = _token(user_app, 1, 'user:read,user:manage')
+    bob = _token(user_app, 2, 'user:read')
+    assert client.get('/users/2', headers=_auth(bob)).status_code == 200
+    assert len(user_app.token_cache) == 1 # bob's token is now served from the cache
+
+    assert client.post('/users/2/revoke', headers=_auth(admin)).status_code == 200
+
+    response = client.get('/users/2', headers=_auth(bob))
+    assert response.status_code == 401
+    assert response.get_json()['message'] == 'Token has been revoked'
+    assert client.get('/users/2', headers=_auth(admin)).status_code == 200
+
+def test_cached_token_is_rejected_after_the_user_is_deleted(client, user_app):
+    admin = _token(user_app, 1, 'user:read,user:manage')
+    bob = _token(user_app, 2, 'user:read')
+    assert client.get('/users/1', headers=_auth(bob)).status_code == 200
+
+    assert client.delete('/users/2', headers=_auth(admin)).status_code == 200
+
+    assert client.get('/users/1', headers=_auth(bob)).status_code == 401
+
+def _gateway_headers(secret, claims):
+    encoded = base64.urlsafe_b64encode(json.dumps(claims).encode('utf-8')).decode('ascii')
+    signature = hmac.new(secret.encode('utf-8'), encoded.encode('ascii'), hashlib.sha256).hexdigest()
+    return {'X-Verified-Claims': encoded, 'X-Verified-Claims-Signature': signature}
+
+def test_gateway_claims_take_precedence_over_the_cache(client, user_app, monkeypatch):
+    """Test that signed gateway claims are used even when the same token is cached with other claims."""
+    monkeypatch.setitem(user_app.app.config, 'gateway_claims_secret_key', 'gateway-secret')
+    carol = _token(user_app, 3, '')
+    assert client.get('/users/3', headers=_auth(carol)).status_code == 403 # cached without user:read
+    now = int(time.time())
+    granted = {'user_id': 3, 'username': 'carol', 'role': 'user', 'permissions': 'user:read',
+               'iat': now - 10, 'exp': now + 600}
+
+    assert client.get('/users/3', headers=_auth(carol, **_gateway_headers('gateway-secret', granted))).status_code == 200
+    forged = _gateway_headers('wrong-secret', granted)
+    assert client.get('/users/3', headers=_auth(carol, **forged)).status_code == 403
+
+def test_revocation_applies_to_gateway_claims(client, user_app, monkeypatch):
+    monkeypatch.setitem(user_app.app.config, 'gateway_claims_secret_key', 'gateway-secret')
+    admin = _token(user_app, 1, 'user:read,user:manage')
+    now = int(time.time())
+    bob = _gateway_headers('gateway-secret', {'user_id': 2, 'username': 'bob', 'permissions': 'user:read',
+                                              'iat': now - 10, 'exp': now + 600})
+    assert client.get('/users/2', headers=_auth('opaque', **bob)).status_code == 200
+
+    assert client.post('/users/2/revoke', headers=_auth(admin)).status_code == 200
+
+    assert client.get('/users/2', headers=_auth('opaque', **bob)).status_code == 401
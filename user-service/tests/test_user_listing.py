@@ -0,0 +1,40 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from user_service.models import Base, User
+from user_service.user_manager import UserManager
+
+
+@pytest.fixture
+def user_manager():
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        User(username='alice', password='x', role='admin', permissions='user:read, user:manage'),
+        User(username='bob', password='x', role='user', permissions='loan:read'),
+        User(username='carol', password='x', role='user', permissions='loan:read,user_read'),
+        User(username='dave', password='x', role='user', permissions=None),
+    ])
+    session.commit()
+    yield UserManager(session)
+    session.close()
+
+def _names(query):
+    return [user.username for user in query]
+
+def test_keyset_pages_follow_id_order(user_manager):
+    """Test that each page starts right after the cursor of the previous one."""
+    first = user_manager.query_users().limit(2).all()
+    second = user_manager.query_users(after_id=first[-1].id).limit(2).all()
+
+    assert _names(first) == ['alice', 'bob']
+    assert _names(second) == ['carol', 'dave']
+
+def test_filters_by_role_and_permission(user_manager):
+    """Test that role and permission filters match whole permission names only."""
+    assert _names(user_manager.query_users(role='user', permission='loan:read')) == ['bob', 'carol']
+    assert _names(user_manager.query_users(permission='user:manage')) == ['alice']
+    assert _names(user_manager.query_users(permission='user_read')) == ['carol']
+    assert _names(user_manager.query_users(permission='user:rea')) == []
+    assert _names(user_manager.query_users(permission='user%read')) == []
@@ -0,0 +1,76 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter
+
+TOKEN_CACHE_HITS = Counter('user_service_token_cache_hits_total', 'Access tokens answered from the verified-token cache')
+TOKEN_CACHE_MISSES = Counter('user_service_token_cache_misses_total', 'Access tokens that had to be decoded and verified')
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified access token claims, keyed by a digest of the
+    token and kept until the token's exp.
+
+    revoke_user() drops a user's cached tokens and rejects any token of that
+    user issued (iat) before the second of the revocation, whichever path
+    verified it, for as long as such a token could still be unexpired. iat
+    only has whole seconds, so tokens issued in that same second are let
+    through: otherwise a login right after a revocation would be rejected
+    until its token expired.
+
+    Revocations are kept in this process only; other workers learn of them
+    when the tokens expire.
+    """
+
+    def __init__(self, max_entries=10000, revocation_ttl=15 * 60):
+        self.max_entries = max_entries
+        self.revocation_ttl = revocation_ttl # in seconds, the longest an access token lives
+        self._entries = OrderedDict()
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        digest = self._digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(digest)
+                TOKEN_CACHE_HITS.inc()
+                return entry[1]
+            if entry is not None:
+                del self._entries[digest]
+        TOKEN_CACHE_MISSES.inc()
+        return None
+
+    def put(self, token, claims):
+        if 'exp' not in claims:
+            return # never cache a token that does not expire
+        with self._lock:
+            self._entries[self._digest(token)] = (claims['exp'], claims)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke_user(self, user_id):
+        now = time.time()
+        with self._lock:
+            for digest in [d for d, (_, claims) in self._entries.items() if claims.get('user_id') == user_id]:
+                del self._entries[digest]
+            self._revoked[user_id] = now
+            # Revocations older than any live token can no longer match anything
+            for revoked_user in [u for u, at in self._revoked.items() if at < now - self.revocation_ttl]:
+                del self._revoked[revoked_user]
+
+    def is_revoked(self, claims):
+        revoked_at = self._revoked.get(claims.get('user_id'))
+        return revoked_at is not None and claims.get('iat', 0) < int(revoked_at)
+
+    def __len__(self):
+        return len(self._entries)
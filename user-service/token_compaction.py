@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import delete, select
+
+from models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKENS_PURGED = Counter('user_service_refresh_tokens_purged_total', 'Refresh tokens deleted by compaction', ['reason'])
+COMPACTION_DURATION = Histogram('user_service_refresh_token_compaction_seconds', 'Duration of a refresh token compaction run',
+                                buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300))
+
+
+class RefreshTokenCompactor:
+    """
+    Deletes refresh tokens that can no longer be used: expired ones, found
+    through ix_refresh_tokens_expires_at, and revoked ones, found by walking
+    the primary key.
+
+    Every batch of at most batch_size rows is its own short transaction,
+    with a pause in between, so logins and refreshes are never locked out for
+    the length of a whole run.
+    """
+
+    def __init__(self, session_factory, interval=3600, batch_size=1000, pause=0.05):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _delete_batch(self, ids_query):
+        session = self.session_factory()
+        try:
+            ids = session.execute(ids_query.limit(self.batch_size)).scalars().all()
+            if ids:
+                session.execute(delete(RefreshToken).where(RefreshToken.id.in_(ids)))
+                session.commit()
+            return ids
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _purge_expired(self, now):
+        purged = 0
+        query = select(RefreshToken.id).where(RefreshToken.expires_at < now).order_by(RefreshToken.expires_at)
+        while not self._stopped.is_set():
+            ids = self._delete_batch(query)
+            purged += len(ids)
+            if len(ids) < self.batch_size:
+                break
+            time.sleep(self.pause)
+        return purged
+
+    def _purge_revoked(self):
+        purged = 0
+        after = 0
+        while not self._stopped.is_set():
+            query = (select(RefreshToken.id).where(RefreshToken.id > after, RefreshToken.revoked == True)
+                     .order_by(RefreshToken.id))
+            ids = self._delete_batch(query)
+            purged += len(ids)
+            if len(ids) < self.batch_size:
+                break
+            after = ids[-1]
+            time.sleep(self.pause)
+        return purged
+
+    def run_once(self):
+        """Runs a full compaction and returns the number of tokens deleted."""
+        started = time.perf_counter()
+        try:
+            expired = self._purge_expired(datetime.utcnow())
+            REFRESH_TOKENS_PURGED.labels(reason='expired').inc(expired)
+            revoked = self._purge_revoked()
+            REFRESH_TOKENS_PURGED.labels(reason='revoked').inc(revoked)
+        finally:
+            duration = time.perf_counter() - started
+            COMPACTION_DURATION.observe(duration)
+        logger.info(f"Refresh token compaction purged {expired} expired and {revoked} revoked tokens in {duration:.3f}s")
+        return expired + revoked
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Refresh token compaction failed: {e}", exc_info=True)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='refresh-token-compaction', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -1,13 +1,23 @@
 from models import User
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import func, literal
 from sqlalchemy.orm.exc import NoResultFound
+
 class UserManager:
-    def __init__(self, session):
+    def __init__(self, session, hasher=None):
         self.session = session
+        self._hasher = hasher
+
+    @property
+    def hasher(self):
+        if self._hasher is None:
+            # Hashes on the calling thread; the app passes its process pool hasher instead
+            from password_hasher import PasswordHasher
+            self._hasher = PasswordHasher(workers=0)
+        return self._hasher
 
-    def create_user(self, username, password, role='user'):
-        hashed_password = generate_password_hash(password)
-        new_user = User(username=username, password=hashed_password, role=role
+    def create_user(self, username, password, role='user', permissions=''):
+        hashed_password = self.hasher.hash(password)
+        new_user = User(username=username, password=hashed_password, role=role, permissions=permissions)
         self.session.add(new_user)
         self.session.commit()
         return new_user
@@ -19,11 +29,36 @@ class UserManager:
             return None
 
     def verify_password(self, user, password):
-        return check_password_hash(user.password, password)
+        """
+        Checks a password and, when it matches a hash made with an older
+        method, stores it again with the current one. The caller commits.
+        """
+        valid, new_hash = self.hasher.verify_and_update(user.password, password)
+        if new_hash:
+            user.password = new_hash
+        return valid
 
     def get_all_users(self):
         return self.session.query(User).all()
 
+    def query_users(self, after_id=None, role=None, permission=None):
+        """
+        Users in id order, for keyset pagination: the rows after after_id,
+        optionally only those with a role or holding a permission. Returns the
+        query so the caller can limit it or stream it.
+        """
+        query = self.session.query(User).order_by(User.id)
+        if after_id is not None:
+            query = query.filter(User.id > after_id)
+        if role:
+            query = query.filter(User.role == role)
+        if permission:
+            # permissions is a comma-separated list, possibly with spaces after the commas
+            escaped = permission.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            names = literal(',').concat(func.replace(func.coalesce(User.permissions, ''), ' ', '')).concat(',')
+            query = query.filter(names.like(f'%,{escaped},%', escape='\\'))
+        return query
+
     def get_user(self, user_id):
         return self.session.query(User).get(user_id)
 
@@ -33,7 +68,7 @@ class UserManager:
             for key, value in updated_data.items():
                 if hasattr(user, key):
                     if key == 'password':
-                        user.password = generate_password_hash(value)
+                        user.password = self.hasher.hash(value)
                     else:
                         setattr(user, key, value)
             self.session.commit()